@@ -10,7 +10,6 @@ import sqlite3
 import datetime
 import operator
 import traceback
-import subprocess
 
 import stem.descriptor
 import stem.descriptor.remote
@@ -19,6 +18,8 @@ import stem.util.enum
 
 from stem import Flag
 
+from relaytable import classify_measurements, scan_router_status
+
 def get_dirauths_in_tables():
     return "faravahar, gabelmoo, dizum, moria1, urras, maatuska, longclaw, tor26, dannenberg, turtles, bastet".split(", ")
 
@@ -110,10 +111,19 @@ def dirauth_relay_votes(directory, dirAuths, dbc):
             else:
                 print("Found two votes for dirauth " + dirauth + " and time " + filepath)
 
+            known, running, bwlines = 0, 0, 0
+            with open(filepath, 'rb') as vote_file:
+                for relay in scan_router_status(vote_file, ('flags', 'measured')):
+                    known += 1
+                    if 'Running' in relay.flags:
+                        running += 1
+                    if relay.measured is not None:
+                        bwlines += 1
+
             votes[voteTime][dirauth]['present'] = 1
-            votes[voteTime][dirauth]['known'] = int(subprocess.check_output('egrep "^r " "' + filepath + '" | wc -l', shell=True))
-            votes[voteTime][dirauth]['running'] = int(subprocess.check_output('egrep "^s " "' + filepath + '" | grep " Running" | wc -l', shell=True))
-            votes[voteTime][dirauth]['bwlines'] = int(subprocess.check_output('grep Measured= "' + filepath + '" | wc -l', shell=True))
+            votes[voteTime][dirauth]['known'] = known
+            votes[voteTime][dirauth]['running'] = running
+            votes[voteTime][dirauth]['bwlines'] = bwlines
 
     for t in votes:
         print(ut_to_datetime(t))
@@ -211,9 +221,9 @@ def bwauth_measurements(directory, dirAuths, dbc):
 
         #Get the consensus data
         consensusRouters = {}
-        reader = stem.descriptor.parse_file(consensuses[v])
-        for relay in reader:
-            consensusRouters[relay.fingerprint] = "Unmeasured" if relay.is_unmeasured else relay.bandwidth
+        with open(consensuses[v], 'rb') as consensus_file:
+            for relay in scan_router_status(consensus_file, ('fingerprint', 'bandwidth', 'is_unmeasured')):
+                consensusRouters[relay.fingerprint] = None if relay.is_unmeasured else relay.bandwidth
         
         #The vote data
         bwauthVotes = {}
@@ -222,48 +232,20 @@ def bwauth_measurements(directory, dirAuths, dbc):
                 bwauthVotes[d] = {}
 
             measured_something = False
-            reader = stem.descriptor.parse_file(votes[v][d])
-            for relay in reader:
-                if relay.measured:
-                    bwauthVotes[d][relay.fingerprint] = relay.measured
-                    measured_something = True
+            with open(votes[v][d], 'rb') as vote_file:
+                for relay in scan_router_status(vote_file, ('fingerprint', 'measured')):
+                    if relay.measured:
+                        bwauthVotes[d][relay.fingerprint] = relay.measured
+                        measured_something = True
 
             if not measured_something:
                 del bwauthVotes[d]
 
         #Now match them up and store the data
         thisConsensusResults = {}
-        for r in consensusRouters:
-            for d in bwauthVotes:
-                had_any_value = False
-                if d not in thisConsensusResults:
-                    thisConsensusResults[d] = {'unmeasured' : 0, 'above' : 0, 'below' : 0, 'exclusive' : 0 , 'shared' : 0}
-
-                if consensusRouters[r] == "Unmeasured":
-                    continue
-                elif r not in bwauthVotes[d]:
-                    had_any_value = True
-                    thisConsensusResults[d]['unmeasured'] += 1
-                elif consensusRouters[r] < bwauthVotes[d][r]:
-                    had_any_value = True
-                    thisConsensusResults[d]['above'] += 1
-                elif consensusRouters[r] > bwauthVotes[d][r]:
-                    had_any_value = True
-                    thisConsensusResults[d]['below'] += 1
-                elif consensusRouters[r] == bwauthVotes[d][r] and \
-                    1 == len([1 for d_i in bwauthVotes if d_i in bwauthVotes and r in bwauthVotes[d_i] and bwauthVotes[d_i][r] == consensusRouters[r]]):
-                    had_any_value = True
-                    thisConsensusResults[d]['exclusive'] += 1
-                elif consensusRouters[r] == bwauthVotes[d][r] and \
-                    1 != len([1 for d_i in bwauthVotes if d_i in bwauthVotes and r in bwauthVotes[d_i] and bwauthVotes[d_i][r] == consensusRouters[r] ]):
-                    had_any_value = True
-                    thisConsensusResults[d]['shared'] += 1
-                else:
-                    print("What case am I in???")
-                    sys.exit(1)
-
-                if not had_any_value:
-                    del thisConsensusResults[d]
+        if consensusRouters:
+            measurements = dict((d, [bwauthVotes[d].get(r, -1) for r in consensusRouters]) for d in bwauthVotes)
+            thisConsensusResults = classify_measurements(list(consensusRouters.values()), measurements)
 
         insertValues = [v]
         for d in dirAuths: 
@@ -0,0 +1,774 @@
+#!/usr/bin/env python3
+# See LICENSE for licensing information
+
+"""
+Columnar view of the relays in the consensus and votes. It's built once per
+run and shared by everything that looks at individual relays, rather than
+each of them walking the router status entries of every document.
+"""
+
+import sys
+import array
+import base64
+import binascii
+import calendar
+import multiprocessing
+import collections.abc
+import concurrent.futures
+
+import stem.version
+import stem.descriptor.router_status_entry
+
+SCAN_FIELDS = ('fingerprint', 'nickname', 'published', 'flags', 'bandwidth', 'measured', 'is_unmeasured', 'has_ipv6', 'version')
+
+class RouterStatusSummary:
+	"""
+	A few fields of a router status entry, read by
+	:func:`~relaytable.scan_router_status` without parsing the rest of it.
+	Fields that weren't asked for are None.
+
+	:var str fingerprint: relay's fingerprint
+	:var str nickname: relay's nickname
+	:var int published: unix timestamp the relay's descriptor was published
+	:var list flags: relay's flags
+	:var int bandwidth: bandwidth of the w line
+	:var int measured: measured bandwidth of the w line
+	:var bool is_unmeasured: True if the w line has Unmeasured=1
+	:var bool has_ipv6: True if an a line has an IPv6 ORPort
+	:var str version: tor version of the v line
+	:var bytes content: text of the router status entry
+	"""
+
+	__slots__ = SCAN_FIELDS + ('content',)
+
+	def __init__(self, content):
+		for field in SCAN_FIELDS:
+			setattr(self, field, None)
+		self.content = content
+
+	def entry(self, document=None):
+		"""
+		Parses the whole router status entry with stem.
+
+		:param NetworkStatusDocumentV3 document: document the entry belongs to
+
+		:returns: :class:`~stem.descriptor.router_status_entry.RouterStatusEntryV3`
+		"""
+
+		return stem.descriptor.router_status_entry.RouterStatusEntryV3(self.content, document=document)
+
+def scan_router_status(lines, fields=SCAN_FIELDS):
+	"""
+	Reads the router status entries of a consensus or vote, looking only at the
+	lines of the fields we're asked for. This is far quicker than having stem parse the entries,
+	so it's used when we only need some statistics.
+
+	:param iterable lines: lines of the document as bytes, such as an open file
+	:param tuple fields: :class:`~relaytable.RouterStatusSummary` fields to read
+
+	:returns: iterator of :class:`~relaytable.RouterStatusSummary`
+
+	:raises: **ValueError** if a field can't be read
+	"""
+
+	fields = set(fields)
+	want_r = bool(fields & set(('fingerprint', 'nickname', 'published')))
+	want_w = bool(fields & set(('bandwidth', 'measured', 'is_unmeasured')))
+
+	entry = None
+	for line in lines:
+		if line.startswith(b'r '):
+			if entry:
+				yield _summarize(entry, fields, want_r, want_w)
+			entry = [line]
+		elif entry is None:
+			continue
+		elif line.startswith(b'directory-footer') or line.startswith(b'directory-signature '):
+			break
+		else:
+			entry.append(line)
+
+	if entry:
+		yield _summarize(entry, fields, want_r, want_w)
+
+def _summarize(entry, fields, want_r, want_w):
+	summary = RouterStatusSummary(b''.join(entry))
+
+	for line in entry:
+		if line.startswith(b'r ') and want_r:
+			r_comp = line.split()
+			if len(r_comp) < 6:
+				raise ValueError('Router status entry has a malformed r line: %s' % line.decode('utf-8', 'replace').rstrip())
+			if 'nickname' in fields:
+				summary.nickname = r_comp[1].decode('utf-8')
+			if 'fingerprint' in fields:
+				summary.fingerprint = _identity_fingerprint(r_comp[2])
+			if 'published' in fields:
+				date, time = r_comp[4], r_comp[5]
+				summary.published = calendar.timegm((int(date[0:4]), int(date[5:7]), int(date[8:10]), int(time[0:2]), int(time[3:5]), int(time[6:8])))
+		elif line.startswith(b's ') and 'flags' in fields:
+			summary.flags = line.decode('utf-8').split()[1:]
+		elif line.startswith(b'a ') and 'has_ipv6' in fields:
+			summary.has_ipv6 = summary.has_ipv6 or line[2:3] == b'['
+		elif line.startswith(b'v Tor ') and 'version' in fields:
+			summary.version = line[6:].decode('utf-8').strip()
+		elif (line.startswith(b'w ') or line == b'w\n') and want_w:
+			summary.is_unmeasured = False
+			for keyword in line.split()[1:]:
+				key, _, value = keyword.partition(b'=')
+				if key == b'Bandwidth':
+					summary.bandwidth = int(value)
+				elif key == b'Measured':
+					summary.measured = int(value)
+				elif key == b'Unmeasured':
+					summary.is_unmeasured = value == b'1'
+
+	if 'flags' in fields and summary.flags is None:
+		summary.flags = []
+	if 'has_ipv6' in fields and summary.has_ipv6 is None:
+		summary.has_ipv6 = False
+	return summary
+
+def _identity_fingerprint(identity):
+	identity = identity + b'=' * (-len(identity) % 4)
+	return binascii.hexlify(base64.b64decode(identity)).decode('ascii').upper()
+
+class RouterEntries(collections.abc.Mapping):
+	"""
+	Router status entries of a document, keyed by fingerprint in the order the
+	document lists them. Only their text is kept, stem parses an entry the
+	first time it's looked up. Reading a few fields of every entry is far
+	quicker by scanning their :func:`~relaytable.RouterEntries.content`.
+
+	:var NetworkStatusDocumentV3 document: document the entries belong to
+	"""
+
+	def __init__(self, document=None):
+		self.document = document
+		self._content = {}
+		self._parsed = {}
+
+	def add(self, content):
+		"""
+		Adds a router status entry.
+
+		:param bytes content: text of the entry
+
+		:raises: **ValueError** if the entry's r line is malformed
+		"""
+
+		r_comp = content[:content.find(b'\n')].split()
+		if len(r_comp) < 6 or r_comp[0] != b'r':
+			raise ValueError('Router status entry has a malformed r line: %s' % content.split(b'\n', 1)[0].decode('utf-8', 'replace'))
+
+		fingerprint = _identity_fingerprint(r_comp[2])
+		self._content[fingerprint] = content
+		self._parsed.pop(fingerprint, None)
+
+	def content(self):
+		"""
+		Provides the text of every entry, one after another.
+		"""
+
+		return b''.join(self._content.values())
+
+	def __getitem__(self, fingerprint):
+		router = self._parsed.get(fingerprint)
+		if router is None:
+			router = stem.descriptor.router_status_entry.RouterStatusEntryV3(self._content[fingerprint])
+			router.document = self.document
+			self._parsed[fingerprint] = router
+		return router
+
+	def __contains__(self, fingerprint):
+		return fingerprint in self._content
+
+	def __iter__(self):
+		return iter(self._content)
+
+	def __len__(self):
+		return len(self._content)
+
+def _scan_columns(content):
+	"""
+	Reads the router status entries of a document into compact buffers. This
+	runs in a worker process, so rather than python objects it returns bytes
+	that are cheap to send back.
+
+	Flags are bitmasks of the document's own flag_names, and versions indexes
+	into its own versions. :func:`~relaytable.RelayTable._add_scanned` maps
+	these onto the table.
+	"""
+
+	fingerprints, nicknames, flag_bits, version_ids = [], [], {}, {}
+	flags, bandwidth, measured, published, version = array.array('Q'), array.array('q'), array.array('q'), array.array('q'), array.array('i')
+	is_unmeasured, has_ipv6 = bytearray(), bytearray()
+
+	for relay in scan_router_status(content.splitlines(True)):
+		fingerprints.append(binascii.unhexlify(relay.fingerprint))
+		nicknames.append(relay.nickname)
+
+		mask = 0
+		for flag in relay.flags:
+			if flag not in flag_bits:
+				if len(flag_bits) == 64:
+					raise ValueError('Unable to represent more than 64 distinct flags')
+				flag_bits[flag] = 1 << len(flag_bits)
+			mask |= flag_bits[flag]
+		flags.append(mask)
+
+		bandwidth.append(-1 if relay.bandwidth is None else relay.bandwidth)
+		measured.append(-1 if relay.measured is None else relay.measured)
+		published.append(relay.published or -1)
+		is_unmeasured.append(bool(relay.is_unmeasured))
+		has_ipv6.append(relay.has_ipv6)
+
+		if relay.version is None:
+			version.append(-1)
+		else:
+			version.append(version_ids.setdefault(relay.version, len(version_ids)))
+
+	return (b''.join(fingerprints), '\n'.join(nicknames).encode('utf-8'), list(flag_bits), flags.tobytes(),
+		bandwidth.tobytes(), measured.tobytes(), published.tobytes(), bytes(is_unmeasured), bytes(has_ipv6),
+		list(version_ids), version.tobytes())
+
+class DocumentColumns:
+	"""
+	The router status entries of a single document. Every column is indexed by
+	relay id, values of relays the document doesn't list are left at their
+	default.
+
+	:var bytearray present: 1 if the document lists the relay
+	:var array bandwidth: bandwidth of the w line, -1 if there isn't one
+	:var array measured: measured bandwidth of the w line, -1 if there isn't one
+	:var array flags: bitmask of the relay's flags, see
+		:func:`~relaytable.RelayTable.flag_bit`
+	:var array published: unix timestamp the relay's descriptor was published
+	:var bytearray is_unmeasured: 1 if the w line has Unmeasured=1
+	:var bytearray has_ipv6: 1 if the relay has an IPv6 ORPort
+	:var array version: index of the relay's version in RelayTable.versions,
+		-1 if it doesn't have one
+	:var int count: number of relays the document lists
+	:var list known_flags: flags the document says it knows about, followed by
+		our pseudo-flags once they're added
+	:var int measured_bw_sum: total bandwidth of the document's relays, measured
+		bandwidth for votes, None until the pseudo-flags are added
+	"""
+
+	def __init__(self, size):
+		self.present = bytearray(size)
+		self.bandwidth = array.array('q', [-1]) * size
+		self.measured = array.array('q', [-1]) * size
+		self.flags = array.array('Q', [0]) * size
+		self.published = array.array('q', [-1]) * size
+		self.is_unmeasured = bytearray(size)
+		self.has_ipv6 = bytearray(size)
+		self.version = array.array('i', [-1]) * size
+		self.count = 0
+		self.known_flags = []
+		self.measured_bw_sum = None
+		self._flag_sets = None
+		self._buckets = {}
+
+	def relay_ids(self):
+		"""
+		Provides the ids of the relays the document lists, in order.
+		"""
+
+		return [i for (i, present) in enumerate(self.present) if present]
+
+	def present_set(self):
+		"""
+		Provides the relays the document lists as a bitset, that is an int with
+		the bit of each relay id set.
+		"""
+
+		return int.from_bytes(_pack_bits(self.relay_ids(), len(self.present)), 'little')
+
+	def flag_sets(self):
+		"""
+		Provides the relays that have each flag as bitsets, so relays can be
+		compared across documents with bitwise operations. These are computed
+		in a single pass over the document and cached until its flags change.
+
+		:returns: **dict** mapping flag bits to the bitset of relays with the flag
+		"""
+
+		if self._flag_sets is None:
+			relay_ids = {}
+			for (i, mask) in enumerate(self.flags):
+				while mask:
+					bit = mask & -mask
+					relay_ids.setdefault(bit, []).append(i)
+					mask ^= bit
+
+			size = len(self.flags)
+			self._flag_sets = dict((bit, int.from_bytes(_pack_bits(ids, size), 'little')) for (bit, ids) in relay_ids.items())
+		return self._flag_sets
+
+	def flagged_set(self):
+		"""
+		Provides the relays that have at least one flag as a bitset.
+		"""
+
+		return int.from_bytes(_pack_bits([i for (i, mask) in enumerate(self.flags) if mask], len(self.flags)), 'little')
+
+def _pack_bits(relay_ids, size):
+	packed = bytearray((size + 7) // 8)
+	for i in relay_ids:
+		packed[i >> 3] |= 1 << (i & 7)
+	return packed
+
+def classify_measurements(bandwidth, measurements):
+	"""
+	Compares each bandwidth authority's measurements with the consensus
+	weights. The number of authorities that measured each relay's consensus
+	weight is counted once up front, then every relay of an authority falls in
+	one of the following...
+
+	* **unmeasured** authority didn't measure the relay
+	* **above** authority measured more than the consensus weight
+	* **below** authority measured less than the consensus weight
+	* **exclusive** authority is the only one that measured the consensus weight
+	* **shared** other authorities measured the consensus weight too
+
+	:param list bandwidth: consensus weight of each relay, relays that are None
+		aren't measured by the consensus and are skipped
+	:param dict measurements: mapping of authority nickname to the measured
+		bandwidth of each relay, in the same order as the weights and -1 if it
+		didn't measure the relay
+
+	:returns: **dict** mapping authority nicknames to a dict with the number of
+		relays in each category
+	"""
+
+	matching = [0] * len(bandwidth)
+	for measured in measurements.values():
+		for (i, (weight, value)) in enumerate(zip(bandwidth, measured)):
+			if weight == value:
+				matching[i] += 1
+
+	results = {}
+	for (dirauth_nickname, measured) in measurements.items():
+		unmeasured = above = below = exclusive = shared = 0
+		for (weight, value, matches) in zip(bandwidth, measured, matching):
+			if weight is None:
+				continue
+			elif value == -1:
+				unmeasured += 1
+			elif weight < value:
+				above += 1
+			elif weight > value:
+				below += 1
+			elif matches == 1:
+				exclusive += 1
+			else:
+				shared += 1
+
+		results[dirauth_nickname] = {'unmeasured' : unmeasured, 'above' : above, 'below' : below, 'exclusive' : exclusive, 'shared' : shared}
+	return results
+
+def _unpack(typecode, data):
+	column = array.array(typecode)
+	column.frombytes(data)
+	return column
+
+def _tor_version(version):
+	try:
+		return stem.version._get_version(version)
+	except ValueError:
+		return None
+
+class RelayTable:
+	"""
+	Every relay of the consensus and votes with an integer id, assigned in
+	order of fingerprint, and the columns of each document. The table is built
+	once per run, so relays are compared, joined and sorted by their id and
+	each fingerprint is only held once.
+
+	:var list fingerprints: fingerprint of each relay id, as uppercase hex
+	:var bytes fingerprint_bytes: 20 byte binary fingerprint of each relay id,
+		one after another
+	:var dict index: mapping of hex fingerprint to relay id
+	:var list nicknames: nickname of each relay id, preferring the consensus'
+	:var list versions: distinct relay versions
+	:var DocumentColumns consensus: columns of the consensus
+	:var dict votes: mapping of authority nickname to the columns of its vote
+	:var bool has_pseudo_flags: True once :func:`~relaytable.RelayTable.add_pseudo_flags`
+		has been called
+	:var tuple pseudo_flags_for: (fallback_dirs, include_fallback_dirs) the
+		pseudo-flags were added for, the fallback directories as a frozenset,
+		None until they're added
+	:var array bwauths_voted: number of votes with a measurement of each relay,
+		None until :func:`~relaytable.RelayTable.assigning_bwauths` is called
+
+	The documents we download keep the text of their router status entries
+	(see :class:`~relaytable.RouterEntries`), and the columns are scanned from
+	it so stem never parses the entries. With processes the documents are
+	scanned across a pool of worker processes. These are spawned rather than
+	forked, as our fetches may have left threads running. The columns of
+	documents stem has already parsed are read from their entries.
+	"""
+
+	def __init__(self, consensus, votes, processes=0):
+		documents = list(votes.values()) + [consensus]
+		scanned = None
+		if all(isinstance(document.routers, RouterEntries) for document in documents):
+			contents = [document.routers.content() for document in documents]
+			if processes:
+				with concurrent.futures.ProcessPoolExecutor(max_workers=min(processes, len(documents)), mp_context=multiprocessing.get_context('spawn')) as executor:
+					scanned = dict(zip(map(id, documents), executor.map(_scan_columns, contents)))
+			else:
+				scanned = dict(zip(map(id, documents), map(_scan_columns, contents)))
+
+		fingerprints = set(consensus.routers)
+		for vote in votes.values():
+			fingerprints.update(vote.routers)
+
+		binary_fingerprints = sorted(set(map(binascii.unhexlify, fingerprints)))
+		self.fingerprint_bytes = b''.join(binary_fingerprints)
+		self.fingerprints = [sys.intern(binascii.hexlify(fp).decode('ascii').upper()) for fp in binary_fingerprints]
+		self.index = dict((fp, i) for (i, fp) in enumerate(self.fingerprints))
+		self._binary_index = None
+		self.nicknames = [None] * len(self.fingerprints)
+		self.versions = []
+
+		self._flag_bits = {}
+		self._flag_names = {}
+		self._version_ids = {}
+		self.has_pseudo_flags = False
+		self.pseudo_flags_for = None
+		self.bwauths_voted = None
+		self._assigning_bwauths = None
+
+		self.votes = {}
+		for (dirauth_nickname, vote) in votes.items():
+			self.votes[dirauth_nickname] = self._add_scanned(vote, scanned[id(vote)]) if scanned else self._add_document(vote)
+		self.consensus = self._add_scanned(consensus, scanned[id(consensus)]) if scanned else self._add_document(consensus)
+
+	def __len__(self):
+		return len(self.fingerprints)
+
+	def relay_id(self, fingerprint):
+		"""
+		Provides the id of a relay.
+
+		:param str,bytes fingerprint: hex fingerprint, or the 20 byte binary form
+
+		:returns: **int** relay id, or None if the table doesn't have the relay
+		"""
+
+		if isinstance(fingerprint, bytes):
+			if self._binary_index is None:
+				self._binary_index = dict((self.fingerprint_bytes[i * 20:(i + 1) * 20], i) for i in range(len(self)))
+			return self._binary_index.get(fingerprint)
+
+		return self.index.get(fingerprint.upper())
+
+	def relay_ids(self, fingerprints):
+		"""
+		Provides the ids of the relays we have, skipping any we don't.
+		"""
+
+		return [i for i in map(self.relay_id, fingerprints) if i is not None]
+
+	def _add_document(self, document):
+		columns = DocumentColumns(len(self.fingerprints))
+
+		for (relay_fp, router) in document.routers.items():
+			i = self.index[relay_fp]
+			self.nicknames[i] = router.nickname
+
+			columns.present[i] = 1
+			if router.bandwidth is not None:
+				columns.bandwidth[i] = router.bandwidth
+			if router.measured is not None:
+				columns.measured[i] = router.measured
+			columns.flags[i] = self.flag_mask(router.flags)
+			if router.published:
+				columns.published[i] = calendar.timegm(router.published.utctimetuple())
+			columns.is_unmeasured[i] = router.is_unmeasured
+			columns.has_ipv6[i] = any(a[2] for a in router.or_addresses)
+			columns.version[i] = self._version_id(router.version)
+
+		columns.count = len(document.routers)
+		columns.known_flags = list(document.known_flags)
+		return columns
+
+	def _add_scanned(self, document, scanned):
+		(fingerprints, nicknames, flag_names, flags, bandwidth, measured, published, is_unmeasured, has_ipv6, versions, version) = scanned
+		columns = DocumentColumns(len(self.fingerprints))
+
+		nicknames = nicknames.decode('utf-8').split('\n')
+		flag_bits = [self.flag_bit(flag) for flag in flag_names]
+		masks = {}
+		version_ids = [self._version_id(_tor_version(v)) for v in versions]
+		(flags, bandwidth, measured, published, version) = [_unpack(typecode, data) for (typecode, data) in
+			(('Q', flags), ('q', bandwidth), ('q', measured), ('q', published), ('i', version))]
+
+		for j in range(len(flags)):
+			i = self.relay_id(fingerprints[j * 20:(j + 1) * 20])
+			self.nicknames[i] = nicknames[j]
+
+			mask = masks.get(flags[j])
+			if mask is None:
+				mask = masks[flags[j]] = sum(bit for (k, bit) in enumerate(flag_bits) if flags[j] & (1 << k))
+
+			columns.present[i] = 1
+			columns.bandwidth[i] = bandwidth[j]
+			columns.measured[i] = measured[j]
+			columns.flags[i] = mask
+			columns.published[i] = published[j]
+			columns.is_unmeasured[i] = is_unmeasured[j]
+			columns.has_ipv6[i] = has_ipv6[j]
+			columns.version[i] = version_ids[version[j]] if version[j] != -1 else -1
+
+		columns.count = len(flags)
+		columns.known_flags = list(document.known_flags)
+		return columns
+
+	def _version_id(self, version):
+		if version is None:
+			return -1
+		elif version not in self._version_ids:
+			self._version_ids[version] = len(self.versions)
+			self.versions.append(version)
+		return self._version_ids[version]
+
+	def flag_bit(self, flag):
+		"""
+		Provides the bit a flag is represented by in the flag columns,
+		registering it if we haven't seen it before.
+
+		:param str flag: flag name
+
+		:returns: **int** with the flag's bit set
+
+		:raises: **ValueError** if there are more flags than fit in a column
+		"""
+
+		bit = self._flag_bits.get(flag)
+		if bit is None:
+			if len(self._flag_bits) == 64:
+				raise ValueError('Unable to represent more than 64 distinct flags')
+			bit = self._flag_bits[flag] = 1 << len(self._flag_bits)
+			self._flag_names.clear()
+		return bit
+
+	def flag_mask(self, flags):
+		"""
+		Provides the bitmask of several flags.
+		"""
+
+		mask = 0
+		for flag in flags:
+			mask |= self.flag_bit(flag)
+		return mask
+
+	def flag_names(self, mask):
+		"""
+		Provides the names of the flags in a bitmask, sorted alphabetically.
+
+		:param int mask: bitmask of flags
+
+		:returns: **list** of flag names
+		"""
+
+		names = self._flag_names.get(mask)
+		if names is None:
+			names = self._flag_names[mask] = sorted(flag for (flag, bit) in self._flag_bits.items() if mask & bit)
+		return names
+
+	def relay_buckets(self, columns, include_bandwidth=False):
+		"""
+		Groups the relays of a document by whether they have an IPv6 ORPort and
+		their version, totalling the number and weight of each group. There's
+		only a few dozen of these, so statistics summed over them rather than
+		every relay are cheap. Groups are cached per document.
+
+		:param DocumentColumns columns: document to group the relays of
+		:param bool include_bandwidth: weighs relays by their bandwidth as well as
+			measured bandwidth if True
+
+		:returns: **dict** mapping (has_ipv6, version) tuples to a [count, weight]
+			list, version being None for relays without one
+		"""
+
+		buckets = columns._buckets.get(include_bandwidth)
+		if buckets is None:
+			by_version_id = {}
+			for i in columns.relay_ids():
+				weight = max(columns.measured[i], 0)
+				if include_bandwidth:
+					weight += max(columns.bandwidth[i], 0)
+
+				bucket = by_version_id.get((columns.has_ipv6[i], columns.version[i]))
+				if bucket is None:
+					bucket = by_version_id[(columns.has_ipv6[i], columns.version[i])] = [0, 0]
+				bucket[0] += 1
+				bucket[1] += weight
+
+			buckets = columns._buckets[include_bandwidth] = dict(((bool(has_ipv6), self.versions[version] if version != -1 else None), bucket) for ((has_ipv6, version), bucket) in by_version_id.items())
+		return buckets
+
+	def masked_sum(self, columns, mask, include_bandwidth=False):
+		"""
+		Provides the number and total weight of a document's relays that match a
+		mask. See :func:`~relaytable.RelayTable.relay_buckets`.
+
+		:param DocumentColumns columns: document to sum the relays of
+		:param function mask: called with whether a relay has an IPv6 ORPort and
+			its version, includes the relay if True
+		:param bool include_bandwidth: weighs relays by their bandwidth as well as
+			measured bandwidth if True
+
+		:returns: **tuple** of the form (count, weight)
+		"""
+
+		count, weight = 0, 0
+		for ((has_ipv6, version), bucket) in self.relay_buckets(columns, include_bandwidth).items():
+			if mask(has_ipv6, version):
+				count += bucket[0]
+				weight += bucket[1]
+		return (count, weight)
+
+	def add_flag(self, columns, relay_id, flag):
+		"""
+		Gives a relay a flag in a document.
+		"""
+
+		columns.flags[relay_id] |= self.flag_bit(flag)
+		columns._flag_sets = None
+
+	def flag_set(self, columns, flag):
+		"""
+		Provides the relays in a document with the given flag as a bitset.
+		"""
+
+		return columns.flag_sets().get(self.flag_bit(flag), 0)
+
+	def count_flag(self, columns, flag):
+		"""
+		Provides the number of relays in a document with the given flag.
+		"""
+
+		return self.flag_set(columns, flag).bit_count()
+
+	def assigning_bwauths(self):
+		"""
+		Provides the authorities whose measurement matches the consensus weight
+		of each relay. This is calculated in a single pass over the votes and
+		cached.
+
+		:returns: **list** with the authority nicknames of each relay id, ['all']
+			if every vote that measured the relay matches, and an empty string if
+			the relay isn't in the consensus
+		"""
+
+		if self._assigning_bwauths is None:
+			consensus = self.consensus
+			matching = [[] for i in range(len(self))]
+			self.bwauths_voted = array.array('i', [0]) * len(self)
+
+			for (dirauth_nickname, columns) in self.votes.items():
+				for i in columns.relay_ids():
+					measured = columns.measured[i]
+					if measured > 0:
+						self.bwauths_voted[i] += 1
+					if consensus.present[i] and consensus.bandwidth[i] == measured:
+						matching[i].append(dirauth_nickname)
+
+			for i in range(len(self)):
+				if not consensus.present[i]:
+					matching[i] = ""
+				elif len(matching[i]) == self.bwauths_voted[i]:
+					matching[i] = ["all"]
+
+			self._assigning_bwauths = matching
+		return self._assigning_bwauths
+
+	def add_pseudo_flags(self, fallback_dirs, include_fallback_dirs=True):
+		"""
+		Adds the flags we calculate ourselves to the flag columns and known flags
+		of each document, and totals their bandwidth. This is a single pass over
+		each document and leaves the parsed documents untouched. Later calls are
+		a no-op, so everything sharing the table shares the result.
+
+		* **ReachableIPv6** relay has an IPv6 ORPort
+		* **NoIPv6Consensus** relay has an IPv6 ORPort in a vote but not the consensus
+		* **FallbackDir** relay is one of the fallback directories
+		* **Unmeasured** consensus weight isn't based on a measurement
+		* **DescriptorMismatch** vote and consensus list different descriptors
+
+		:param list fallback_dirs: fingerprints of the fallback directories
+		:param bool include_fallback_dirs: adds the FallbackDir flag if True
+		"""
+
+		if self.has_pseudo_flags:
+			return
+
+		self.has_pseudo_flags = True
+		self.pseudo_flags_for = (frozenset(fallback_dirs), include_fallback_dirs)
+		consensus = self.consensus
+
+		reachable_ipv6 = self.flag_bit('ReachableIPv6')
+		no_ipv6_consensus = self.flag_bit('NoIPv6Consensus')
+		fallback_dir = self.flag_bit('FallbackDir') if include_fallback_dirs else 0
+		unmeasured = self.flag_bit('Unmeasured')
+		descriptor_mismatch = self.flag_bit('DescriptorMismatch')
+
+		fallback_ids = bytearray(len(self))
+		if include_fallback_dirs:
+			for i in self.relay_ids(fallback_dirs):
+				fallback_ids[i] = 1
+
+		routers_with_ipv6 = bytearray(len(self))
+		for columns in self.votes.values():
+			has_ipv6 = False
+			sum_bw = 0
+			for i in columns.relay_ids():
+				pseudo_flags = 0
+				if columns.has_ipv6[i]:
+					has_ipv6 = True
+					routers_with_ipv6[i] = 1
+					pseudo_flags |= reachable_ipv6
+				if fallback_ids[i]:
+					pseudo_flags |= fallback_dir
+				if consensus.present[i]:
+					if consensus.is_unmeasured[i] and columns.measured[i] <= 0:
+						pseudo_flags |= unmeasured
+					if consensus.published[i] != columns.published[i]:
+						pseudo_flags |= descriptor_mismatch
+				if columns.measured[i] > 0:
+					sum_bw += columns.measured[i]
+				columns.flags[i] |= pseudo_flags
+
+			if has_ipv6:
+				columns.known_flags += ['ReachableIPv6', 'NoIPv6Consensus']
+			if include_fallback_dirs:
+				columns.known_flags.append('FallbackDir')
+			columns.known_flags += ['Unmeasured', 'DescriptorMismatch']
+			columns.measured_bw_sum = sum_bw
+			columns._flag_sets = None
+
+		sum_bw = 0
+		for i in consensus.relay_ids():
+			pseudo_flags = 0
+			if consensus.has_ipv6[i]:
+				pseudo_flags |= reachable_ipv6
+			elif routers_with_ipv6[i]:
+				pseudo_flags |= no_ipv6_consensus
+			if fallback_ids[i]:
+				pseudo_flags |= fallback_dir
+			if consensus.is_unmeasured[i]:
+				pseudo_flags |= unmeasured
+			if consensus.bandwidth[i] > 0:
+				sum_bw += consensus.bandwidth[i]
+			consensus.flags[i] |= pseudo_flags
+
+		consensus.known_flags += ['ReachableIPv6', 'NoIPv6Consensus']
+		if include_fallback_dirs:
+			consensus.known_flags.append('FallbackDir')
+		consensus.known_flags += ['Unmeasured', 'DescriptorMismatch']
+		consensus.measured_bw_sum = sum_bw
+		consensus._flag_sets = None
@@ -0,0 +1,1865 @@
+#!/usr/bin/env python3
+# See LICENSE for licensing information
+
+"""
+HTML templates of the consensus health report and its graphs page. Each is
+compiled into a python function when this module is imported, so rendering one
+is a single call that appends its fragments to the output. Section writers work
+out the values a template needs and leave the markup to it.
+
+Templates are plain text with two kinds of tags...
+
+* **{{ expression }}** writes the value of a python expression
+* **{% for/if/elif/else %}** ... **{% end %}** are their python counterparts
+
+A block tag alone on its line takes that line with it, so templates can be
+laid out like the html they produce.
+"""
+
+import re
+
+_TOKENS = re.compile(r'^[ \t]*\{%(.*?)%\}[ \t]*\n|\{%(.*?)%\}|\{\{(.*?)\}\}', re.MULTILINE)
+
+class Template:
+	"""
+	Template compiled into a python function.
+
+	:var str name: name of the template
+	:var tuple params: names of the values the template is rendered with
+	"""
+
+	def __init__(self, name, params, source):
+		self.name = name
+		self.params = params
+
+		code = ['def render(_append, %s_str=str):' % ''.join(param + ', ' for param in params), '\tpass']
+		depth, position = 1, 0
+
+		for match in _TOKENS.finditer(source):
+			if match.start() > position:
+				code.append('\t' * depth + '_append(%r)' % source[position:match.start()])
+			position = match.end()
+
+			if match.group(3) is not None:
+				code.append('\t' * depth + '_append(_str(%s))' % match.group(3).strip())
+				continue
+
+			tag = (match.group(1) if match.group(1) is not None else match.group(2)).strip()
+			keyword = tag.split(' ', 1)[0]
+
+			if keyword in ('for', 'if'):
+				code.append('\t' * depth + tag + ':')
+				depth += 1
+				code.append('\t' * depth + 'pass')
+			elif keyword in ('elif', 'else') and depth > 1:
+				code.append('\t' * (depth - 1) + tag + ':')
+				code.append('\t' * depth + 'pass')
+			elif keyword == 'end' and depth > 1:
+				depth -= 1
+			else:
+				raise ValueError("Template %s has an unexpected tag: {%% %s %%}" % (name, tag))
+
+		if depth != 1:
+			raise ValueError('Template %s is missing an {%% end %%}' % name)
+		elif position < len(source):
+			code.append('\t' * depth + '_append(%r)' % source[position:])
+
+		namespace = {}
+		exec(compile('\n'.join(code), '<template %s>' % name, 'exec'), namespace)
+		self._render = namespace['render']
+
+	def write(self, output, **model):
+		"""
+		Renders the template into a file-like object.
+		"""
+
+		self._render(output.write, **model)
+
+	def render(self, **model):
+		"""
+		Renders the template.
+
+		:returns: **str** with the rendered template
+		"""
+
+		fragments = []
+		self._render(fragments.append, **model)
+		return ''.join(fragments)
+
+PAGE_HEADER = Template('page_header', ('include_relay_info',), """\
+<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.0 Transitional//EN">
+<html>
+  <head>
+    <title>Consensus health</title>
+    <meta http-equiv="content-type" content="text/html; charset=ISO-8859-1">
+    <link href="stylesheet-ltr.css" type="text/css" rel="stylesheet">
+    <link href="favicon.ico" type="image/x-icon" rel="shortcut icon">
+  </head>
+  <body>
+  <style>
+    tr:nth-child(2n) {
+      background-color:#eeeeee;
+    }
+    .oiv, a.oiv {
+      color:red;
+    }
+    .oic {
+      color:gray;
+      text-decoration:line-through;
+    }
+    .oict {
+      opacity:0;
+      font-size:0;
+    }
+    .ic {
+      color:blue;
+    }
+    .tbl-hdr {
+      height:3em;
+      vertical-align:bottom;
+    }
+    #relay-list td {
+      white-space:pre;
+    }
+    #ipv6stats-tbl td span {
+      font-size: smaller;
+    }
+  </style>
+    <div class="center">
+      <div class="main-column">
+        <h2>Consensus Health</h2>
+        <br>
+        <p>This page shows statistics about the current consensus and votes to facilitate debugging of the directory consensus process.\
+{% if not include_relay_info %}<br />This is the abbreviated page. The <a href="consensus-health.html">detailed page</a> which includes the (large) relay info table is also available.{% end %}</p>
+""")
+
+VALID_AFTER_TIME = Template('valid_after_time', ('valid_after', 'expired', 'unusual'), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="validafter">
+<h3><a href="#validafter" class="anchor">Valid-after time</a></h3>
+<br>
+<p>Consensus was published {% if expired %}<span class="oiv">{{ valid_after }}</span>{% else %}{{ valid_after }}{% end %} UTC. <i>Note that it takes up to 15 minutes to learn about new consensus and votes and process them.</i></p>
+{% if unusual %}
+<p>Unusual Authorities:</p>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="160">
+    <col width="640">
+  </colgroup>
+{% end %}
+{% for (dirauth_nickname, valid_after) in unusual %}
+  <tr>
+    <td>{{ dirauth_nickname }}</td>
+{% if valid_after is None %}
+    <td class="oiv">Consensus could not be retrieved</td>
+  </tr>
+  </tr>
+{% else %}
+    <td>{{ valid_after }}</td>  </tr>
+{% end %}
+{% end %}
+</table>
+""")
+
+SIGNATURES = Template('signatures', ('authorities',), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="signatures">
+<h3><a href="#signatures" class="anchor">Signatures</a></h3>
+<br>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="160">
+    <col width="640">
+  </colgroup>
+{% for (dirauth_nickname, dir_address, bandwidth_file, listed, signed, valid_after) in authorities %}
+  <tr>
+    <td>{{ dirauth_nickname }}</td>
+{% if dir_address is None %}
+    <td class="oiv">Missing entirely from consensus</td>
+{% else %}
+    <td><a href="http://{{ dir_address }}/tor/status-vote/current/consensus">consensus</a> (<a href="http://{{ dir_address }}/tor/status-vote/current/consensus-microdesc">microdesc</a>) <a href="http://{{ dir_address }}/tor/status-vote/current/authority">vote</a> <a href="http://{{ dir_address }}/tor/server/all">descriptors</a>{% if bandwidth_file %} <a href="http://{{ dir_address }}/tor/status-vote/next/bandwidth">bandwidth file</a>{% end %}</td>
+{% end %}
+{% if not listed %}
+{% elif signed %}
+    <td></td>
+{% elif valid_after is not None %}
+    <td class="oiv">Missing Signature! Valid-after time of auth's displayed consensus: {{ valid_after }}</td>
+{% else %}
+    <td class="oiv">Missing Signature, and {{ dirauth_nickname }} does not have a consensus available</td>
+{% end %}
+  </tr>
+{% end %}
+</table>
+""")
+
+KNOWN_FLAGS = Template('known_flags', ('votes', 'consensus_flags'), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="knownflags">
+<h3><a href="#knownflags" class="anchor">Known flags</a></h3>
+<br>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="160">
+    <col width="640">
+  </colgroup>
+{% for (dirauth_nickname, known_flags) in votes %}
+  <tr>
+    <td>{{ dirauth_nickname }}</td>
+{% if known_flags is None %}
+    <td class="oiv">Vote could not be retrieved</td>
+{% else %}
+    <td>known-flags{% for flag in known_flags %} {{ flag }}{% end %}</td>
+{% end %}
+  </tr>
+{% end %}
+  <tr>
+    <td class="ic">consensus</td>
+    <td class="ic">known-flags{% for flag in consensus_flags %} {{ flag }}{% end %}</td>
+  </tr>
+</table>
+""")
+
+FLAG_THRESHOLDS = Template('flag_thresholds', ('votes',), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="flagthresholds">
+<h3><a href="#flagthresholds" class="anchor">Flag Thresholds</a></h3>
+<br>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="160">
+    <col width="640">
+  </colgroup>
+{% for (dirauth_nickname, thresholds) in votes %}
+  <tr>
+    <td>{{ dirauth_nickname }}</td>
+{% if thresholds is None %}
+    <td class="oiv">Vote could not be retrieved</td>
+{% else %}
+    <td>flag-thresholds{% for (key, value) in thresholds %} {{ key }}={{ value }}{% end %}</td>
+{% end %}
+  </tr>
+{% end %}
+</table>
+""")
+
+NUMBER_OF_RELAYS_VOTED_ABOUT = Template('number_of_relays_voted_about', ('link_to_graph', 'votes', 'consensus_running'), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="numberofrelays">
+<h3><a href="#numberofrelays" class="anchor">Number of relays voted about</a></h3>
+{% if link_to_graph %}
+<p>
+  You can also view <a href="graphs.html">historical voting graphs</a>.
+</p>
+{% else %}
+<br />
+{% end %}
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="160">
+    <col width="320">
+    <col width="320">
+  </colgroup>
+{% if votes is None %}
+  <tr><td>(No votes.)</td><td></td><td></td></tr>
+{% else %}
+{% for (dirauth_nickname, total, running) in votes %}
+  <tr>
+    <td>{{ dirauth_nickname }}</td>
+{% if total is None %}
+    <td colspan="2"><span class="oiv">Vote could not be retrieved<span></td>
+{% else %}
+    <td>{{ total }} total</td>
+    <td>{{ running }} Running</td>
+{% end %}
+  </tr>
+{% end %}
+{% end %}
+  <tr>
+    <td class="ic">consensus</td>
+    <td/>
+    <td class="ic">{{ consensus_running }} Running</td>
+  </tr>
+</table>
+""")
+
+IPV6_STATS = Template('ipv6_stats', ('votes', 'consensus'), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="ipv6stats">
+<h3><a href="#ipv6stats" class="anchor">IPv6 Statistics</a></h3>
+<br>
+Percentages are of total number of relays in the vote or cosensus, and then percentage of bandwidth weight.
+<br>
+When a DirAuth reports 0 relays with an IPv6 ORPort, the DirAuth itself lacks IPv6. When the second percentage (bw weight) is missing, the DirAuth does not have a bwauth.
+<br>
+<table id="ipv6stats-tbl" border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="160">
+    <col width="168">
+    <col width="136">
+    <col width="168">
+    <col width="168">
+  </colgroup>
+{% if votes is None %}
+  <tr><td colspan="5">(No votes.)</td></tr>
+{% else %}
+  <tr>
+    <th>DirAuth</th>    <th>IPv6 ORPort</th>    <th>Partial Reachability Support</th>    <th>Full Reachability Support</th>  </tr>
+{% for (dirauth_nickname, columns) in votes %}
+  <tr>
+    <td>{{ dirauth_nickname }}</td>
+{% if columns is None %}
+    <td colspan="4" class="oiv">Vote could not be retrieved</td>
+{% else %}
+{% for (count, share, weight_share) in columns %}
+    <td>      {{ count }} <span>({{ share }}%{% if weight_share is not None %}, {{ weight_share }}%{% end %})</span>    </td>
+{% end %}
+{% end %}
+  </tr>
+{% end %}
+{% end %}
+  <tr>
+    <td>consensus</td>
+{% for (count, share, weight_share) in consensus %}
+    <td class="ic">      {{ count }} <span>({{ share }}%{% if weight_share is not None %}, {{ weight_share }}%{% end %})</span>    </td>
+{% end %}
+  </tr>
+</table>
+""")
+
+CONSENSUS_METHODS = Template('consensus_methods', ('votes', 'consensus_method'), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="consensusmethods">
+<h3><a href="#consensusmethods" class="anchor">Consensus methods</a></h3>
+<br>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="160">
+    <col width="640">
+  </colgroup>
+{% if votes is None %}
+  <tr><td>(No votes.)</td><td></td></tr>
+{% else %}
+{% for (dirauth_nickname, consensus_methods) in votes %}
+  <tr>
+{% if consensus_methods is None %}
+    <td>{{ dirauth_nickname }}</td>
+    <td class="oiv">Vote could not be retrieved</td>
+{% elif consensus_method in consensus_methods %}
+    <td>{{ dirauth_nickname }}</td>
+    <td>consensus-methods{% for method in consensus_methods %} {{ method }}{% end %}</td>
+{% else %}
+    <td class="oiv">{{ dirauth_nickname }}</td>
+    <td class="oiv">consensus-methods{% for method in consensus_methods %} {{ method }}{% end %}</td>
+{% end %}
+  </tr>
+{% end %}
+{% end %}
+  <tr>
+    <td class="ic">consensus</td>
+    <td class="ic">consensus-method {{ consensus_method }}    </td>
+  </tr>
+</table>
+""")
+
+RECOMMENDED_VERSIONS = Template('recommended_versions', ('votes', 'client_versions', 'server_versions'), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="recommendedversions">
+<h3><a href="#recommendedversions" class="anchor">Recommended versions</a></h3>
+<br>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="160">
+    <col width="640">
+  </colgroup>
+{% if votes is None %}
+  <tr><td>(No votes.)</td><td></td></tr>
+{% else %}
+{% for (dirauth_nickname, recommendations) in votes %}
+{% if recommendations is None %}
+  <tr>
+    <td>{{ dirauth_nickname }}</td>
+    <td class="oiv">Vote could not be retrieved</td>
+  </tr>
+{% else %}
+{% for (kind, versions, unlisted) in recommendations %}
+  <tr>
+    <td>{{ dirauth_nickname }}</td>
+    <td>{{ kind }} {% for (i, (version, listed)) in enumerate(versions) %}{% if i %}, {% end %}{% if listed %}{{ version }}{% else %}<span class="oiv">{{ version }}</span>{% end %}{% end %}{% for version in unlisted %}, <span class="oiv"><s>{{ version }}</s></span>{% end %}</td>
+  </tr>
+{% end %}
+{% end %}
+{% end %}
+{% end %}
+  <tr>
+    <td class="ic">consensus</td>
+    <td class="ic">client-versions {{ ', '.join(client_versions) }}</td>
+  </tr>
+  <tr>
+    <td></td>
+    <td class="ic">server-versions {{ ', '.join(server_versions) }}</td>
+  </tr>
+</table>
+""")
+
+CONSENSUS_PARAMETERS = Template('consensus_parameters', ('votes', 'consensus_params'), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="consensusparams">
+<h3><a href="#consensusparams" class="anchor">Consensus parameters</a></h3>
+<br>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="160">
+    <col width="640">
+  </colgroup>
+{% if votes is None %}
+  <tr><td>(No votes.)</td><td></td></tr>
+{% else %}
+{% for (dirauth_nickname, params, conflicting) in votes %}
+  <tr>
+{% if params is None %}
+    <td>{{ dirauth_nickname }}</td>
+    <td class="oiv">Vote could not be retrieved</td>
+{% else %}
+    <td{% if conflicting %} class="oiv"{% end %}>{{ dirauth_nickname }}</td>
+    <td>params{% for (key, value, conflicts) in params %}{% if conflicts %} <span class="oiv">{{ key }}={{ value }}</span>{% else %} {{ key }}={{ value }}{% end %}{% end %}</td>
+{% end %}
+  </tr>
+{% end %}
+{% end %}
+  <tr>
+    <td class="ic">consensus</td>
+    <td class="ic">params{% for (key, value) in consensus_params %} {{ key }}={{ value }}{% end %}    </td>
+  </tr>
+</table>
+""")
+
+AUTHORITY_KEYS = Template('authority_keys', ('votes',), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="authoritykeys">
+<h3><a href="#authoritykeys" class="anchor">Authority keys</a></h3>
+<br>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="160">
+    <col width="300">
+    <col width="170">
+    <col width="170">
+  </colgroup>
+  <tr>
+    <th>Name</th>
+    <th>Expiry</th>
+    <th>Identity Key Len.</th>
+    <th>Signing Key Len.</th>
+  </tr>
+{% if votes is None %}
+  <tr><td>(No votes.)</td><td></td></tr>
+{% else %}
+{% for (dirauth_nickname, expires, expiring, identity_key_size, signing_key_size) in votes %}
+  <tr>
+{% if expires is None %}
+    <td>{{ dirauth_nickname }}</td>
+    <td colspan="3"><span class="oiv">Vote could not be retrieved<span></td>
+{% else %}
+    <td{% if expiring %} class="oiv"{% end %}>{{ dirauth_nickname }}</td>
+    <td{% if expiring %} class="oiv"{% end %}>{{ expires }}</td>
+    <td>{{ identity_key_size }}</td>
+    <td>{{ signing_key_size }}</td>
+{% end %}
+  </tr>
+{% end %}
+</table>
+<br>
+<p><i>All times UTC. Note that expiration dates of any legacy keys are not included in votes and therefore not listed here!</i></p>
+{% end %}
+""")
+
+AUTHORITY_CLOCKS = Template('authority_clocks', ('clocks',), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="authorityclocks">
+<h3><a href="#authorityclocks" class="anchor">Authority Clock Skew</a></h3>
+<br>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="160">
+    <col width="640">
+  </colgroup>
+  <tr>
+    <th>Name</th>
+    <th>Approximate Clock Skew</th>
+  </tr>
+{% if clocks is None %}
+  <tr><td>(No clock skew data.)</td><td></td></tr>
+{% else %}
+{% for (dirauth_nickname, clock, skewed) in clocks %}
+  <tr>
+    <td{% if skewed %} class="oiv"{% end %}>{{ dirauth_nickname }}</td>
+{% if clock is None %}
+    <td><span class="oiv">Could not query authority<span></td>
+{% else %}
+    <td{% if skewed %} class="oiv"{% end %}>{{ clock }} seconds</td>
+{% end %}
+  </tr>
+{% end %}
+</table>
+<br>
+<p><i>Times are roughly accurate, anything below a couple seconds should be fine. Please use this table as a guide rather than an authoritative source.</i></p>
+{% end %}
+""")
+
+SHARED_RANDOM = Template('shared_random', ('votes', 'consensus', 'reveal_required'), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="sharedrandom">
+<h3><a href="#sharedrandom" class="anchor">Shared Random</a></h3>
+<br>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="140">
+    <col width="180">
+    <col width="480">
+  </colgroup>
+{% if votes is None %}
+  <tr><td>(No votes.)</td><td></td></tr>
+{% else %}
+{% for (dirauth_nickname, authority, previous_differs, current_differs) in votes %}
+  <tr>
+{% if authority is None %}
+    <td>{{ dirauth_nickname }}</td>
+    <td colspan="2"><span class="oiv">Vote could not be retrieved<span></td>
+{% elif not authority.is_shared_randomness_participate %}
+    <td><span class="oiv">{{ dirauth_nickname }}</span></td>
+    <td colspan="2"><span class="oiv">Does not participate</span></td>
+{% else %}
+    <td>{{ dirauth_nickname }}</td>
+    <td>Previous</td>
+    <td{% if previous_differs %} class="oiv"{% end %}>{{ authority.shared_randomness_previous_reveal_count }} {{ authority.shared_randomness_previous_value }}</td>
+  </tr>
+  <tr>
+    <td></td>
+    <td>Current</td>
+    <td{% if current_differs %} class="oiv"{% end %}>{{ authority.shared_randomness_current_reveal_count }} {{ authority.shared_randomness_current_value }}</td>
+</td>
+  </tr>
+  <tr>
+    <td></td>
+    <td>Commitments</td>
+    <td style="font-size:x-small">\
+{% for (i, commitment) in enumerate(authority.shared_randomness_commitments) %}{% if i %}, <br />{% end %}\
+[V:{{ commitment.version }} A:{{ commitment.algorithm }} \
+C:{% if commitment.commit %}{{ commitment.commit }}{% else %}<span class="oiv">(Empty)</span>{% end %}\
+R:{% if commitment.reveal %}{{ commitment.reveal }}{% elif reveal_required %}<span class="oiv">(Empty)</span>{% else %}(Empty){% end %}]{% end %}</td>
+{% end %}
+  </tr>
+{% end %}
+{% end %}
+  <tr>
+    <td class="ic">consensus</td>
+    <td class="ic">Previous</td>
+    <td class="ic">{{ consensus.shared_randomness_previous_reveal_count }} {{ consensus.shared_randomness_previous_value }}</td>
+  </tr>
+  <tr>
+    <td></td>
+    <td class="ic">Current</td>
+    <td class="ic">{{ consensus.shared_randomness_current_reveal_count }} {{ consensus.shared_randomness_current_value }}</td>
+  </tr>
+</table>
+""")
+
+PROTOCOLS = Template('protocols', ('votes', 'consensus'), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="protocols">
+<h3><a href="#protocols" class="anchor">Protocols</a></h3>
+<br>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="140">
+    <col width="180">
+    <col width="480">
+  </colgroup>
+{% if votes is None %}
+  <tr><td>(No votes.)</td><td></td></tr>
+{% else %}
+{% for (dirauth_nickname, protocols) in votes %}
+{% if protocols is None %}
+  <tr>
+    <td>{{ dirauth_nickname }}</td>
+    <td colspan="2" class="oiv">Vote could not be retrieved</td>
+  </tr>
+{% else %}
+{% for (i, (kind, versions)) in enumerate(protocols) %}
+  <tr>
+    <td>{% if i == 0 %}{{ dirauth_nickname }}{% end %}</td>
+    <td>{{ kind }}</td>
+    <td>{% for (protocol, version, differs) in versions %}{{ protocol }}={% if differs %}<span class="oiv">{% end %}{{ version }}{% if differs %}</span>{% end %} {% end %}</td>
+  </tr>
+{% end %}
+{% end %}
+{% end %}
+{% for (i, (kind, versions)) in enumerate(consensus) %}
+  <tr>
+{% if i == 0 %}
+    <td class="ic">consensus</td>
+{% else %}
+    <td></td>
+{% end %}
+    <td class="ic">{{ kind }}</td>
+    <td class="ic">{% for (protocol, version, differs) in versions %}{{ protocol }}={{ version }} {% end %}</td>
+  </tr>
+{% end %}
+</table>
+{% end %}
+""")
+
+BANDWIDTH_WEIGHTS = Template('bandwidth_weights', ('weights',), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="bwweights">
+<h3><a href="#bwweights" class="anchor">Bandwidth Scanner Weights</a></h3>
+<br>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="140">
+    <col width="480">
+    <col width="180">
+  </colgroup>
+{% if weights is None %}
+  <tr><td>(No consensus.)</td><td></td></tr>
+{% else %}
+{% for (i, (name, weight)) in enumerate(weights) %}
+  <tr>
+    <td class="ic">{% if i == 0 %}consensus{% end %}</td>
+    <td class="ic">{{ name }}</td>
+    <td class="ic">{{ weight }}</td>
+  </tr>
+{% end %}
+</table>
+{% end %}
+""")
+
+BANDWIDTH_SCANNER_STATUS = Template('bandwidth_scanner_status', ('link_to_graph', 'votes', 'missing_votes'), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="bwauthstatus">
+<h3><a href="#bwauthstatus" class="anchor">Bandwidth scanner status</a></h3>
+{% if link_to_graph %}
+<p>
+  You can also view <a href="graphs.html">historical Bandwidth Authority graphs</a>.
+</p>
+{% else %}
+<br />
+{% end %}
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="160">
+    <col width="640">
+  </colgroup>
+{% if votes is None %}
+  <tr><td>(No votes.)</td><td></td></tr>
+{% else %}
+{% for (dirauth_nickname, measured) in votes %}
+  <tr>
+    <td>{{ dirauth_nickname }}</td>
+{% if measured %}
+    <td>{{ measured }} Measured values in w lines</td>
+{% else %}
+    <td class="oiv">Missing bwauth values in vote</td>
+{% end %}
+  </tr>
+{% end %}
+{% for dirauth_nickname in missing_votes %}
+  <tr>
+    <td>{{ dirauth_nickname }}</td>
+    <td class="oiv">Missing vote</td>
+  </tr>
+{% end %}
+{% end %}
+</table>
+""")
+
+BANDWIDTH_SCANNER_INFO = Template('bandwidth_scanner_info', ('votes',), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="bwauthinfo">
+<h3><a href="#bwauthinfo" class="anchor">Bandwidth scanner information</a></h3>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="160">
+    <col width="640">
+  </colgroup>
+{% if votes is None %}
+  <tr><td>(No votes.)</td><td></td></tr>
+{% else %}
+{% for (dirauth_nickname, headers) in votes %}
+  <tr>
+    <td>{{ dirauth_nickname }}</td>
+{% if headers is None %}
+    <td class="oiv">Missing vote</td>
+{% else %}
+    <td>{% for (key, value, note) in headers %}{{ key }}={{ value }} {% if note is not None %}({{ note }}) {% end %}{% end %}</td>
+{% end %}
+  </tr>
+{% end %}
+{% end %}
+</table>
+""")
+
+FALLBACK_DIRECTORY_STATUS = Template('fallback_directory_status', ('link_to_graph', 'counts'), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="fallbackdirstatus">
+<h3><a href="#fallbackdirstatus" class="anchor">Fallback Directory status</a></h3>
+{% if link_to_graph %}
+<p>
+  You can also view <a href="graphs.html">historical Fallback Directory graphs</a>.
+</p>
+{% else %}
+<br />
+{% end %}
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="160">
+    <col width="640">
+  </colgroup>
+{% if counts is None %}
+  <tr><td>(No consensus.)</td><td></td></tr>
+{% else %}
+{% for (status, count) in counts %}
+  <tr>
+    <td>{{ status }}</td>
+    <td>{{ count }}</td>
+  </tr>
+{% end %}
+{% end %}
+</table>
+""")
+
+AUTHORITY_VERSIONS = Template('authority_versions', ('authorities',), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="authorityversions">
+<h3><a href="#authorityversions" class="anchor">Authority versions</a></h3>
+<br>
+{% if not authorities %}
+<p>(No relays with Authority flag found.)</p>
+{% else %}
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="160">
+    <col width="640">
+  </colgroup>
+{% for (nickname, version) in authorities %}
+  <tr>
+    <td>{{ nickname }}</td>
+    <td>{{ version }}</td>
+  </tr>
+{% end %}
+</table>
+<br>
+<p><i>Note that this list of relays with the Authority flag may be different from the list of v3 directory authorities!</i></p>
+{% end %}
+""")
+
+DOWNLOAD_STATISTICS = Template('download_statistics', ('authorities',), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="downloadstats">
+<h3><a href="#downloadstats" class="anchor">Consensus download statistics</a></h3>
+<br>
+<p>The following table contains statistics on consensus download times in milliseconds over the last 7 days:</p>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="160">
+    <col width="100">
+    <col width="100">
+    <col width="100">
+    <col width="100">
+    <col width="100">
+    <col width="100">
+  </colgroup>
+  <tr><th>Authority</th>
+    <th>Minimum</th>
+    <th>1st Quartile</th>
+    <th>Median</th>
+    <th>3rd Quartile</th>
+    <th>Maximum</th>
+    <th>Timeouts</th>
+  </tr>
+{% for (dirauth_nickname, percentiles, timeouts) in authorities %}
+  <tr>
+{% if percentiles is None %}
+     <td colspan="7"><span class="oiv">{{ dirauth_nickname }} not present in download statistics</span></td>
+{% else %}
+    <td>{{ dirauth_nickname }}</td>
+{% for value in percentiles %}
+    <td>{{ value }}</td>
+{% end %}
+    <td>{{ timeouts }}</td>
+{% end %}
+  </tr>
+{% end %}
+</table>
+""")
+
+VOTE_VALIDITY = Template('vote_validity', ('validation',), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="vote">
+<h3><a href="#vote" class="anchor">Validity of votes</a></h3>
+<br>
+<p>This table monitors the votes each authority receives from other authorities.</p>
+<br>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="160">
+    <col width="630">
+  </colgroup>
+  <tr>
+    <td><b>Sender</b></td>
+    <td><b>Receiver</b></td>
+{% for (dirauth_sender, receivers) in validation %}
+<tr>
+<td>{{ dirauth_sender }}</td>
+<td>
+{% for (dirauth_receiver, (url, status)) in receivers %}
+<a class="{% if status != 'OK' %}oiv{% end %}" href = "{{ url }}" title = "{{ status }}">{{ dirauth_receiver }}</a> 
+{% end %}
+</td></tr>
+{% end %}
+</table>
+""")
+
+RELAY_INFO_SUMMARY = Template('relay_info_summary', ('votes',), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="overlap">
+<h3><a href="#overlap" class="anchor">Overlap between votes and consensus</a></h3>
+<br>
+<p>The semantics of columns is as follows:</p>
+<ul>
+  <li><b>In vote and consensus:</b> Flag in vote matches flag in consensus, or relay is not listed in consensus (because it doesn't have the Running flag)</li>
+  <li><b><span class="oiv">Only in vote:</span></b> Flag in vote, but missing in the consensus, because there was no majority for the flag or the flag was invalidated (e.g., Named gets invalidated by Unnamed)</li>
+  <li><b><span class="oic">Only in consensus:</span></b> Flag in consensus, but missing in a vote of a directory authority voting on this flag.</li>
+</ul>
+<br>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="160">
+    <col width="210">
+    <col width="210">
+    <col width="210">
+  </colgroup>
+  <tr>
+    <td></td>
+    <td><b>Only in vote</b></td>    <td><b>In vote and consensus</b></td>    <td><b>Only in consensus</b></td>
+{% for (dirauth_nickname, flags) in votes %}
+{% if flags is None %}
+  <tr>
+    <td>{{ dirauth_nickname }}</td>
+    <td colspan="3"><span class="oiv">Vote could not be retrieved<span></td>
+  </tr>
+{% else %}
+{% for (i, (flag, lost, agree, missing)) in enumerate(flags) %}
+  <tr>
+    <td>{% if i == 0 %}{{ dirauth_nickname }}{% end %}</td>
+{% if lost %}
+    <td class="oiv"> {{ lost }} {{ flag }}</td>
+{% else %}
+    <td></td>
+{% end %}
+    <td>{{ agree }} {{ flag }}</td>
+{% if missing %}
+    <td><span class="oict">!</span><span class="oic">{{ missing }} {{ flag }}</span></td>
+{% else %}
+    <td></td>
+{% end %}
+  </tr>
+{% end %}
+{% end %}
+{% end %}
+</table>
+""")
+
+RELAY_INFO_INTRO = Template('relay_info_intro', (), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="relayinfo">
+<h3><a href="#relayinfo" class="anchor">Relay info</a></h3>
+<br>
+<p>The semantics of flags written in the table is similar to the table above:</p>
+<ul>
+  <li><b>In vote and consensus:</b> Flag in vote matches flag in consensus, or relay is not listed in consensus (because it doesn't have the Running flag)</li>
+  <li><b><span class="oiv">Only in vote:</span></b> Flag in vote, but missing in the consensus, because there was no majority for the flag or the flag was invalidated (e.g., Named gets invalidated by Unnamed)</li>
+  <li><b><span class="oic">Only in consensus:</span></b> Flag in consensus, but missing in a vote of a directory authority voting on this flag. One can search the page for such flags by prefacing them with !</li>
+  <li><b><span class="ic">In consensus:</span></b> Flag in consensus</li>
+</ul>
+<br>
+""")
+
+RELAY_INFO_TABLE_START = Template('relay_info_table_start', ('dirauth_nicknames', 'column_width'), """\
+<table border="0" cellpadding="4" cellspacing="0" id="relay-list" summary="">
+  <colgroup>
+    <col width="120">
+    <col width="80">
+{% for dirauth_nickname in dirauth_nicknames %}
+    <col width="{{ column_width }}">
+{% end %}
+  </colgroup>
+""")
+
+RELAY_INFO_TABLE_END = Template('relay_info_table_end', ('footnote',), """\
+</table>
+{% if footnote %}<p class="bottom"><sup>1</sup> We are missing at least one vote, and the assigning bwauth is probably one of the missing vote(s).&nbsp;&nbsp;<sup>2</sup> This is a bug, please report it (and the consensus time)</p>{% end %}""")
+
+RELAY_INFO_MID_HEADER = Template('relay_info_mid_header', ('dirauth_nicknames',), """\
+  <tr class="tbl-hdr">
+    <th>Fingerprint</th>
+    <th>Nickname</th>
+{% for dirauth_nickname in dirauth_nicknames %}
+    <th>{{ dirauth_nickname }}</th>
+{% end %}
+    <th>consensus</th>
+  </tr>
+""")
+
+RELAY_INFO_ROW = Template('relay_info_row', ('fingerprint', 'nickname', 'previous_consensus', 'votes', 'consensus'), """\
+  <tr>
+    <td id="{{ fingerprint }}">{{ fingerprint[0:8] }}<br /><span class="tiny">{{ fingerprint }}</span></td>
+    <td>{{ nickname }} <br /><span class="agt"><a href="https://metrics.torproject.org/rs.html#details/{{ fingerprint }}">Relay Search</a> | <a href="consensus-health-{{ previous_consensus }}.html#{{ fingerprint }}">&#8668;</a></span></td>
+{% for lines in votes %}
+    <td>{% if lines is not None %}{{ ' <br />'.join(lines) }}</td>
+{% else %}</td>
+{% end %}
+{% end %}
+{% if consensus is not None %}
+    <td class="ic">{{ ' <br />'.join(consensus) }}</td>
+{% else %}
+    <td></td>
+{% end %}
+  </tr>
+""")
+
+RELAY_INFO_POINTER = Template('relay_info_pointer', (), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="relayinfo">
+<h3><a href="#relayinfo" class="anchor">Relay info</a></h3>
+<br>
+<p>Looking for the (huge) relay info table? It's been moved to the <a href="consensus-health.html">detailed page</a> to speed up this page.</p>
+
+<p id="relay-addition-javascript-pointer">If you enable javascript, you will be able to add individual relays from the current consensus to this page.</p>
+
+<script src="jquery-3.3.1.min.js"></script>
+<script type="text/javascript">
+  var shards = {}, relayIndexes = null, loadedRelays = [];
+  var loadShard = function(prefix) {
+    let shard = shards[prefix];
+    if (shard === undefined) {
+      shard = shards[prefix] = $.getJSON('relays/' + prefix + '.json');
+      // forget a failed request so the next search tries again
+      shard.fail(function () { delete shards[prefix]; });
+    }
+    return shard;
+  };
+  var loadIndexes = function() {
+    let indexes = relayIndexes;
+    if (indexes == null) {
+      indexes = relayIndexes = $.get('relay-indexes.txt').then(function (data) {
+        let nicknames = {};
+        let lines = data.split('\\n');
+        for (let i=0; i<lines.length; i++) {
+          let parts = lines[i].split(':');
+          if (parts.length != 3) continue;
+          nicknames[parts[0]] = parts[1];
+        }
+        console.log('Loaded relay index');
+        return nicknames;
+      });
+      indexes.fail(function () { relayIndexes = null; });
+    }
+    return indexes;
+  };
+  var addRelays = function(shard, matches) {
+    for (let i in matches) {
+      let fullFP = matches[i];
+      if (loadedRelays.indexOf(fullFP) >= 0) continue;
+      loadedRelays.push(fullFP);
+      $('#relay-list tr').first().after(shard[fullFP].row);
+    }
+  };
+  var searchIndexes = function(partialFP) {
+    loadIndexes().then(function (nicknames) {
+      let found = false;
+      for (let r in nicknames) {
+        if (nicknames[r].toUpperCase() == partialFP || r.startsWith(partialFP)) {
+          found = true;
+          loadShard(r.substring(0, 2)).then(function (shard) { addRelays(shard, [r]); }, function () {
+            alert("Could not load relay " + r + ", please try again.");
+          });
+        }
+      }
+      if (!found) {
+        alert("Could not match " + partialFP + " to a full or partial fingerprint or a nickname.");
+      }
+    }, function () {
+      alert("Could not load the relay index, please try again.");
+    });
+  };
+  var loadData = function() {
+    let fps = $('#fingerprintBox').val().split(',');
+    for (let i in fps) {
+      let partialFP = fps[i].trim().toUpperCase();
+      if (partialFP.length == 0) continue;
+      if (!/^[0-9A-F]{2,40}$/.test(partialFP)) {
+        searchIndexes(partialFP);
+        continue;
+      }
+      loadShard(partialFP.substring(0, 2)).then(function (shard) {
+        let matches = Object.keys(shard).filter(function (r) { return r.startsWith(partialFP); });
+        if (matches.length > 0) {
+          addRelays(shard, matches);
+        } else {
+          searchIndexes(partialFP);
+        }
+      }, function () {
+        searchIndexes(partialFP);
+      });
+    }
+  };
+ $('#relay-addition-javascript-pointer').html('But you can add individual relays from the current consensus here. <input autocomplete="off" autocorrect="off" autocapitalize="off" spellcheck="false" type="text" id="fingerprintBox" placeholder="Fingerprint"/><input type="button" onclick="loadData()" value="Load"/>');
+ $('#fingerprintBox').on('keyup', function(e) { if(e.keyCode == 13) loadData(); });</script>
+""")
+
+PAGE_FOOTER = Template('page_footer', (), """\
+</div>
+</div>
+<div class="bottom" id="bottom">
+<p>This page was generated with depictor</p></div>
+</body>
+</html>""")
+
+GRAPHS_PAGE_HEADER = Template('graphs_page_header', (), """\
+<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.0 Transitional//EN">
+<html>
+  <head>
+    <title>Consensus health</title>
+    <meta http-equiv="content-type" content="text/html; charset=ISO-8859-1">
+    <link href="stylesheet-ltr.css" type="text/css" rel="stylesheet">
+    <link href="favicon.ico" type="image/x-icon" rel="shortcut icon">
+    <script src="d3.v4.min.js"></script>
+  </head>
+  <body>
+  <style>
+    svg {
+      font: 10px sans-serif;
+    }
+    .axis path,
+    .axis line {
+      fill: none;
+      stroke: #000;
+      shape-rendering: crispEdges;
+    }
+    .graph-title {
+    	font-size: 16px;
+    	text-decoration: underline;
+    }
+    .bwauth-graph-title {
+    	font-size: 12px;
+    	text-decoration: underline;
+    }
+    .graphbox {
+      text-align: center;
+      display: none;
+    }
+    .fallback_green {
+      fill: #1a9850;
+      stroke: #1a9850;
+      background-color: #1a9850;
+      stroke-width: 1.5px;
+    }
+    .fallback_orange {
+      fill: #fdae61;
+      stroke: #fdae61;
+      background-color: #fdae61;
+      stroke-width: 1.5px;
+    }
+    .fallback_red {
+      fill: #d73027;
+      stroke: #d73027;
+      background-color: #d73027;
+      stroke-width: 1.5px;
+    }
+    .bwauth_above {
+      fill: #984ea3;
+      stroke: #984ea3;
+      background-color: #984ea3;
+      stroke-width: 1.5px;
+    }
+    .bwauth_shared {
+      fill: #377eb8;
+      stroke: #377eb8;
+      background-color: #377eb8;
+      stroke-width: 1.5px;
+    }
+    .bwauth_exclusive {
+      fill: #4daf4a;
+      stroke: #4daf4a;
+      background-color: #4daf4a;
+      stroke-width: 1.5px;
+    }
+    .bwauth_below {
+      fill: #ff7f00;
+      stroke: #ff7f00;
+      background-color: #ff7f00;
+      stroke-width: 1.5px;
+    }
+    .bwauth_unmeasured {
+      fill: #e41a1c;
+      stroke: #e41a1c;
+      background-color: #e41a1c;
+      stroke-width: 1.5px;
+    }
+    .auth_moria1 {
+      stroke: #1f78b4 !important;
+      background-color: #1f78b4 !important;
+    }
+    .auth_tor26 {
+      stroke: #33a02c !important;
+      background-color: #33a02c !important;
+    }
+    .auth_dizum {
+      stroke: #e31a1c !important;
+      background-color: #e31a1c !important;
+    }
+    .auth_gabelmoo {
+      stroke: #ff7f00 !important;
+      background-color: #ff7f00 !important;
+    }
+    .auth_danneburg {
+      stroke: #6a3d9a !important;
+      background-color: #6a3d9a !important;
+    }
+    .auth_maatuska {
+      stroke: #a6cee3 !important;
+      background-color: #a6cee3 !important;
+    }
+    .auth_longclaw {
+      stroke: #b2df8a !important;
+      background-color: #b2df8a !important;
+    }
+    .auth_bastet {
+      stroke: #fb9a99 !important;
+      background-color: #fb9a99 !important;
+    }
+    .auth1 {
+      fill: none;
+      stroke: #1f78b4;
+      background-color: #1f78b4;
+      stroke-width: 1.5px;
+    }
+    .auth2 {
+      fill: none;
+      stroke: #33a02c;
+      background-color: #33a02c;
+      stroke-width: 1.5px;
+    }
+    .auth3 {
+      fill: none;
+      stroke: #e31a1c;
+      background-color: #e31a1c;
+      stroke-width: 1.5px;
+    }
+    .auth4 {
+      fill: none;
+      stroke: #ff7f00;
+      background-color: #ff7f00;
+      stroke-width: 1.5px;
+    }
+    .auth5 {
+      fill: none;
+      stroke: #6a3d9a;
+      background-color: #6a3d9a;
+      stroke-width: 1.5px;
+    }
+    .auth6 {
+      fill: none;
+      stroke: #a6cee3;
+      background-color: #a6cee3;
+      stroke-width: 1.5px;
+    }
+    .auth7 {
+      fill: none;
+      stroke: #b2df8a;
+      background-color: #b2df8a;
+      stroke-width: 1.5px;
+    }
+    .auth8 {
+      fill: none;
+      stroke: #fb9a99;
+      background-color: #fb9a99;
+      stroke-width: 1.5px;
+    }
+    .auth9 {
+      fill: none;
+      stroke: #fdbf6f;
+      background-color: #fdbf6f;
+      stroke-width: 1.5px;
+    }
+    .auth10 {
+      fill: none;
+      stroke: #cab2d6;
+      background-color: #cab2d6;
+      stroke-width: 1.5px;
+    }
+    .auth11 {
+      fill: none;
+      stroke: #ffff99;
+      background-color: #ffff99;
+      stroke-width: 1.5px;
+    }
+  </style>
+    <div class="center">
+      <div class="main-column">
+        <h2>Consensus Health</h2>
+        <br>
+        <p>This page shows statistics about the current consensus and votes to facilitate debugging of the directory consensus process.</p>
+""")
+
+GRAPHS_FALLBACK_DIRECTORY_STATUS = Template('graphs_fallback_directory_status', ('graphs',), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="fallbackdirgraphs">
+<h3><a href="#fallbackdirgraphs" class="anchor">Fallback Directory graphs</a></h3>
+<br>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="800">
+  </colgroup>
+  <tr class="graphplaceholder">
+    <td>
+      <div style="text-align:center">
+        Generating Graph... (requires SVG and Javascript support)
+      </div>
+    </td>
+  </tr>
+{% for graph in graphs %}
+  <tr>
+    <td>
+      <div id="{{ graph }}" class="graphbox">
+         <span class="fallback_green" style="margin-left:5px">&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;</span> Running
+         <span class="fallback_orange" style="margin-left:5px">&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;</span> Not Running
+         <span class="fallback_red" style="margin-left:5px">&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;</span> Missing From Consensus
+      </div>
+    </td>
+  </tr>
+{% end %}
+</table>
+""")
+
+GRAPHS_NUMBER_OF_RELAYS_VOTED_ABOUT = Template('graphs_number_of_relays_voted_about', ('graphs', 'nicknames'), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="votedaboutgraphs">
+<h3><a href="#votedaboutgraphs" class="anchor">Number of relays voted about graphs</a></h3>
+<br>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="800">
+  </colgroup>
+  <tr class="graphplaceholder">
+    <td>
+      <div style="text-align:center">
+        Generating Graph... (requires SVG and Javascript support)
+      </div>
+    </td>
+  </tr>
+{% for graph in graphs %}
+  <tr>
+    <td>
+      <div id="{{ graph }}" class="graphbox">
+{% for (i, nickname) in enumerate(nicknames) %}
+        <span class="auth_{{ nickname }} auth{{ i + 1 }}" style="margin-left:5px">&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;</span> {{ nickname }}
+{% end %}
+      </div>
+    </td>
+  </tr>
+{% end %}
+</table>
+""")
+
+GRAPHS_BANDWIDTH_SCANNER = Template('graphs_bandwidth_scanner', ('graphs', 'nicknames', 'statistics_graphs'), """\
+<br>
+
+
+ <!-- ================================================================= --><a name="bwauthgraphs">
+<h3><a href="#bwauthgraphs" class="anchor">Bandwidth scanner measured relays</a></h3>
+<br>
+<table border="0" cellpadding="4" cellspacing="0" summary="">
+  <colgroup>
+    <col width="800">
+  </colgroup>
+  <tr class="graphplaceholder">
+    <td>
+      <div style="text-align:center">
+        Generating Graph... (requires SVG and Javascript support)
+      </div>
+    </td>
+  </tr>
+{% for graph in graphs %}
+  <tr>
+    <td>
+      <div id="{{ graph }}" class="graphbox">
+{% for (i, nickname) in enumerate(nicknames) %}
+        <span class="auth_{{ nickname }} auth{{ i + 1 }}" style="margin-left:5px">&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;</span> {{ nickname }}
+{% end %}
+      </div>
+    </td>
+  </tr>
+{% end %}
+{% for (graph, days) in statistics_graphs %}
+  <tr>
+    <td>
+      <div id="{{ graph }}" class="graphbox">
+         <span class="graph-title">Bandwidth Auth Statistics, Past {{ days }} Days</span>
+         <br />
+         <span class="bwauth_above" style="margin-left:5px">&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;</span> above consensus
+         <span class="bwauth_shared" style="margin-left:5px">&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;</span> shared
+         <span class="bwauth_exclusive" style="margin-left:5px">&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;</span> exclusive
+         <span class="bwauth_below" style="margin-left:5px">&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;</span> below consensus
+         <span class="bwauth_unmeasured" style="margin-left:5px">&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;</span> unmeasured
+      </div>
+    </td>
+  </tr>
+{% end %}
+</table>
+""")
+
+GRAPHS_JAVASCRIPT = Template('graphs_javascript', ('logical_min', 'logical_max', 'bwauth_nicknames', 'dirauth_nicknames', 'ignore_fallback_dirs'), """\
+<script>
+		var AUTH_LOGICAL_MIN = {{ logical_min }},
+		    AUTH_LOGICAL_MAX = {{ logical_max }};
+		var WIDTH = 800,  BWAUTH_WIDTH = 800,
+		    HEIGHT = 500, BWAUTH_HEIGHT = 200,
+		    MARGIN = {top: 40, right: 40, bottom: 40, left: 40},
+		    BWAUTH_MARGIN = {top: 14, right: 40, bottom: 20, left: 40};
+		
+		
+
+		var bwauths = {{ bwauth_nicknames }};
+		var dirauths = {{ dirauth_nicknames }};
+		var ignore_fallback_dirs = {% if ignore_fallback_dirs %}true{% else %}false{% end %};
+
+		var _getBandwidthDataValue = function(d, dirauth) { return d[dirauth + "_bwauth"]; }
+		var _getRunningDataValue = function(d, dirauth) { return d[dirauth + "_running"]; }
+		var _getTotalDataValue =  function(d, dirauth) { return d[dirauth + "_known"]; }
+		var _getNonRunningDataValue = function(d, dirauth) { return d[dirauth + "_known"] - d[dirauth + "_running"]; }
+		var _getRunningUnmeasuredDataValue = function(d, dirauth) { return d[dirauth + "_running"] - d[dirauth + "_bwauth"]; }
+
+		var GRAPHS_TO_GENERATE = [
+			{ title: "Voted About Relays (Running), Past 7 Days", data_slice: 168, div: "voted_running_1", 
+				data_func: _getRunningDataValue, authorities: dirauths, min_ignore_limit:AUTH_LOGICAL_MIN, max_ignore_limit:AUTH_LOGICAL_MAX },
+			{ title: "Voted About Relays (Running), Past 14 Days", data_slice: 336, div: "voted_running_2", 
+				data_func: _getRunningDataValue, authorities: dirauths, min_ignore_limit:AUTH_LOGICAL_MIN, max_ignore_limit:AUTH_LOGICAL_MAX },
+			{ title: "Voted About Relays (Running), Past 30 Days", data_slice: 720, div: "voted_running_3", 
+				data_func: _getRunningDataValue, authorities: dirauths, min_ignore_limit:AUTH_LOGICAL_MIN, max_ignore_limit:AUTH_LOGICAL_MAX },
+			{ title: "Voted About Relays (Running), Past 90 Days", data_slice: 2160, div: "voted_running_4", 
+				data_func: _getRunningDataValue, authorities: dirauths, min_ignore_limit:AUTH_LOGICAL_MIN, max_ignore_limit:AUTH_LOGICAL_MAX },
+
+			{ title: "Voted About Relays (Total), Past 7 Days", data_slice: 168, div: "voted_total_1", 
+				data_func: _getTotalDataValue, authorities: dirauths, min_ignore_limit:AUTH_LOGICAL_MIN, max_ignore_limit:AUTH_LOGICAL_MAX },
+			{ title: "Voted About Relays (Total), Past 14 Days", data_slice: 336, div: "voted_total_2", 
+				data_func: _getTotalDataValue, authorities: dirauths, min_ignore_limit:AUTH_LOGICAL_MIN, max_ignore_limit:AUTH_LOGICAL_MAX },
+			{ title: "Voted About Relays (Total), Past 30 Days", data_slice: 720, div: "voted_total_3", 
+				data_func: _getTotalDataValue, authorities: dirauths, min_ignore_limit:AUTH_LOGICAL_MIN, max_ignore_limit:AUTH_LOGICAL_MAX },
+			{ title: "Voted About Relays (Total), Past 90 Days", data_slice: 2160, div: "voted_total_4", 
+				data_func: _getTotalDataValue, authorities: dirauths, min_ignore_limit:AUTH_LOGICAL_MIN, max_ignore_limit:AUTH_LOGICAL_MAX },
+
+			{ title: "Voted About Relays (Not Running), Past 7 Days", data_slice: 168, div: "voted_notrunning_1", 
+				data_func: _getNonRunningDataValue, authorities: dirauths, min_ignore_limit:0, max_ignore_limit:4000 },
+			{ title: "Voted About Relays (Not Running), Past 14 Days", data_slice: 336, div: "voted_notrunning_2", 
+				data_func: _getNonRunningDataValue, authorities: dirauths, min_ignore_limit:0, max_ignore_limit:4000 },
+			{ title: "Voted About Relays (Not Running), Past 30 Days", data_slice: 720, div: "voted_notrunning_3", 
+				data_func: _getNonRunningDataValue, authorities: dirauths, min_ignore_limit:0, max_ignore_limit:4000 },
+			{ title: "Voted About Relays (Not Running), Past 90 Days", data_slice: 2160, div: "voted_notrunning_4", 
+				data_func: _getNonRunningDataValue, authorities: dirauths, min_ignore_limit:0, max_ignore_limit:4000 },
+
+			{ title: "BWAuth Measured Relays, Past 7 Days", data_slice: 168, div: "bwauth_measured_1", 
+				data_func: _getBandwidthDataValue, authorities: bwauths, min_ignore_limit:AUTH_LOGICAL_MIN, max_ignore_limit:AUTH_LOGICAL_MAX },
+			{ title: "BWAuth Measured Relays, Past 14 Days", data_slice: 336, div: "bwauth_measured_2", 
+				data_func: _getBandwidthDataValue, authorities: bwauths, min_ignore_limit:AUTH_LOGICAL_MIN, max_ignore_limit:AUTH_LOGICAL_MAX },
+			{ title: "BWAuth Measured Relays, Past 30 Days", data_slice: 720, div: "bwauth_measured_3", 
+				data_func: _getBandwidthDataValue, authorities: bwauths, min_ignore_limit:AUTH_LOGICAL_MIN, max_ignore_limit:AUTH_LOGICAL_MAX },
+			{ title: "BWAuth Measured Relays, Past 90 Days", data_slice: 2160, div: "bwauth_measured_4", 
+				data_func: _getBandwidthDataValue, authorities: bwauths, min_ignore_limit:AUTH_LOGICAL_MIN, max_ignore_limit:AUTH_LOGICAL_MAX },
+
+			/* These graphs are very misleading and not helpful
+			{ title: "BWAuth Running Unmeasured Relays, Past 30 Days", data_slice: 720, div: "bwauth_running_unmeasured_1", 
+				data_func: _getRunningUnmeasuredDataValue, authorities: bwauths, min_ignore_limit:-1000, max_ignore_limit:AUTH_LOGICAL_MAX },
+			{ title: "BWAuth Running Unmeasured Relays, Past 90 Days", data_slice: 2160, div: "bwauth_running_unmeasured_2", 
+				data_func: _getRunningUnmeasuredDataValue, authorities: bwauths, min_ignore_limit:-1000, max_ignore_limit:AUTH_LOGICAL_MAX },
+			{ title: "BWAuth Running Unmeasured Relays, Past Year", data_slice: 8760, div: "bwauth_running_unmeasured_3", 
+				data_func: _getRunningUnmeasuredDataValue, authorities: bwauths, min_ignore_limit:-1000, max_ignore_limit:AUTH_LOGICAL_MAX },
+			{ title: "BWAuth Running Unmeasured Relays, Past 2 Years", data_slice: 17520, div: "bwauth_running_unmeasured_4", 
+				data_func: _getRunningUnmeasuredDataValue, authorities: bwauths, min_ignore_limit:-1000, max_ignore_limit:AUTH_LOGICAL_MAX },
+			*/
+		];
+
+		var FALLBACK_GRAPHS_TO_GENERATE = [
+			{ title: "Fallback Directories Running, Past 7 Days", data_slice: 168, div: "fallbackdirs_1", 
+				data_func: null, authorities: dirauths, min_ignore_limit:null, max_ignore_limit:null },
+			{ title: "Fallback Directories Running, Past 14 Days", data_slice: 336, div: "fallbackdirs_2", 
+				data_func: null, authorities: dirauths, min_ignore_limit:null, max_ignore_limit:null },
+			{ title: "Fallback Directories Running, Past 30 Days", data_slice: 720, div: "fallbackdirs_3", 
+				data_func: null, authorities: dirauths, min_ignore_limit:null, max_ignore_limit:null },
+			{ title: "Fallback Directories Running, Past 90 Days", data_slice: 2160, div: "fallbackdirs_4", 
+				data_func: null, authorities: dirauths, min_ignore_limit:null, max_ignore_limit:null },
+		];
+
+		var BWAUTH_GRAPHS_TO_GENERATE = [
+			{ title: "Bandwidth Auth Statistics, Past 7 Days", data_slice: 168, div: "bwauths_stats_1", 
+				data_func: null, authorities: bwauths, min_ignore_limit:null, max_ignore_limit:null },
+			{ title: "Bandwidth Auth Statistics, Past 14 Days", data_slice: 336, div: "bwauths_stats_2", 
+				data_func: null, authorities: bwauths, min_ignore_limit:null, max_ignore_limit:null },
+			{ title: "Bandwidth Auth Statistics, Past 30 Days", data_slice: 720, div: "bwauths_stats_3", 
+				data_func: null, authorities: bwauths, min_ignore_limit:null, max_ignore_limit:null },
+			{ title: "Bandwidth Auth Statistics, Past 90 Days", data_slice: 2160, div: "bwauths_stats_4", 
+				data_func: null, authorities: bwauths, min_ignore_limit:null, max_ignore_limit:null },
+		];
+
+	    relays_done = false;
+	    fallbackdirs_done = ignore_fallback_dirs;
+	    bwauth_done = false;
+		fetch("vote-stats.csv").then(function(response) {
+			return response.text();
+		}).then(function(text) {
+			return d3.csvParse(text, function(d) {
+				for(i in d) {
+					if(i == "date")
+						d[i] = new Date(Number(d[i]));
+					else
+						d[i] = Number(d[i]);
+				}
+				return d;
+			});
+		}).then(function(data) {
+
+		// For each of the configured graphs
+		for(g in GRAPHS_TO_GENERATE)
+		{
+			graph = GRAPHS_TO_GENERATE[g];
+
+			if(graph.data_slice+1 > data.length) {
+				data_subset = data.slice(0);
+				console.log("("+graph.title+") Requested " + (graph.data_slice+1) + " but there are only " + data.length + " items...");
+			}
+			else
+				data_subset = data.slice(0, graph.data_slice+1);
+			data_subset.reverse();
+
+			// Calculate the Graph Boundaries -----------------------------------------
+			min = 10000;
+			max = 0;
+			total = 0;
+			count = 0;
+			for(d in data_subset)
+			{
+				for(a in graph.authorities)
+				{
+					var x = graph.data_func(data_subset[d], graph.authorities[a]);
+					if(isNaN(x))
+						console.log("Error, NAN:", data_subset[d], graph.authorities[a], x);
+					if(x < min && x > graph.min_ignore_limit)
+						min = x;
+					if(x > max && x < graph.max_ignore_limit)
+						max = x;
+					if(x > graph.min_ignore_limit && x < graph.max_ignore_limit) {
+						total += x;
+						count++;
+					}
+				}
+			}
+			avg = total / count;
+			sumvariance = 0;
+			for(d in data_subset)
+			{
+				for(a in graph.authorities)
+				{
+					var x = graph.data_func(data_subset[d], graph.authorities[a]);
+					if(x > graph.min_ignore_limit && x < graph.max_ignore_limit) {
+						sumvariance += (x - avg) * (x - avg);
+					}
+				}
+			}
+			variance = sumvariance / count;
+			stddev = Math.sqrt(variance);
+			console.log("("+graph.title+") Data Length: " + data_subset.length + " Y-Axis Min: " + min + " Max: " + max + " Avg: " + avg + " Var: " + variance + " StdDev: " + stddev);
+
+			// Create the Graph  -----------------------------------------
+			var x = d3.scaleTime()
+				.domain([data_subset[0].date, data_subset[data_subset.length-1].date])
+			    .range([0, WIDTH])
+			;
+
+			var y = d3.scaleLinear()
+				.domain([avg-(5*stddev), avg+(5*stddev)])
+			    .range([HEIGHT, 0]);
+
+			var i = 1;
+			var lines = []
+			for(auth in graph.authorities)
+			{
+				this_auth = graph.authorities[auth];
+				lines.push({authName: this_auth, authIndex: i, line: (function(dirAuthClosure) {
+					return d3.line()
+					    .defined(function(d) { 
+						return d && graph.data_func(d, dirAuthClosure) && 
+						graph.data_func(d, dirAuthClosure) > graph.min_ignore_limit &&
+						graph.data_func(d, dirAuthClosure) < graph.max_ignore_limit; })
+			    		.x(function(d) { return x(d.date); })
+				    	.y(function(d) { return y(graph.data_func(d, dirAuthClosure)); });
+				    })(this_auth)});
+			    i++;
+			}
+
+			var svg = d3.select("#" + graph.div).append("svg")
+			    .datum(data_subset)
+			    .attr("width", WIDTH + MARGIN.left + MARGIN.right)
+			    .attr("height", HEIGHT + MARGIN.top + MARGIN.bottom)
+			    .append("g")
+			    .attr("transform", "translate(" + MARGIN.left + "," + MARGIN.top + ")");
+
+			svg.append("g")
+			    .attr("class", "axis axis--x")
+			    .attr("transform", "translate(0," + HEIGHT + ")")
+			    .call(d3.axisBottom().scale(x));
+
+			svg.append("g")
+			    .attr("class", "axis axis--y")
+			    .call(d3.axisLeft().scale(y));
+
+			for(l in lines)
+			{
+				svg.append("path")
+			    	.attr("class", "auth_" + lines[l].authName + " auth" + lines[l].authIndex)
+				    .attr("d", lines[l].line);
+			}
+
+			svg.append("text")
+			        .attr("x", (WIDTH / 2))
+			        .attr("y", 0 - (MARGIN.top / 2))
+			        .attr("text-anchor", "middle")
+			        .attr("class", "graph-title")
+			        .text(graph.title);
+		}
+
+		relays_done = true;
+		if(fallbackdirs_done && bwauth_done) {
+			var toShow = document.getElementsByClassName('graphbox');
+			for(i=0; i<toShow.length; i++) {
+				toShow[i].style.display = 'block';
+			}
+			var toHide = document.getElementsByClassName('graphplaceholder');
+			for(i=0; i<toHide.length; i++) {
+				toHide[i].style.display = 'none';
+			}
+		}
+
+		});
+
+		// ===========================================================================================
+		// ===========================================================================================
+
+		fetch("bwauth-stats.csv").then(function(response) {
+			return response.text();
+		}).then(function(text) {
+			return d3.csvParse(text, function(d) {
+				for(i in d) {
+					if(i == "date")
+						d[i] = new Date(Number(d[i]));
+					else
+						d[i] = Number(d[i]);
+				}
+				return d;
+			});
+		}).then(function(data) {
+			for(g in BWAUTH_GRAPHS_TO_GENERATE)
+			{
+				graph = BWAUTH_GRAPHS_TO_GENERATE[g];
+
+				var key_to_color = function(k) { 
+					if(k.includes("_above"))
+						return "bwauth_above";
+					else if(k.includes("_shared"))
+						return "bwauth_shared";
+					else if(k.includes("_exclusive"))
+						return "bwauth_exclusive";
+					else if(k.includes("_below"))
+						return "bwauth_below";
+					else
+						return "bwauth_unmeasured";
+				};
+
+				if(graph.data_slice+1 > data.length) {
+					data_subset = data.slice(0);
+					console.log("("+graph.title+") Requested " + (graph.data_slice+1) + " but there are only " + data.length + " items...");
+				}
+				else
+					data_subset = data.slice(0, graph.data_slice);
+				data_subset.reverse();
+
+				for(a in graph.authorities)
+				{
+					a = graph.authorities[a];
+
+					max = 0;
+					for(d in data_subset)
+					{
+						x = data_subset[d][a + "_above"] +
+							data_subset[d][a + "_shared"] +
+							data_subset[d][a + "_exclusive"] +
+							data_subset[d][a + "_below"] +
+							data_subset[d][a + "_unmeasured"];
+						if(x > max)
+							max = x;
+					}
+
+					var x = d3.scaleTime()
+						.domain([data_subset[0].date, data_subset[data_subset.length-1].date])
+						.range([0, BWAUTH_WIDTH]);
+
+					var y = d3.scaleLinear()
+						.domain([0, max])
+						.range([BWAUTH_HEIGHT, 0]);
+
+					var stack = d3.stack()
+						.keys([a + "_unmeasured", a + "_below", a + "_exclusive", a + "_shared", a + "_above"])
+						.order(d3.stackOrderNone)
+						.offset(d3.stackOffsetNone);
+
+					var area = d3.area()
+						.x(function(d, i) { return x(d.data.date); })
+						.y0(function(d) { return y(d[0]); })
+						.y1(function(d) { return y(d[1]); });
+
+					var svg = d3.select("#" + graph.div).append("svg")
+						.attr("width", BWAUTH_WIDTH + BWAUTH_MARGIN.left + BWAUTH_MARGIN.right)
+						.attr("height", BWAUTH_HEIGHT + BWAUTH_MARGIN.top + BWAUTH_MARGIN.bottom)
+						.append("g")
+						.attr("transform", "translate(" + BWAUTH_MARGIN.left + "," + BWAUTH_MARGIN.top + ")");
+
+					var layer = svg.selectAll(".layer")
+						.data(stack(data_subset))
+						.enter().append("g")
+						//.attr("class", "layer");
+
+					layer.append("path")
+						//.attr("class", "area")
+						.attr("class", function(d) { return key_to_color(d.key); })
+						.attr("d", area);
+
+					svg.append("g")
+						.attr("class", "axis axis--x")
+						.attr("transform", "translate(0," + BWAUTH_HEIGHT + ")")
+						.call(d3.axisBottom().scale(x));
+
+					svg.append("g")
+						.attr("class", "axis axis--y")
+						.call(d3.axisLeft().scale(y));
+
+					svg.append("text")
+						.attr("x", (BWAUTH_WIDTH / 2))
+						.attr("y", 5 - (BWAUTH_MARGIN.top / 2))
+						.attr("text-anchor", "middle")
+						.attr("class", "bwauth-graph-title")
+						.text(a);
+					}
+				}
+
+
+				bwauth_done = true;
+				if(relays_done && fallbackdirs_done) {
+					var toShow = document.getElementsByClassName('graphbox');
+					for(i=0; i<toShow.length; i++) {
+						toShow[i].style.display = 'block';
+					}
+					var toHide = document.getElementsByClassName('graphplaceholder');
+					for(i=0; i<toHide.length; i++) {
+						toHide[i].style.display = 'none';
+					}
+				}
+		});
+
+		// ===========================================================================================
+		// ===========================================================================================
+
+		if(!ignore_fallback_dirs) {
+
+			fetch("fallback-dir-stats.csv").then(function(response) {
+				return response.text();
+			}).then(function(text) {
+				return d3.csvParse(text, function(d) {
+					for(i in d) {
+						if(i == "date")
+							d[i] = new Date(Number(d[i]));
+						else
+							d[i] = Number(d[i]);
+					}
+					return d;
+				});
+			}).then(function(data) {
+				var key_to_color = function(k) { return k == 'fallback_dirs_running' ? 'fallback_green' : k == 'fallback_dirs_notrunning' ? 'fallback_orange' : 'fallback_red' };
+				/*Pie Graph
+				data_subset = data.slice(0);
+				data_subset = [
+					{'label' : 'fallback_dirs_running', 'value': data_subset[0]['fallback_dirs_running']},
+					{'label' : 'fallback_dirs_notrunning', 'value': data_subset[0]['fallback_dirs_notrunning']},
+					{'label' : 'fallback_dirs_missing', 'value': data_subset[0]['fallback_dirs_missing']},
+				];
+				var data_func = function(d) { return d.value; };
+				var arcs = d3.pie()
+					.sort(null)
+					.value(data_func)(data_subset);
+
+				var svg = d3.select('#fallbackdirs_pie')
+					.append('svg')
+					.attr('width', WIDTH)
+					.attr('height', HEIGHT)
+					.append('g')
+					.attr('transform', 'translate(' + (WIDTH / 2) +	',' + (HEIGHT / 2) + ')');
+
+				var arc = d3.arc()
+					.innerRadius(0)
+					.outerRadius(100);
+
+				var path = svg.selectAll('path')
+					.data(arcs)
+					.enter()
+					.append('path')
+					.attr('d', arc)
+					.attr('class', function(d, i) {
+						return key_to_color(d.data.label);
+					});*/
+
+				//Line Graphs
+				for(g in FALLBACK_GRAPHS_TO_GENERATE)
+				{
+					graph = FALLBACK_GRAPHS_TO_GENERATE[g];
+
+					if(graph.data_slice+1 > data.length) {
+						data_subset = data.slice(0);
+						console.log("("+graph.title+") Requested " + (graph.data_slice+1) + " but there are only " + data.length + " items...");
+					}
+					else
+						data_subset = data.slice(0, graph.data_slice);
+					data_subset.reverse();
+				
+					max = 0
+					for(d in data_subset) {
+						x = data_subset[d]['fallback_dirs_running'] + data_subset[d]['fallback_dirs_notrunning'] + data_subset[d]['fallback_dirs_missing'];
+						if(x > max)
+							max = x;
+					}
+
+					var x = d3.scaleTime()
+						.domain([data_subset[0].date, data_subset[data_subset.length-1].date])
+						.range([0, WIDTH]);
+
+					var y = d3.scaleLinear()
+						.domain([0, max])
+						.range([HEIGHT, 0]);
+
+					var stack = d3.stack()
+						.keys(["fallback_dirs_missing", "fallback_dirs_notrunning", "fallback_dirs_running"])
+						.order(d3.stackOrderNone)
+						.offset(d3.stackOffsetNone);
+
+					var area = d3.area()
+						.x(function(d, i) { return x(d.data.date); })
+						.y0(function(d) { return y(d[0]); })
+						.y1(function(d) { return y(d[1]); });
+
+					var svg = d3.select("#" + graph.div).append("svg")
+						.attr("width", WIDTH + MARGIN.left + MARGIN.right)
+						.attr("height", HEIGHT + MARGIN.top + MARGIN.bottom)
+						.append("g")
+						.attr("transform", "translate(" + MARGIN.left + "," + MARGIN.top + ")");
+
+					var layer = svg.selectAll(".layer")
+						.data(stack(data_subset))
+						.enter().append("g")
+						//.attr("class", "layer");
+
+					layer.append("path")
+						//.attr("class", "area")
+						.attr("class", function(d) { return key_to_color(d.key); })
+						.attr("d", area);
+
+					svg.append("g")
+						.attr("class", "axis axis--x")
+						.attr("transform", "translate(0," + HEIGHT + ")")
+						.call(d3.axisBottom().scale(x));
+
+					svg.append("g")
+						.attr("class", "axis axis--y")
+						.call(d3.axisLeft().scale(y));
+
+					svg.append("text")
+						.attr("x", (WIDTH / 2))
+						.attr("y", 0 - (MARGIN.top / 2))
+						.attr("text-anchor", "middle")
+						.attr("class", "graph-title")
+						.text(graph.title);
+				}
+
+				
+				fallbackdirs_done = true;
+				if(relays_done && bwauth_done) {
+					var toShow = document.getElementsByClassName('graphbox');
+					for(i=0; i<toShow.length; i++) {
+						toShow[i].style.display = 'block';
+					}
+					var toHide = document.getElementsByClassName('graphplaceholder');
+					for(i=0; i<toHide.length; i++) {
+						toHide[i].style.display = 'none';
+					}
+				}
+			});
+		}
+
+		</script>""")
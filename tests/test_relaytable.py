@@ -0,0 +1,524 @@
+"""
+Unit tests for relaytable.py, comparing it with what stem parses.
+"""
+
+import io
+import base64
+import calendar
+import random
+import hashlib
+import unittest
+
+import stem.descriptor
+import stem.version
+
+import utility
+import relaytable
+from relaytable import RelayTable, RouterEntries, classify_measurements
+
+FLAGS = ('Authority', 'BadExit', 'Exit', 'Fast', 'Guard', 'HSDir', 'Running', 'Stable', 'V2Dir', 'Valid')
+VERSIONS = ('0.4.8.10', '0.4.8.12', '0.4.9.1-alpha', '0.4.7.16')
+
+HEADER = """\
+network-status-version 3
+vote-status %s
+consensus-method 32
+valid-after 2024-01-01 00:00:00
+fresh-until 2024-01-01 01:00:00
+valid-until 2024-01-01 03:00:00
+voting-delay 300 300
+known-flags %s
+"""
+
+
+def fingerprint(i):
+	return hashlib.sha1(b'relay%i' % i).digest()
+
+
+def router_status(i, rng, vote):
+	"""
+	Provides the text of a router status entry with a mix of the lines that
+	differ between relays.
+	"""
+
+	identity = base64.b64encode(fingerprint(i)).decode('ascii').rstrip('=')
+	lines = ['r relay%i %s AAAAAAAAAAAAAAAAAAAAAAAAAAA 2024-01-01 %02i:%02i:00 10.0.%i.%i 9001 0' % (i, identity, rng.randrange(24), rng.randrange(60), i // 256, i % 256)]
+
+	if rng.random() < 0.4:
+		lines.append('a [2001:db8::%x]:9001' % i)
+	lines.append('s ' + ' '.join(flag for flag in FLAGS if rng.random() < 0.5))
+	if rng.random() < 0.9:
+		lines.append('v Tor ' + rng.choice(VERSIONS))
+
+	bandwidth = rng.choice((20, 50, 100, 1000, rng.randrange(1, 5000)))
+	if vote:
+		if rng.random() < 0.7:
+			lines.append('w Bandwidth=%i Measured=%i' % (bandwidth, rng.choice((20, 50, 100, 1000, 0))))
+		else:
+			lines.append('w Bandwidth=%i' % bandwidth)
+	elif rng.random() < 0.2:
+		lines.append('w Bandwidth=%i Unmeasured=1' % bandwidth)
+	else:
+		lines.append('w Bandwidth=%i' % rng.choice((20, 50, 100, 1000)))
+
+	return '\n'.join(lines) + '\n'
+
+
+def document_content(seed, vote, relays = 300):
+	"""
+	Provides the text of a consensus or vote that lists most of the relays.
+	"""
+
+	rng = random.Random(seed)
+	content = HEADER % ('vote' if vote else 'consensus', ' '.join(FLAGS))
+	for i in range(relays):
+		if rng.random() < 0.9:
+			content += router_status(i, rng, vote)
+	content += 'directory-footer\n'
+	return content.encode('ascii')
+
+
+def parse(content):
+	return next(stem.descriptor.parse_file(io.BytesIO(content), 'network-status-consensus-3 1.0', document_handler = stem.descriptor.DocumentHandler.DOCUMENT))
+
+
+def sample_documents():
+	"""
+	Provides a consensus and the votes of four authorities.
+	"""
+
+	consensus = parse(document_content(0, False))
+	votes = dict(('auth%i' % i, parse(document_content(i + 1, True))) for i in range(4))
+	return consensus, votes
+
+
+def classify_per_relay(consensus, votes):
+	"""
+	How write_website.py classified measurements before classify_measurements().
+	"""
+
+	data = {}
+	for dirauth_nickname in votes:
+		vote = votes[dirauth_nickname]
+		data[dirauth_nickname] = {'unmeasured' : 0, 'above' : 0, 'below' : 0, 'exclusive' : 0 , 'shared' : 0}
+
+		had_any_value = False
+		for r in consensus.routers.values():
+			if r.is_unmeasured:
+				continue
+			elif r.fingerprint not in vote.routers or vote.routers[r.fingerprint].measured == None:
+				data[dirauth_nickname]['unmeasured'] += 1
+			elif r.bandwidth < vote.routers[r.fingerprint].measured:
+				had_any_value = True
+				data[dirauth_nickname]['above'] += 1
+			elif r.bandwidth > vote.routers[r.fingerprint].measured:
+				had_any_value = True
+				data[dirauth_nickname]['below'] += 1
+			elif 1 == len([1 for d_i in votes if r.fingerprint in votes[d_i].routers and votes[d_i].routers[r.fingerprint].measured == r.bandwidth]):
+				had_any_value = True
+				data[dirauth_nickname]['exclusive'] += 1
+			else:
+				had_any_value = True
+				data[dirauth_nickname]['shared'] += 1
+
+		if not had_any_value:
+			del data[dirauth_nickname]
+	return data
+
+
+class TestScanRouterStatus(unittest.TestCase):
+	def assertMatchesStem(self, content):
+		routers = list(parse(content).routers.values())
+		summaries = list(relaytable.scan_router_status(content.splitlines(True)))
+		self.assertEqual(len(routers), len(summaries))
+
+		for (router, summary) in zip(routers, summaries):
+			self.assertEqual(router.fingerprint, summary.fingerprint)
+			self.assertEqual(router.nickname, summary.nickname)
+			self.assertEqual(calendar.timegm(router.published.utctimetuple()), summary.published)
+			self.assertEqual(router.flags, summary.flags)
+			self.assertEqual(router.bandwidth, summary.bandwidth)
+			self.assertEqual(router.measured, summary.measured)
+			self.assertEqual(router.is_unmeasured, bool(summary.is_unmeasured))
+			self.assertEqual(any(address[2] for address in router.or_addresses), summary.has_ipv6)
+			self.assertEqual(str(router.version) if router.version else None, summary.version)
+			self.assertEqual(router.get_bytes(), summary.content)
+			self.assertEqual(router, summary.entry())
+
+	def test_consensus(self):
+		self.assertMatchesStem(document_content(0, False))
+
+	def test_vote(self):
+		self.assertMatchesStem(document_content(1, True))
+
+	def test_fields(self):
+		content = document_content(1, True)
+		summary = next(relaytable.scan_router_status(content.splitlines(True), ('nickname', 'measured')))
+		self.assertEqual('relay0', summary.nickname)
+		self.assertEqual(None, summary.fingerprint)
+		self.assertEqual(None, summary.flags)
+		self.assertEqual(None, summary.version)
+
+	def test_stops_at_footer(self):
+		content = document_content(0, False, 3) + b'directory-signature 0 0\nr not a router status\n'
+		self.assertEqual(len(parse(content).routers), len(list(relaytable.scan_router_status(content.splitlines(True)))))
+
+	def test_malformed_r_line(self):
+		content = (HEADER % ('vote', 'Running')).encode('ascii') + b'r relay0 AAAA\ns Running\n'
+		self.assertRaises(ValueError, list, relaytable.scan_router_status(content.splitlines(True)))
+
+
+def read_documents():
+	"""
+	Provides the sample documents as we read them when they're downloaded,
+	with the text of their router status entries rather than parsed entries.
+	"""
+
+	consensus = utility._read_document(document_content(0, False).splitlines(True))
+	votes = dict(('auth%i' % i, utility._read_document(document_content(i + 1, True).splitlines(True))) for i in range(4))
+	return consensus, votes
+
+
+class TestRouterEntries(unittest.TestCase):
+	def test_matches_stem(self):
+		content = document_content(1, True)
+		parsed = parse(content)
+		document = utility._read_document(content.splitlines(True))
+
+		self.assertIsInstance(document.routers, RouterEntries)
+		self.assertEqual(list(parsed.routers), list(document.routers))
+		self.assertEqual(b''.join(router.get_bytes() for router in parsed.routers.values()), document.routers.content())
+
+		for (relay_fp, router) in parsed.routers.items():
+			self.assertEqual(router, document.routers[relay_fp])
+			self.assertIs(document, document.routers[relay_fp].document)
+
+	def test_parsed_on_lookup(self):
+		consensus, votes = read_documents()
+		relay_fp = next(iter(consensus.routers))
+
+		self.assertIn(relay_fp, consensus.routers)
+		self.assertEqual({}, consensus.routers._parsed)
+		self.assertIs(consensus.routers[relay_fp], consensus.routers[relay_fp])
+		self.assertEqual([relay_fp], list(consensus.routers._parsed))
+
+	def test_malformed_r_line(self):
+		self.assertRaises(ValueError, RouterEntries().add, b'r relay0 AAAA\ns Running\n')
+
+
+class TestRelayTable(unittest.TestCase):
+	def assertSameColumns(self, expected, actual):
+		self.assertEqual(expected.fingerprints, actual.fingerprints)
+		self.assertEqual(expected.fingerprint_bytes, actual.fingerprint_bytes)
+		self.assertEqual(expected.nicknames, actual.nicknames)
+
+		documents = [(expected.consensus, actual.consensus)] + [(expected.votes[nickname], actual.votes[nickname]) for nickname in expected.votes]
+		for (columns, other) in documents:
+			for attr in ('present', 'bandwidth', 'measured', 'published', 'is_unmeasured', 'has_ipv6', 'count', 'known_flags'):
+				self.assertEqual(getattr(columns, attr), getattr(other, attr), attr)
+			self.assertEqual([expected.flag_names(mask) for mask in columns.flags], [actual.flag_names(mask) for mask in other.flags])
+			self.assertEqual([expected.versions[v] if v != -1 else None for v in columns.version], [actual.versions[v] if v != -1 else None for v in other.version])
+
+	def test_columns(self):
+		consensus, votes = sample_documents()
+		relays = RelayTable(consensus, votes)
+
+		for (columns, document) in [(relays.consensus, consensus)] + [(relays.votes[nickname], vote) for (nickname, vote) in votes.items()]:
+			self.assertEqual(len(document.routers), columns.count)
+			for (relay_fp, router) in document.routers.items():
+				i = relays.relay_id(relay_fp)
+				self.assertEqual(relay_fp, relays.fingerprints[i])
+				self.assertEqual(i, relays.relay_id(bytes.fromhex(relay_fp)))
+				self.assertEqual(sorted(router.flags), relays.flag_names(columns.flags[i]))
+				self.assertEqual(router.bandwidth, columns.bandwidth[i])
+				self.assertEqual(router.measured if router.measured is not None else -1, columns.measured[i])
+				self.assertEqual(router.version, relays.versions[columns.version[i]] if columns.version[i] != -1 else None)
+
+		self.assertEqual(sorted(relays.fingerprints), relays.fingerprints)
+		self.assertEqual(None, relays.relay_id('0' * 40))
+
+	def test_scanned_columns(self):
+		consensus, votes = sample_documents()
+		expected = RelayTable(consensus, votes)
+
+		consensus, votes = read_documents()
+		self.assertSameColumns(expected, RelayTable(consensus, votes))
+		self.assertEqual({}, consensus.routers._parsed)
+
+	def test_scanned_columns_in_processes(self):
+		consensus, votes = sample_documents()
+		expected = RelayTable(consensus, votes)
+
+		consensus, votes = read_documents()
+		self.assertSameColumns(expected, RelayTable(consensus, votes, 2))
+
+
+class TestFlags(unittest.TestCase):
+	def setUp(self):
+		self.consensus, self.votes = sample_documents()
+		self.relays = RelayTable(self.consensus, self.votes)
+
+	def relay_set(self, fingerprints):
+		"""
+		Provides the bitset of the given relays, bit by bit.
+		"""
+
+		return sum(1 << self.relays.relay_id(relay_fp) for relay_fp in fingerprints)
+
+	def test_flag_bits(self):
+		relays = self.relays
+		bits = [relays.flag_bit(flag) for flag in FLAGS]
+
+		self.assertEqual(len(FLAGS), len(set(bits)))
+		self.assertTrue(all(bit.bit_count() == 1 for bit in bits))
+		self.assertEqual(bits, [relays.flag_bit(flag) for flag in FLAGS])
+		self.assertEqual(relays.flag_bit('Exit') | relays.flag_bit('Guard'), relays.flag_mask(['Guard', 'Exit', 'Guard']))
+		self.assertEqual(['Exit', 'Guard'], relays.flag_names(relays.flag_mask(['Guard', 'Exit'])))
+		self.assertEqual([], relays.flag_names(0))
+
+		# new flags get the next bit, and are named in the masks of later calls
+
+		self.assertEqual(1 << len(FLAGS), relays.flag_bit('Zzz'))
+		self.assertEqual(['Exit', 'Zzz'], relays.flag_names(relays.flag_mask(['Exit', 'Zzz'])))
+
+	def test_too_many_flags(self):
+		relays = self.relays
+		for i in range(64 - len(FLAGS)):
+			relays.flag_bit('Flag%i' % i)
+		self.assertEqual(1 << 63, relays.flag_bit('Flag%i' % (63 - len(FLAGS))))
+
+		self.assertRaises(ValueError, relays.flag_bit, 'OneTooMany')
+		self.assertRaises(ValueError, relays.flag_mask, ['Running', 'OneTooMany'])
+		self.assertEqual(relays.flag_bit('Running'), relays.flag_mask(['Running']))
+
+	def test_flag_sets(self):
+		relays = self.relays
+		for (columns, document) in [(relays.consensus, self.consensus)] + [(relays.votes[nickname], vote) for (nickname, vote) in self.votes.items()]:
+			for flag in FLAGS:
+				with_flag = [relay_fp for (relay_fp, router) in document.routers.items() if flag in router.flags]
+				self.assertEqual(self.relay_set(with_flag), relays.flag_set(columns, flag), flag)
+				self.assertEqual(len(with_flag), relays.count_flag(columns, flag), flag)
+
+			self.assertEqual(self.relay_set(document.routers), columns.present_set())
+			self.assertEqual(self.relay_set(relay_fp for (relay_fp, router) in document.routers.items() if router.flags), columns.flagged_set())
+			self.assertEqual(0, relays.flag_set(columns, 'Zzz'))
+
+	def test_add_flag(self):
+		relays, columns = self.relays, self.relays.consensus
+		running = relays.count_flag(columns, 'Running')
+		relay_id = next(i for i in columns.relay_ids() if not columns.flags[i] & relays.flag_bit('Running'))
+
+		relays.add_flag(columns, relay_id, 'Running')
+		relays.add_flag(columns, relay_id, 'Zzz')
+		self.assertEqual(running + 1, relays.count_flag(columns, 'Running'))
+		self.assertEqual(1 << relay_id, relays.flag_set(columns, 'Zzz'))
+
+
+class TestPseudoFlags(unittest.TestCase):
+	def setUp(self):
+		self.consensus, self.votes = sample_documents()
+		self.relays = RelayTable(self.consensus, self.votes)
+		self.fallback_dirs = sorted(self.consensus.routers)[::7] + ['F' * 40]
+
+	def flagged(self, columns, flag):
+		return sorted(self.relays.fingerprints[i] for i in columns.relay_ids() if columns.flags[i] & self.relays.flag_bit(flag))
+
+	def has_ipv6(self, router):
+		return any(is_ipv6 for (address, port, is_ipv6) in router.or_addresses)
+
+	def test_consensus(self):
+		relays, consensus = self.relays, self.consensus
+		relays.add_pseudo_flags(self.fallback_dirs)
+		columns = relays.consensus
+
+		voted_ipv6 = set(relay_fp for vote in self.votes.values() for (relay_fp, router) in vote.routers.items() if self.has_ipv6(router))
+		self.assertEqual(sorted(relay_fp for (relay_fp, router) in consensus.routers.items() if self.has_ipv6(router)), self.flagged(columns, 'ReachableIPv6'))
+		self.assertEqual(sorted(relay_fp for (relay_fp, router) in consensus.routers.items() if not self.has_ipv6(router) and relay_fp in voted_ipv6), self.flagged(columns, 'NoIPv6Consensus'))
+		self.assertEqual(sorted(self.fallback_dirs[:-1]), self.flagged(columns, 'FallbackDir'))
+		self.assertEqual(sorted(relay_fp for (relay_fp, router) in consensus.routers.items() if router.is_unmeasured), self.flagged(columns, 'Unmeasured'))
+		self.assertEqual([], self.flagged(columns, 'DescriptorMismatch'))
+
+		self.assertEqual(sum(router.bandwidth for router in consensus.routers.values()), columns.measured_bw_sum)
+		self.assertEqual(list(consensus.known_flags) + ['ReachableIPv6', 'NoIPv6Consensus', 'FallbackDir', 'Unmeasured', 'DescriptorMismatch'], columns.known_flags)
+
+		# the parsed documents are left alone
+		self.assertNotIn('FallbackDir', consensus.known_flags)
+
+	def test_votes(self):
+		relays, consensus = self.relays, self.consensus
+		relays.add_pseudo_flags(self.fallback_dirs)
+
+		for (nickname, vote) in self.votes.items():
+			columns = relays.votes[nickname]
+			in_consensus = dict((relay_fp, router) for (relay_fp, router) in vote.routers.items() if relay_fp in consensus.routers)
+
+			self.assertEqual(sorted(relay_fp for (relay_fp, router) in vote.routers.items() if self.has_ipv6(router)), self.flagged(columns, 'ReachableIPv6'))
+			self.assertEqual([], self.flagged(columns, 'NoIPv6Consensus'))
+			self.assertEqual(sorted(relay_fp for relay_fp in self.fallback_dirs if relay_fp in vote.routers), self.flagged(columns, 'FallbackDir'))
+			self.assertEqual(sorted(relay_fp for (relay_fp, router) in in_consensus.items() if consensus.routers[relay_fp].is_unmeasured and not router.measured), self.flagged(columns, 'Unmeasured'))
+			self.assertEqual(sorted(relay_fp for (relay_fp, router) in in_consensus.items() if consensus.routers[relay_fp].published != router.published), self.flagged(columns, 'DescriptorMismatch'))
+
+			self.assertEqual(sum(router.measured or 0 for router in vote.routers.values()), columns.measured_bw_sum)
+			self.assertEqual(list(vote.known_flags) + ['ReachableIPv6', 'NoIPv6Consensus', 'FallbackDir', 'Unmeasured', 'DescriptorMismatch'], columns.known_flags)
+
+			# the relay's own flags are kept
+			for (relay_fp, router) in vote.routers.items():
+				self.assertTrue(set(router.flags) <= set(relays.flag_names(columns.flags[relays.relay_id(relay_fp)])))
+
+	def test_without_fallback_dirs(self):
+		self.relays.add_pseudo_flags(self.fallback_dirs, include_fallback_dirs = False)
+
+		for columns in [self.relays.consensus] + list(self.relays.votes.values()):
+			self.assertEqual([], self.flagged(columns, 'FallbackDir'))
+			self.assertNotIn('FallbackDir', columns.known_flags)
+
+	def test_added_once(self):
+		relays = self.relays
+		relays.add_pseudo_flags(self.fallback_dirs)
+		flags, known_flags = list(relays.consensus.flags), list(relays.consensus.known_flags)
+		unmeasured = relays.count_flag(relays.consensus, 'Unmeasured')
+
+		relays.add_pseudo_flags([])
+		self.assertTrue(relays.has_pseudo_flags)
+		self.assertEqual(flags, list(relays.consensus.flags))
+		self.assertEqual(known_flags, relays.consensus.known_flags)
+		self.assertEqual(unmeasured, relays.count_flag(relays.consensus, 'Unmeasured'))
+
+
+class TestRelayBuckets(unittest.TestCase):
+	def setUp(self):
+		self.consensus, self.votes = sample_documents()
+		self.relays = RelayTable(self.consensus, self.votes)
+
+	def documents(self):
+		return [(self.relays.consensus, self.consensus)] + [(self.relays.votes[nickname], vote) for (nickname, vote) in self.votes.items()]
+
+	def weight(self, router, include_bandwidth):
+		weight = router.measured or 0
+		if include_bandwidth:
+			weight += router.bandwidth or 0
+		return weight
+
+	def test_buckets(self):
+		for (columns, document) in self.documents():
+			for include_bandwidth in (False, True):
+				expected = {}
+				for router in document.routers.values():
+					bucket = expected.setdefault((any(is_ipv6 for (address, port, is_ipv6) in router.or_addresses), router.version), [0, 0])
+					bucket[0] += 1
+					bucket[1] += self.weight(router, include_bandwidth)
+
+				buckets = self.relays.relay_buckets(columns, include_bandwidth)
+				self.assertEqual(expected, buckets)
+				self.assertIs(buckets, self.relays.relay_buckets(columns, include_bandwidth))
+
+	def test_masked_sum(self):
+		minimum = stem.version.Version('0.4.8.12')
+		masks = (
+			lambda has_ipv6, version: True,
+			lambda has_ipv6, version: has_ipv6,
+			lambda has_ipv6, version: version is None,
+			lambda has_ipv6, version: has_ipv6 and version is not None and version >= minimum,
+		)
+
+		for (columns, document) in self.documents():
+			for include_bandwidth in (False, True):
+				for mask in masks:
+					matching = [router for router in document.routers.values() if mask(any(is_ipv6 for (address, port, is_ipv6) in router.or_addresses), router.version)]
+					expected = (len(matching), sum(self.weight(router, include_bandwidth) for router in matching))
+					self.assertEqual(expected, self.relays.masked_sum(columns, mask, include_bandwidth))
+
+		self.assertEqual((len(self.consensus.routers), 0), self.relays.masked_sum(self.relays.consensus, masks[0]))
+
+
+def assigning_bwauths_per_relay(consensus, votes, relay_fp):
+	"""
+	How website.py found the authorities that assigned a relay's bandwidth
+	before RelayTable.assigning_bwauths().
+	"""
+
+	if relay_fp not in consensus.routers:
+		return ""
+
+	target_bw = consensus.routers[relay_fp].bandwidth
+
+	bwauths = []
+	bwauths_voted = 0
+	for dirauth_nickname in votes:
+		if relay_fp in votes[dirauth_nickname].routers:
+			measured = votes[dirauth_nickname].routers[relay_fp].measured
+			if measured and measured >= int(0):
+				bwauths_voted += 1
+			if target_bw == measured:
+				bwauths.append(dirauth_nickname)
+	if len(bwauths) == bwauths_voted:
+		return ["all"]
+	return bwauths
+
+
+class TestAssigningBwauths(unittest.TestCase):
+	def test_matches_per_relay_lookup(self):
+		consensus, votes = sample_documents()
+		relays = RelayTable(consensus, votes)
+		assigning_bwauths = relays.assigning_bwauths()
+
+		self.assertEqual(len(relays), len(assigning_bwauths))
+		for (i, relay_fp) in enumerate(relays.fingerprints):
+			self.assertEqual(assigning_bwauths_per_relay(consensus, votes, relay_fp), assigning_bwauths[i], relay_fp)
+
+		# the result is cached
+
+		self.assertIs(assigning_bwauths, relays.assigning_bwauths())
+
+	def test_bwauths_voted(self):
+		consensus, votes = sample_documents()
+		relays = RelayTable(consensus, votes)
+		relays.assigning_bwauths()
+
+		for (i, relay_fp) in enumerate(relays.fingerprints):
+			voted = sum(1 for vote in votes.values() if relay_fp in vote.routers and vote.routers[relay_fp].measured)
+			self.assertEqual(voted, relays.bwauths_voted[i])
+
+
+class TestClassifyMeasurements(unittest.TestCase):
+	def test_matches_per_relay_classification(self):
+		consensus, votes = sample_documents()
+		relays = RelayTable(consensus, votes)
+
+		# as write_website.py calls it
+
+		consensus_ids = [relays.index.get(relay_fp, -1) for relay_fp in consensus.routers]
+		bandwidth = [None if r.is_unmeasured else r.bandwidth for r in consensus.routers.values()]
+		measurements = {}
+		for dirauth_nickname in votes:
+			vote = relays.votes[dirauth_nickname]
+			measurements[dirauth_nickname] = [vote.measured[i] if i != -1 else -1 for i in consensus_ids]
+
+		data = {}
+		for (dirauth_nickname, counts) in classify_measurements(bandwidth, measurements).items():
+			if counts['above'] or counts['below'] or counts['exclusive'] or counts['shared']:
+				data[dirauth_nickname] = counts
+
+		expected = classify_per_relay(consensus, votes)
+		self.assertEqual(sorted(votes), sorted(expected))
+		self.assertEqual(expected, data)
+
+	def test_categories(self):
+		bandwidth = [100, 100, 100, None, 100]
+		measurements = {
+			'auth0': [100, 50, 100, 100, -1],
+			'auth1': [-1, 200, 100, 100, -1],
+		}
+
+		self.assertEqual({
+			'auth0': {'unmeasured': 1, 'above': 0, 'below': 1, 'exclusive': 1, 'shared': 1},
+			'auth1': {'unmeasured': 2, 'above': 1, 'below': 0, 'exclusive': 0, 'shared': 1},
+		}, classify_measurements(bandwidth, measurements))
+
+	def test_no_measurements(self):
+		self.assertEqual({'auth0': {'unmeasured': 2, 'above': 0, 'below': 0, 'exclusive': 0, 'shared': 0}}, classify_measurements([10, 20], {'auth0': [-1, -1]}))
+		self.assertEqual({}, classify_measurements([10, 20], {}))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,134 @@
+"""
+Unit tests for templates.py.
+"""
+
+import io
+import unittest
+
+import templates
+from templates import Template
+
+
+class TestCompile(unittest.TestCase):
+	def test_unexpected_tag(self):
+		with self.assertRaisesRegex(ValueError, 'Template broken has an unexpected tag: {% while True %}'):
+			Template('broken', (), '{% while True %}{% end %}')
+
+	def test_end_outside_of_block(self):
+		with self.assertRaisesRegex(ValueError, 'unexpected tag: {% end %}'):
+			Template('broken', (), 'text{% end %}')
+
+	def test_else_outside_of_block(self):
+		with self.assertRaisesRegex(ValueError, 'unexpected tag: {% else %}'):
+			Template('broken', (), '{% else %}text')
+
+	def test_missing_end(self):
+		with self.assertRaisesRegex(ValueError, 'Template broken is missing an {% end %}'):
+			Template('broken', ('items',), '{% for item in items %}{% if item %}{{ item }}{% end %}')
+
+
+class TestRender(unittest.TestCase):
+	def test_text(self):
+		self.assertEqual('<p>plain</p>\n', Template('text', (), '<p>plain</p>\n').render())
+		self.assertEqual('', Template('empty', (), '').render())
+
+	def test_expressions(self):
+		template = Template('expressions', ('name', 'values'), '{{ name }}: {{ ", ".join(str(v) for v in values) }} ({{ len(values) }})')
+		self.assertEqual('auth0: 1, 2 (2)', template.render(name='auth0', values=[1, 2]))
+
+	def test_values_are_strings(self):
+		template = Template('values', ('value',), '<td>{{ value }}</td>')
+		self.assertEqual('<td>None</td>', template.render(value=None))
+		self.assertEqual('<td>160.0</td>', template.render(value=640 / 4))
+
+	def test_blocks(self):
+		template = Template('blocks', ('items',), '{% for (i, item) in enumerate(items) %}{% if i %}, {% end %}{% if item is None %}-{% elif item %}{{ item }}{% else %}empty{% end %}{% end %}')
+		self.assertEqual('a, -, empty', template.render(items=['a', None, '']))
+		self.assertEqual('', template.render(items=[]))
+
+	def test_block_lines_are_removed(self):
+		template = Template('lines', ('items',), """\
+<ul>
+{% for item in items %}
+  <li>{{ item }}</li>
+  {% if item == 'b' %}
+  <li>after b</li>
+  {% end %}
+{% end %}
+</ul>
+""")
+		self.assertEqual('<ul>\n  <li>a</li>\n  <li>b</li>\n  <li>after b</li>\n</ul>\n', template.render(items=['a', 'b']))
+
+	def test_inline_blocks_keep_their_line(self):
+		template = Template('inline', ('flag',), '<td{% if flag %} class="oiv"{% end %}>x</td>\n')
+		self.assertEqual('<td class="oiv">x</td>\n', template.render(flag=True))
+		self.assertEqual('<td>x</td>\n', template.render(flag=False))
+
+	def test_missing_value(self):
+		template = Template('missing', ('name',), '{{ name }}')
+
+		with self.assertRaises(TypeError):
+			template.render()
+
+	def test_write(self):
+		template = Template('write', ('items',), '{% for item in items %}<b>{{ item }}</b>{% end %}')
+		output = io.StringIO()
+		output.write('start ')
+		template.write(output, items=['a', 'b'])
+		self.assertEqual('start <b>a</b><b>b</b>', output.getvalue())
+		self.assertEqual('<b>a</b><b>b</b>', template.render(items=['a', 'b']))
+
+
+class TestReportTemplates(unittest.TestCase):
+	def test_all_compile(self):
+		for (name, template) in vars(templates).items():
+			if isinstance(template, Template):
+				self.assertEqual(name.lower(), template.name)
+
+	def test_valid_after_time(self):
+		html = templates.VALID_AFTER_TIME.render(valid_after='2024-01-01 00:00:00', expired=True, unusual=[('auth1', None), ('auth2', '2023-12-31 23:00:00')])
+
+		self.assertIn('<p>Consensus was published <span class="oiv">2024-01-01 00:00:00</span> UTC.', html)
+		self.assertIn('<p>Unusual Authorities:</p>\n', html)
+		self.assertIn('    <td>auth1</td>\n    <td class="oiv">Consensus could not be retrieved</td>\n', html)
+		self.assertIn('    <td>auth2</td>\n    <td>2023-12-31 23:00:00</td>  </tr>\n', html)
+		self.assertTrue(html.endswith('</table>\n'))
+
+		html = templates.VALID_AFTER_TIME.render(valid_after='2024-01-01 00:00:00', expired=False, unusual=[])
+		self.assertIn('<p>Consensus was published 2024-01-01 00:00:00 UTC.', html)
+		self.assertNotIn('Unusual Authorities', html)
+
+	def test_consensus_methods(self):
+		html = templates.CONSENSUS_METHODS.render(votes=[('auth0', [28, 29]), ('auth1', [27, 28]), ('auth2', None)], consensus_method=29)
+
+		self.assertIn('    <td>auth0</td>\n    <td>consensus-methods 28 29</td>\n', html)
+		self.assertIn('    <td class="oiv">auth1</td>\n    <td class="oiv">consensus-methods 27 28</td>\n', html)
+		self.assertIn('    <td>auth2</td>\n    <td class="oiv">Vote could not be retrieved</td>\n', html)
+		self.assertIn('    <td class="ic">consensus-method 29    </td>\n', html)
+
+		html = templates.CONSENSUS_METHODS.render(votes=None, consensus_method=29)
+		self.assertIn('  <tr><td>(No votes.)</td><td></td></tr>\n', html)
+
+	def test_relay_info_mid_header(self):
+		self.assertEqual("""\
+  <tr class="tbl-hdr">
+    <th>Fingerprint</th>
+    <th>Nickname</th>
+    <th>auth0</th>
+    <th>auth1</th>
+    <th>consensus</th>
+  </tr>
+""", templates.RELAY_INFO_MID_HEADER.render(dirauth_nicknames=['auth0', 'auth1']))
+
+	def test_graphs_javascript(self):
+		html = templates.GRAPHS_JAVASCRIPT.render(logical_min=125, logical_max=25000, bwauth_nicknames=['auth0'], dirauth_nicknames=['auth0', 'auth1'], ignore_fallback_dirs=True)
+
+		self.assertIn('var AUTH_LOGICAL_MIN = 125,', html)
+		self.assertIn('AUTH_LOGICAL_MAX = 25000;', html)
+		self.assertIn("var bwauths = ['auth0'];", html)
+		self.assertIn("var dirauths = ['auth0', 'auth1'];", html)
+		self.assertIn('var ignore_fallback_dirs = true;', html)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,850 @@
+"""
+Unit tests for the fetching helpers of utility.py.
+"""
+
+import io
+import os
+import time
+import zlib
+import shutil
+import tempfile
+import threading
+import http.server
+import concurrent.futures
+import unittest
+import unittest.mock
+
+import stem
+import stem.directory
+import stem.descriptor.networkstatus
+
+import utility
+
+ENDPOINT = ('127.0.0.1', 9030)
+URL = 'http://127.0.0.1:9030/tor/status-vote/current/consensus.z'
+
+
+class Attempts:
+	"""
+	Fetch function that raises the given exceptions in turn, then succeeds.
+	"""
+
+	def __init__(self, *errors):
+		self.errors = list(errors)
+		self.calls = 0
+
+	def __call__(self, timeout):
+		self.calls += 1
+		if self.errors:
+			raise self.errors.pop(0)
+		return 'document'
+
+
+def failure():
+	return stem.DownloadFailed(URL, ConnectionRefusedError(), None)
+
+
+def refusal():
+	return utility.DownloadRefused(URL, 404, 'Not found')
+
+
+class TestRetries(unittest.TestCase):
+	def setUp(self):
+		utility.reset_retry_state()
+		patcher = unittest.mock.patch.object(utility, 'RETRY_BACKOFF', 0)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		self.addCleanup(utility.reset_retry_state)
+
+	def fetch(self, fetch, attempts = utility.RETRY_ATTEMPTS, endpoint = ENDPOINT):
+		return utility._fetch_with_retries(endpoint, URL, fetch, utility.time.time() + 60, attempts)
+
+	def test_retries_failures(self):
+		fetch = Attempts(failure(), failure())
+		self.assertEqual('document', self.fetch(fetch))
+		self.assertEqual(3, fetch.calls)
+		self.assertEqual(utility.RETRY_BUDGET - 2, utility._retries_left)
+		self.assertNotIn(ENDPOINT, utility._endpoint_failures)
+
+	def test_raises_last_failure(self):
+		fetch = Attempts(failure(), failure(), failure(), failure())
+		self.assertRaises(stem.DownloadFailed, self.fetch, fetch)
+		self.assertEqual(utility.RETRY_ATTEMPTS, fetch.calls)
+
+	def test_client_errors_are_not_retried(self):
+		for i in range(utility.CIRCUIT_BREAKER_THRESHOLD + 1):
+			fetch = Attempts(refusal())
+			self.assertRaises(utility.DownloadRefused, self.fetch, fetch)
+			self.assertEqual(1, fetch.calls)
+
+		self.assertEqual(utility.RETRY_BUDGET, utility._retries_left)
+		self.assertNotIn(ENDPOINT, utility._endpoint_failures)
+		self.assertFalse(utility._circuit_open(ENDPOINT))
+		self.assertEqual('document', self.fetch(Attempts()))
+
+	def test_other_errors_are_not_retried(self):
+		fetch = Attempts(ValueError('malformed document'))
+		self.assertRaises(ValueError, self.fetch, fetch)
+		self.assertEqual(1, fetch.calls)
+		self.assertNotIn(ENDPOINT, utility._endpoint_failures)
+
+	def test_circuit_breaker(self):
+		fetch = Attempts(*[failure()] * utility.CIRCUIT_BREAKER_THRESHOLD)
+		for i in range(utility.CIRCUIT_BREAKER_THRESHOLD):
+			self.assertRaises(stem.DownloadFailed, self.fetch, fetch, 1)
+		self.assertTrue(utility._circuit_open(ENDPOINT))
+
+		fetch = Attempts()
+		self.assertRaisesRegex(stem.DownloadFailed, 'skipped', self.fetch, fetch)
+		self.assertEqual(0, fetch.calls)
+
+		# other endpoints are unaffected
+		self.assertEqual('document', self.fetch(fetch, endpoint = ('127.0.0.2', 9030)))
+
+	def test_success_resets_circuit(self):
+		for i in range(utility.CIRCUIT_BREAKER_THRESHOLD - 1):
+			self.assertRaises(stem.DownloadFailed, self.fetch, Attempts(failure()), 1)
+		self.assertEqual('document', self.fetch(Attempts()))
+		self.assertRaises(stem.DownloadFailed, self.fetch, Attempts(failure()), 1)
+		self.assertFalse(utility._circuit_open(ENDPOINT))
+
+	def test_deadline_passed(self):
+		for i in range(utility.CIRCUIT_BREAKER_THRESHOLD + 1):
+			fetch = Attempts()
+			self.assertRaisesRegex(stem.DownloadFailed, 'deadline reached', utility._fetch_with_retries, ENDPOINT, URL, fetch, utility.time.time() - 1)
+			self.assertEqual(0, fetch.calls)
+
+		self.assertEqual(utility.RETRY_BUDGET, utility._retries_left)
+		self.assertNotIn(ENDPOINT, utility._endpoint_failures)
+		self.assertEqual('document', self.fetch(Attempts()))
+
+	def test_retry_budget(self):
+		with unittest.mock.patch.object(utility, '_retries_left', 1):
+			fetch = Attempts(failure(), failure())
+			self.assertRaises(stem.DownloadFailed, self.fetch, fetch)
+			self.assertEqual(2, fetch.calls)
+			self.assertEqual(0, utility._retries_left)
+
+
+class StatusHandler(http.server.BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+
+	def do_GET(self):
+		status = int(self.path.rsplit('/', 1)[-1])
+		self.send_response(status)
+		self.send_header('Content-Length', '2')
+		self.end_headers()
+		self.wfile.write(b'ok')
+
+	def log_message(self, format, *args):
+		pass
+
+
+class TestRequest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StatusHandler)
+		cls.server.daemon_threads = True
+		threading.Thread(target = cls.server.serve_forever, daemon = True).start()
+
+	@classmethod
+	def tearDownClass(cls):
+		cls.server.shutdown()
+		cls.server.server_close()
+		utility.connection_pool.close()
+
+	def request(self, status):
+		return utility._request('127.0.0.1', self.server.server_port, '/status/%i' % status, 5)
+
+	def test_ok(self):
+		headers, body = self.request(200)
+		self.assertEqual(b'ok', body)
+
+	def test_client_error_is_refused(self):
+		with self.assertRaises(utility.DownloadRefused) as context:
+			self.request(404)
+		self.assertEqual(404, context.exception.status)
+
+	def test_server_error_fails(self):
+		with self.assertRaises(stem.DownloadFailed) as context:
+			self.request(503)
+		self.assertNotIsInstance(context.exception, utility.DownloadRefused)
+
+	def test_connection_error_fails(self):
+		with http.server.HTTPServer(('127.0.0.1', 0), StatusHandler) as closed:
+			port = closed.server_port
+		self.assertRaises(stem.DownloadFailed, utility._request, '127.0.0.1', port, '/status/200', 5)
+
+
+class SlowHandler(http.server.BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+	release = threading.Event()
+
+	def do_GET(self):
+		self.send_response(200)
+		self.send_header('Content-Length', '2')
+		self.end_headers()
+		self.release.wait(10)
+		self.wfile.write(b'ok')
+
+	def log_message(self, format, *args):
+		pass
+
+
+class TestStopFetches(unittest.TestCase):
+	def setUp(self):
+		SlowHandler.release.clear()
+		self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), SlowHandler)
+		self.server.daemon_threads = True
+		self.server_thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+		self.server_thread.start()
+
+	def tearDown(self):
+		SlowHandler.release.set()
+		self.server.shutdown()
+		self.server.server_close()
+		self.server_thread.join()
+		utility.connection_pool.close()
+
+	def request(self):
+		return utility._request('127.0.0.1', self.server.server_port, '/slow', 10)
+
+	def test_abort_requests_in_flight(self):
+		executor = utility._fetch_executor(1)
+		future = executor.submit(self.request)
+		time.sleep(0.2)
+
+		start = time.time()
+		utility.connection_pool.abort()
+		self.assertRaises(utility._Cancelled, future.result, 5)
+		self.assertLess(time.time() - start, 2)
+		executor.shutdown()
+
+		# further requests are refused until the pool is closed
+		SlowHandler.release.set()
+		self.assertRaises(utility._Cancelled, self.request)
+		utility.connection_pool.close()
+		headers, body = self.request()
+		self.assertEqual(b'ok', body)
+
+	def test_stop_fetches_joins_executors(self):
+		executor = utility._fetch_executor(2)
+		futures = [executor.submit(self.request) for _ in range(3)]
+		time.sleep(0.2)
+
+		self.server.shutdown()
+		self.assertFalse(utility.stop_fetches())	# the server's request threads are still running
+		self.assertEqual([], utility._fetch_executors)
+		for future in futures:
+			self.assertRaises((utility._Cancelled, concurrent.futures.CancelledError), future.result, 0)
+		self.assertRaises(RuntimeError, executor.submit, self.request)
+
+		SlowHandler.release.set()
+		for thread in threading.enumerate():
+			if thread is not threading.current_thread():
+				thread.join(5)
+		self.assertTrue(utility.stop_fetches())
+
+
+def document(valid_after, fresh_until, body = b''):
+	"""
+	Provides the header of a consensus that's valid over the given times.
+	"""
+
+	return (b'network-status-version 3\nvote-status consensus\n'
+		+ b'valid-after ' + time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(valid_after)).encode('ascii') + b'\n'
+		+ b'fresh-until ' + time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(fresh_until)).encode('ascii') + b'\n'
+		+ body)
+
+
+class TestDocumentCache(unittest.TestCase):
+	def setUp(self):
+		self.path = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.path)
+		self.cache = utility.DocumentCache(self.path)
+		self.now = int(time.time())
+
+	def put(self, content, authority = 'auth0', doc_type = 'consensus', headers = None):
+		compressed = zlib.compress(content)
+		self.cache.put(authority, doc_type, compressed, content, headers)
+		return compressed
+
+	def test_document_times(self):
+		content = document(1704067200, 1704070800, b'dir-source auth0\nvalid-after 2000-01-01 00:00:00\n')
+		self.assertEqual((1704067200, 1704070800), utility._document_times(content))
+		self.assertEqual((None, None), utility._document_times(b'network-status-version 3\n'))
+
+	def test_fresh_document(self):
+		compressed = self.put(document(self.now - 60, self.now + 3600))
+		self.assertEqual(compressed, self.cache.get('auth0', 'consensus'))
+		self.assertEqual(None, self.cache.get('auth1', 'consensus'))
+		self.assertEqual(None, self.cache.get('auth0', 'vote'))
+
+		# a second instance reads the index from disk
+
+		self.assertEqual(compressed, utility.DocumentCache(self.path).get('auth0', 'consensus'))
+
+	def test_stale_document(self):
+		self.put(document(self.now - 3600, self.now - 60))
+		self.assertEqual(None, self.cache.get('auth0', 'consensus'))
+
+	def test_latest_fresh_document(self):
+		self.put(document(self.now - 120, self.now + 3600, b'older'))
+		compressed = self.put(document(self.now - 60, self.now + 3600, b'newer'))
+		self.assertEqual(compressed, self.cache.get('auth0', 'consensus'))
+
+	def test_corrupt_document(self):
+		compressed = self.put(document(self.now - 60, self.now + 3600))
+		digest = utility.hashlib.sha256(compressed).hexdigest()
+		with open(os.path.join(self.path, digest + '.z'), 'wb') as f:
+			f.write(compressed[:-1])
+		self.assertEqual(None, self.cache.get('auth0', 'consensus'))
+
+	def test_retention(self):
+		old = self.put(document(self.now - 3 * 86400, self.now - 2 * 86400, b'old'))
+		self.put(document(self.now - 60, self.now + 3600, b'new'))
+		old_digest = utility.hashlib.sha256(old).hexdigest()
+		self.assertFalse(os.path.exists(os.path.join(self.path, old_digest + '.z')))
+		self.assertEqual(1, len(self.cache._entries('auth0', 'consensus')))
+
+	def test_size(self):
+		self.assertEqual(None, self.cache.size('auth0', 'vote'))
+		compressed = self.put(document(self.now - 60, self.now + 3600), doc_type = 'vote')
+		self.assertEqual(len(compressed), self.cache.size('auth0', 'vote'))
+
+	def test_document_without_times(self):
+		self.put(b'network-status-version 3\n')
+		self.assertEqual([], self.cache._entries('auth0', 'consensus'))
+
+
+class DocumentHandler(http.server.BaseHTTPRequestHandler):
+	"""
+	DirPort serving a single document, answering 304 for conditional requests
+	with its ETag.
+	"""
+
+	protocol_version = 'HTTP/1.1'
+	content = b''
+	requests = []
+
+	def do_GET(self):
+		DocumentHandler.requests.append(dict(self.headers))
+		etag = '"%s"' % utility.hashlib.sha1(self.content).hexdigest()
+
+		if self.headers.get('If-None-Match') == etag:
+			self.send_response(304)
+			self.send_header('Content-Length', '0')
+			self.end_headers()
+			return
+
+		body = zlib.compress(self.content)
+		self.send_response(200)
+		self.send_header('Content-Encoding', 'deflate')
+		self.send_header('Content-Length', str(len(body)))
+		self.send_header('Last-Modified', 'Mon, 01 Jan 2024 00:00:00 GMT')
+		self.send_header('ETag', etag)
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass
+
+
+class TestConditionalRequests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), DocumentHandler)
+		cls.server.daemon_threads = True
+		threading.Thread(target = cls.server.serve_forever, daemon = True).start()
+
+	@classmethod
+	def tearDownClass(cls):
+		cls.server.shutdown()
+		cls.server.server_close()
+		utility.connection_pool.close()
+
+	def setUp(self):
+		self.path = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.path)
+		patcher = unittest.mock.patch.object(utility, 'document_cache', utility.DocumentCache(self.path))
+		self.cache = patcher.start()
+		self.addCleanup(patcher.stop)
+
+		# the document is past its fresh-until time, so it's revalidated
+
+		now = int(time.time())
+		DocumentHandler.content = document(now - 3600, now - 60, b'dir-source auth0\n')
+		DocumentHandler.requests = []
+
+	def fetch(self):
+		consume = lambda stream: b''.join(stream.lines())
+		return utility._fetch_document('127.0.0.1', self.server.server_port, '/tor/status-vote/current/consensus.z', consume, 5, ('auth0', 'consensus'))
+
+	def test_conditional_headers(self):
+		self.assertEqual((None, {}), self.cache.conditional_headers('auth0', 'consensus'))
+
+		# without a Last-Modified header we ask for anything after its valid-after
+
+		valid_after = int(time.time()) - 3600
+		content = document(valid_after, valid_after + 3540)
+		compressed = zlib.compress(content)
+		self.cache.put('auth0', 'consensus', compressed, content)
+		digest, headers = self.cache.conditional_headers('auth0', 'consensus')
+		self.assertEqual(utility.hashlib.sha256(compressed).hexdigest(), digest)
+		self.assertEqual({'If-Modified-Since': utility.email.utils.formatdate(valid_after, usegmt = True)}, headers)
+
+		self.cache.put('auth0', 'consensus', compressed, content, {'Last-Modified': 'Mon, 01 Jan 2024 00:05:00 GMT', 'ETag': '"abc"'})
+		digest, headers = self.cache.conditional_headers('auth0', 'consensus')
+		self.assertEqual({'If-Modified-Since': 'Mon, 01 Jan 2024 00:05:00 GMT', 'If-None-Match': '"abc"'}, headers)
+
+	def test_not_modified(self):
+		self.assertEqual(DocumentHandler.content, self.fetch())
+		self.assertNotIn('If-None-Match', DocumentHandler.requests[0])
+
+		self.assertEqual(DocumentHandler.content, self.fetch())
+		self.assertEqual(2, len(DocumentHandler.requests))
+		self.assertEqual('Mon, 01 Jan 2024 00:00:00 GMT', DocumentHandler.requests[1]['If-Modified-Since'])
+		self.assertIn('If-None-Match', DocumentHandler.requests[1])
+
+	def test_modified(self):
+		self.fetch()
+		DocumentHandler.content += b'dir-source auth1\n'
+		self.assertEqual(DocumentHandler.content, self.fetch())
+		self.assertIn('If-None-Match', DocumentHandler.requests[1])
+
+	def test_not_modified_without_cached_copy(self):
+		self.fetch()
+		for filename in os.listdir(self.path):
+			if filename.endswith('.z'):
+				os.remove(os.path.join(self.path, filename))
+
+		self.assertEqual(DocumentHandler.content, self.fetch())
+		self.assertEqual(3, len(DocumentHandler.requests))
+		self.assertNotIn('If-None-Match', DocumentHandler.requests[2])
+
+
+class DirPortHandler(http.server.BaseHTTPRequestHandler):
+	"""
+	DirPort serving the documents of its server, a dict of paths to their
+	content. Its server also lists the requests it got, and delays its
+	responses by the delays it's given in turn.
+	"""
+
+	protocol_version = 'HTTP/1.1'
+
+	def do_GET(self):
+		self.server.requests.append(self.path)
+		if self.server.delays:
+			time.sleep(self.server.delays.pop(0))
+
+		content = self.server.documents.get(self.path)
+		if content is None:
+			self.send_response(404)
+			self.send_header('Content-Length', '0')
+			self.end_headers()
+			return
+
+		body = zlib.compress(content)
+		self.send_response(200)
+		self.send_header('Content-Encoding', 'deflate')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass
+
+
+class DirPorts(unittest.TestCase):
+	"""
+	Runs a DirPort for each of a few authorities, and makes them the only ones
+	we know of.
+	"""
+
+	NICKNAMES = ('auth0', 'auth1')
+
+	def setUp(self):
+		self.servers, authorities = {}, {}
+		for (i, nickname) in enumerate(self.NICKNAMES):
+			server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), DirPortHandler)
+			server.daemon_threads = True
+			server.documents, server.requests, server.delays = {}, [], []
+			threading.Thread(target = server.serve_forever, args = (0.05,), daemon = True).start()
+			self.addCleanup(server.server_close)
+			self.addCleanup(server.shutdown)
+
+			self.servers[nickname] = server
+			authorities[nickname] = stem.directory.Authority('127.0.0.1', 9001, server.server_port, '%X' % i * 40, nickname, None, '%X' % (i + 10) * 40)
+
+		self.addCleanup(utility.connection_pool.close)
+		for (attr, value) in (('_dirAuths', authorities), ('document_cache', None)):
+			patcher = unittest.mock.patch.object(utility, attr, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+		self.authorities = authorities
+
+
+def vote():
+	return stem.descriptor.networkstatus.NetworkStatusDocumentV3.create({'vote-status': 'vote'}).get_bytes()
+
+
+class TestVoteDigest(unittest.TestCase):
+	def test_vote_digest(self):
+		content = vote()
+		expected = stem.descriptor.networkstatus.NetworkStatusDocumentV3(content, validate = False).digest()
+		self.assertEqual(expected, utility._vote_digest(content.splitlines(True)))
+
+		# the signature isn't part of the digest
+
+		signed = content[:content.index(b'directory-signature ') + len(b'directory-signature ')]
+		self.assertEqual(expected, utility._vote_digest((signed + b'resigned\n').splitlines(True)))
+		self.assertRaises(ValueError, utility._vote_digest, content.replace(b'directory-signature', b'signature').splitlines(True))
+
+
+class TestVoteValidation(DirPorts):
+	def serve(self, votes):
+		"""
+		Has every authority serve the same votes.
+		"""
+
+		for server in self.servers.values():
+			for (nickname, content) in votes.items():
+				server.documents['/tor/status-vote/current/%s.z' % self.authorities[nickname].v3ident] = content
+
+	def test_matching_votes(self):
+		self.serve({'auth0': vote(), 'auth1': vote().replace(b'consensus-methods 1 9', b'consensus-methods 1 8')})
+
+		for digest in (True, False):
+			validation = utility.validate_votes(digest)
+			self.assertEqual(['OK'] * 4, [status for sender in validation.values() for (url, status) in sender.values()])
+
+	def test_changed_vote(self):
+		self.serve({'auth0': vote(), 'auth1': vote()})
+		changed = vote().replace(b'consensus-methods 1 9', b'consensus-methods 1 8')
+		self.servers['auth0'].documents['/tor/status-vote/current/%s.z' % self.authorities['auth1'].v3ident] = changed
+
+		for digest in (True, False):
+			validation = utility.validate_votes(digest)
+			self.assertEqual('OK', validation['auth0']['auth0'][1])
+			self.assertEqual('OK', validation['auth0']['auth1'][1])
+			self.assertEqual('OK', validation['auth1']['auth1'][1])
+			self.assertEqual('Discrepency detected', validation['auth1']['auth0'][1])
+			self.assertEqual('http://127.0.0.1:%i/tor/status-vote/current/%s.z' % (self.servers['auth0'].server_port, self.authorities['auth1'].v3ident), validation['auth1']['auth0'][0])
+
+	def test_missing_vote(self):
+		self.serve({'auth0': vote(), 'auth1': vote()})
+		del self.servers['auth1'].documents['/tor/status-vote/current/%s.z' % self.authorities['auth1'].v3ident]
+
+		validation = utility.validate_votes()
+		self.assertEqual('Unable to validate the vote with the sender', validation['auth1']['auth0'][1])
+		self.assertIn('404', validation['auth1']['auth1'][1])
+
+
+class TestClockskew(DirPorts):
+	def setUp(self):
+		DirPorts.setUp(self)
+		for server in self.servers.values():
+			server.documents['/tor/keys/authority.z'] = b'dir-key-certificate-version 3\n'
+
+	def test_samples(self):
+		clockskew = utility.get_clockskew()
+
+		self.assertEqual(['auth0', 'auth1'], sorted(clockskew))
+		for (nickname, skew) in clockskew.items():
+			self.assertLessEqual(abs(skew), 1)
+			self.assertEqual(['/tor/keys/authority.z'] * utility.CLOCKSKEW_SAMPLES, self.servers[nickname].requests)
+
+	def test_slow_authority(self):
+		self.servers['auth1'].delays = [0.2]
+
+		with unittest.mock.patch.object(utility, 'CLOCKSKEW_SLOW_RTT', 0.1):
+			start = time.time()
+			clockskew = utility.get_clockskew()
+			self.assertLess(time.time() - start, 0.4)
+
+		self.assertEqual(['auth0', 'auth1'], sorted(clockskew))
+		self.assertEqual(utility.CLOCKSKEW_SAMPLES, len(self.servers['auth0'].requests))
+		self.assertEqual(1, len(self.servers['auth1'].requests))
+
+	def test_sample_budget(self):
+		self.servers['auth1'].delays = [0.1, 2]
+
+		with unittest.mock.patch.object(utility, 'CLOCKSKEW_SLOW_RTT', 0.5):
+			start = time.time()
+			clockskew = utility.get_clockskew()
+			self.assertLess(time.time() - start, 1.5)	# 0.1s and 6 * 0.1s for the samples after it
+
+		# the sample that overran its budget doesn't count against the authority
+		self.assertEqual(['auth0', 'auth1'], sorted(clockskew))
+		self.assertEqual(2, len(self.servers['auth1'].requests))
+		self.assertNotIn(('127.0.0.1', self.servers['auth1'].server_port), utility._endpoint_failures)
+
+
+class StubQueries():
+	"""
+	Stands in for utility._query, answering each authority's requests in turn
+	with the (delay, result) it's given for them. A result that's an exception
+	is raised. Requests notice when they're cancelled while waiting.
+	"""
+
+	def __init__(self, authorities, answers):
+		self.nicknames = dict(((a.address, a.dir_port), nickname) for (nickname, a) in authorities.items())
+		self.answers = answers
+		self.calls = []	# (nickname, resource, when it started, how it ended)
+		self.started = time.time()
+		self.lock = threading.Lock()
+
+	def __call__(self, address, dir_port, resource, timeout, cache_key = None, cancel = None):
+		nickname = self.nicknames[(address, dir_port)]
+		with self.lock:
+			answers = self.answers[nickname]
+			delay, result = answers.pop(0) if len(answers) > 1 else answers[0]
+			call = [nickname, resource, time.time() - self.started, None]
+			self.calls.append(call)
+
+		wake = time.time() + delay
+		while time.time() < wake:
+			if cancel is not None and cancel.is_set():
+				call[3] = 'cancelled'
+				raise utility._Cancelled()
+			time.sleep(0.005)
+
+		call[3] = 'done'
+		if isinstance(result, Exception):
+			raise result
+		return (result, delay)
+
+	def ended(self, nickname):
+		time.sleep(0.05)	# let the cancelled requests notice
+		with self.lock:
+			return [call[3] for call in self.calls if call[0] == nickname]
+
+
+class TestHedgedVotes(unittest.TestCase):
+	def setUp(self):
+		self.authorities = dict(('auth%i' % i, stem.directory.Authority('127.0.0.%i' % (i + 1), 9001, 9030, '%X' % i * 40, 'auth%i' % i, None, '%X' % (i + 10) * 40)) for i in range(3))
+		utility.reset_retry_state()
+		self.addCleanup(utility.reset_retry_state)
+
+		# votes are hedged 0.1s after we ask for them if we've never had one
+
+		for (attr, value) in (('_dirAuths', self.authorities), ('document_cache', None), ('RETRY_BACKOFF', 0), ('VOTE_HEDGE_DELAY', 0.05), ('VOTE_HEDGE_RATE', utility.VOTE_SIZE / 0.05)):
+			patcher = unittest.mock.patch.object(utility, attr, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def get(self, answers, deadline = 5):
+		self.queries = StubQueries(self.authorities, answers)
+		with unittest.mock.patch.object(utility, '_query', self.queries):
+			result = utility._get_document('vote', '/tor/status-vote/current/authority.z', self.authorities['auth0'], time.time() + deadline)
+		self.elapsed = time.time() - self.queries.started
+		return result
+
+	def fallbacks(self):
+		return [call for call in self.queries.calls if call[0] != 'auth0']
+
+	def url(self, nickname):
+		if nickname == 'auth0':
+			return 'http://127.0.0.1:9030/tor/status-vote/current/authority.z'
+		return 'http://%s:9030/tor/status-vote/current/%s.z' % (self.authorities[nickname].address, self.authorities['auth0'].v3ident)
+
+	def test_own_vote(self):
+		document, runtime, url, exc = self.get({'auth0': [(0.02, 'own')], 'auth1': [(0, 'fallback')], 'auth2': [(0, 'fallback')]})
+
+		self.assertEqual(('own', 0.02, self.url('auth0'), None), (document, runtime, url, exc))
+		self.assertEqual([], self.fallbacks())
+
+	def test_hedge_wins(self):
+		document, runtime, url, exc = self.get({'auth0': [(2, 'own')], 'auth1': [(0.02, 'fallback')], 'auth2': [(0.02, 'fallback')]})
+
+		self.assertEqual('fallback', document)
+		self.assertEqual(None, runtime)	# we never learned how long auth0 takes
+		self.assertEqual(self.url(self.fallbacks()[0][0]), url)
+		self.assertEqual(None, exc)
+		self.assertLess(self.elapsed, 0.5)
+
+		# the first fallback is asked once we've waited for the hedge delay
+
+		self.assertEqual(1, len(self.fallbacks()))
+		self.assertEqual('/tor/status-vote/current/%s.z' % self.authorities['auth0'].v3ident, self.fallbacks()[0][1])
+		self.assertGreaterEqual(self.fallbacks()[0][2], 0.1)
+		self.assertEqual(['cancelled'], self.queries.ended('auth0'))
+
+	def test_own_vote_wins_after_hedging(self):
+		document, runtime, url, exc = self.get({'auth0': [(0.15, 'own')], 'auth1': [(2, 'fallback')], 'auth2': [(2, 'fallback')]})
+
+		self.assertEqual(('own', 0.15, self.url('auth0'), None), (document, runtime, url, exc))
+		self.assertEqual(1, len(self.fallbacks()))
+		self.assertEqual(['cancelled'], self.queries.ended(self.fallbacks()[0][0]))
+
+	def test_hedge_delay_grows_with_vote_size(self):
+		cache = unittest.mock.Mock()
+		cache.get.return_value = None
+		cache.size.return_value = int(utility.VOTE_HEDGE_RATE * 0.2)
+
+		with unittest.mock.patch.object(utility, 'document_cache', cache):
+			document, runtime, url, exc = self.get({'auth0': [(2, 'own')], 'auth1': [(0.02, 'fallback')], 'auth2': [(0.02, 'fallback')]})
+
+		cache.size.assert_called_with('auth0', 'vote')
+		self.assertEqual('fallback', document)
+		self.assertGreaterEqual(self.fallbacks()[0][2], 0.25)
+
+	def test_hedges_on_failure(self):
+		failed = stem.DownloadFailed(URL, ConnectionRefusedError(), None)
+		document, runtime, url, exc = self.get({'auth0': [(0, failed)], 'auth1': [(0.02, 'fallback')], 'auth2': [(0.02, 'fallback')]})
+
+		self.assertEqual('fallback', document)
+		self.assertEqual(None, runtime)
+		self.assertEqual(utility.RETRY_ATTEMPTS, self.queries.ended('auth0').count('done'))
+
+		# we didn't wait for the hedge delay after the authority's last attempt
+		self.assertLess(self.fallbacks()[0][2], 0.1)
+
+	def test_every_source_fails(self):
+		own_failure = stem.DownloadFailed(URL, ConnectionRefusedError(), None)
+		other_failure = stem.DownloadFailed(URL, ConnectionResetError(), None)
+		document, runtime, url, exc = self.get({'auth0': [(0, own_failure)], 'auth1': [(0, other_failure)], 'auth2': [(0, other_failure)]})
+
+		# it's the authority's own failure that's reported
+		self.assertEqual((None, None, self.url('auth0'), own_failure), (document, runtime, url, exc))
+		self.assertEqual(['auth1', 'auth2'], sorted(call[0] for call in self.fallbacks()))
+
+	def test_every_source_is_too_slow(self):
+		document, runtime, url, exc = self.get({'auth0': [(2, 'own')], 'auth1': [(2, 'fallback')], 'auth2': [(2, 'fallback')]}, deadline = 0.3)
+
+		self.assertEqual((None, None, self.url('auth0')), (document, runtime, url))
+		self.assertIsInstance(exc, stem.DownloadTimeout)
+		self.assertLess(self.elapsed, 0.6)
+		for nickname in self.authorities:
+			self.assertEqual(['cancelled'], self.queries.ended(nickname))
+
+
+class TestFetchTrace(DirPorts):
+	RESOURCE = '/tor/status-vote/current/consensus.z'
+
+	def setUp(self):
+		DirPorts.setUp(self)
+		patcher = unittest.mock.patch.object(utility, 'fetch_trace', None)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+		self.path = os.path.join(tempfile.mkdtemp(), 'trace.zip')
+		self.addCleanup(shutil.rmtree, os.path.dirname(self.path))
+
+		self.content = document(int(time.time()) - 60, int(time.time()) + 3600)
+		self.servers['auth0'].documents[self.RESOURCE] = self.content
+		self.servers['auth0'].delays = [0.2]
+
+	def request(self, nickname, resource):
+		start = time.time()
+		headers, body = utility._request('127.0.0.1', self.authorities[nickname].dir_port, resource, 5)
+		return (time.time() - start, headers, zlib.decompress(body))
+
+	def test_round_trip(self):
+		trace = utility.record_fetches()
+		recorded_time, recorded_headers, recorded_body = self.request('auth0', self.RESOURCE)
+		self.assertRaises(utility.DownloadRefused, self.request, 'auth0', '/tor/missing.z')
+
+		utility.fetch_trace = None
+		trace.save(self.path)
+		self.assertEqual(2, len(trace.exchanges))
+		self.assertGreaterEqual(trace.exchanges[0]['first_byte'], 0.2)
+
+		# the authorities are gone, only the trace answers
+
+		for server in self.servers.values():
+			server.shutdown()
+
+		replay = utility.replay_fetches(self.path, speed = 2)
+		self.addCleanup(replay.stop)
+		self.assertEqual(dict((nickname, a.dir_port) for (nickname, a) in self.authorities.items()), dict((nickname, a.dir_port) for (nickname, a) in utility.get_dirauths().items()))
+
+		replayed_time, replayed_headers, replayed_body = self.request('auth0', self.RESOURCE)
+		self.assertEqual(self.content, recorded_body)
+		self.assertEqual(recorded_body, replayed_body)
+		self.assertEqual(recorded_headers['Content-Encoding'], replayed_headers['Content-Encoding'])
+		self.assertLessEqual(abs(utility._date_offset(replayed_headers['Date'], time.time())), 1)
+
+		# its latency is replayed at twice the speed
+
+		self.assertGreaterEqual(replayed_time, 0.1)
+		self.assertLess(replayed_time, recorded_time)
+
+		with self.assertRaises(utility.DownloadRefused) as context:
+			self.request('auth0', '/tor/missing.z')
+		self.assertEqual(404, context.exception.status)
+
+	def test_errors(self):
+		trace = utility.record_fetches()
+		self.servers['auth1'].shutdown()
+		self.servers['auth1'].server_close()
+		self.assertRaises(stem.DownloadFailed, self.request, 'auth1', self.RESOURCE)
+
+		utility.fetch_trace = None
+		trace.save(self.path)
+		self.assertIn('error', utility.FetchTrace.load(self.path).exchanges[0])
+
+		replay = utility.replay_fetches(self.path)
+		self.addCleanup(replay.stop)
+		self.assertRaises(stem.DownloadFailed, self.request, 'auth1', self.RESOURCE)
+
+
+class TestPageBuffer(unittest.TestCase):
+	def setUp(self):
+		patcher = unittest.mock.patch.object(utility.locale, 'getpreferredencoding', return_value = 'utf-8')
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def test_offsets(self):
+		output = io.BytesIO()
+		page = utility.PageBuffer(output)
+		fragments = ['<td>', 'relay', '\u00e9', '\u20ac', '\U0001d11e', '</td>\n', '', 'Bj\u00f6rk']
+
+		offsets = []
+		for fragment in fragments:
+			offsets.append(page.tell())
+			page.write(fragment)
+		offsets.append(page.tell())
+		page.flush()
+
+		self.assertEqual([0, 4, 9, 11, 14, 18, 24, 24, 30], offsets)
+		content = output.getvalue()
+		self.assertEqual(''.join(fragments).encode('utf-8'), content)
+		for (i, fragment) in enumerate(fragments):
+			self.assertEqual(fragment, content[offsets[i]:offsets[i + 1]].decode('utf-8'))
+
+	def test_buffer_size(self):
+		output = io.BytesIO()
+		page = utility.PageBuffer(output, buffer_size = 16)
+
+		page.write('\u20ac' * 5)	# 15 bytes
+		self.assertEqual(15, page.tell())
+		self.assertEqual(b'', output.getvalue())
+
+		page.write('a')
+		self.assertEqual(16, page.tell())
+		self.assertEqual(('\u20ac' * 5 + 'a').encode('utf-8'), output.getvalue())
+
+		page.write('b')
+		self.assertEqual(17, page.tell())
+		self.assertEqual(16, len(output.getvalue()))
+
+		page.flush()
+		self.assertEqual(('\u20ac' * 5 + 'ab').encode('utf-8'), output.getvalue())
+
+	def test_file(self):
+		path = os.path.join(tempfile.mkdtemp(), 'page.html')
+		self.addCleanup(shutil.rmtree, os.path.dirname(path))
+
+		page = utility.PageBuffer(path, buffer_size = 8)
+		for i in range(100):
+			page.write('\u00e9%i,' % i)
+		self.assertEqual(sum(len('\u00e9%i,' % i) + 1 for i in range(100)), page.tell())
+		page.close()
+
+		with open(path, 'rb') as output:
+			self.assertEqual(''.join('\u00e9%i,' % i for i in range(100)).encode('utf-8'), output.read())
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,223 @@
+"""
+Unit tests for website.py.
+"""
+
+import os
+import json
+import shutil
+import datetime
+import tempfile
+import threading
+import unittest
+import unittest.mock
+
+import stem.directory
+
+import utility
+import website
+from website import WebsiteWriter
+from test_relaytable import sample_documents, parse, document_content
+
+RELAY_A = '044F1574F037AFC644D82A531289BAFAE5316960'
+RELAY_B = '0435AFEF10B99AC9F178D77FF24D04FDA24C8407'
+RELAY_C = 'F635AFEF10B99AC9F178D77FF24D04FDA24C8407'
+
+
+class TestRelayShards(unittest.TestCase):
+	def setUp(self):
+		self.path = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.path)
+
+		self.writer = WebsiteWriter()
+		self.writer.relay_indexes = [
+			(RELAY_A, 'relayA', 0, 10, '<tr>A</tr>'),
+			(RELAY_B, 'relayB', 10, 20, '<tr>B</tr>'),
+			(RELAY_C, 'relayC', 20, 30, '<tr>C</tr>'),
+		]
+
+	def shard(self, prefix):
+		with open(os.path.join(self.path, prefix + '.json')) as shard_file:
+			return json.load(shard_file)
+
+	def test_shards(self):
+		self.writer._write_relay_shards(self.path)
+
+		self.assertEqual(256, len(os.listdir(self.path)))
+		self.assertEqual({RELAY_A: {'nickname': 'relayA', 'row': '<tr>A</tr>'}, RELAY_B: {'nickname': 'relayB', 'row': '<tr>B</tr>'}}, self.shard('04'))
+		self.assertEqual({RELAY_C: {'nickname': 'relayC', 'row': '<tr>C</tr>'}}, self.shard('F6'))
+		self.assertEqual({}, self.shard('00'))
+
+	def test_shards_replace_earlier_ones(self):
+		with open(os.path.join(self.path, '00.json'), 'w') as shard_file:
+			json.dump({'00' * 20: {'nickname': 'gone', 'row': ''}}, shard_file)
+		os.link(os.path.join(self.path, '00.json'), os.path.join(self.path, 'served'))
+
+		self.writer._write_relay_shards(self.path)
+
+		self.assertEqual({}, self.shard('00'))
+		self.assertEqual([], [f for f in os.listdir(self.path) if f.endswith('.tmp')])
+
+		# the earlier shard was replaced rather than rewritten, so whoever is
+		# still reading it sees it whole
+		with open(os.path.join(self.path, 'served')) as shard_file:
+			self.assertEqual('gone', json.load(shard_file)['00' * 20]['nickname'])
+
+
+class SampleWebsite(unittest.TestCase):
+	"""
+	Writes the pages of the sample documents.
+	"""
+
+	def setUp(self):
+		self.path = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.path)
+
+		# the sample votes don't have authority key certificates, and download
+		# statistics are read from a file
+
+		sections = tuple(section for section in website.REPORT_SECTIONS if section[0] not in ('_write_authority_keys', '_write_shared_random', '_write_download_statistics'))
+		authorities = dict(('auth%i' % i, stem.directory.Authority('127.0.0.%i' % (i + 1), 9001, 9030, '%X' % i * 40, 'auth%i' % i, None, '%X' % (i + 10) * 40)) for i in range(4))
+		for (target, attr, value) in ((website, 'REPORT_SECTIONS', sections), (utility, '_dirAuths', authorities), (utility, '_bwAuths', None)):
+			patcher = unittest.mock.patch.object(target, attr, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+		self.consensus, self.votes = sample_documents()
+		self.config = {'bwauths': ['auth0', 'auth1'], 'ignore_fallback_authorities': False, 'clockskew_threshold': 20}
+		utility.set_config(self.config)
+
+	def writer(self, **inputs):
+		model = {
+			'config': self.config,
+			'consensuses': {'auth0': self.consensus, 'auth1': self.consensus},
+			'votes': self.votes,
+			'fallback_dirs': sorted(self.consensus.routers)[:20],
+			'clockskew': {'auth0': 1.5},
+			'validation': {},
+			'consensus_expiry': datetime.timedelta(hours=3),
+		}
+		model.update(inputs)
+
+		writer = WebsiteWriter()
+		for (name, value) in model.items():
+			getattr(writer, 'set_' + name)(value)
+		return writer
+
+	def render(self, writer, include_relay_info = True):
+		filename = os.path.join(self.path, 'page.html')
+		writer.write_website(filename, include_relay_info)
+		with open(filename) as page:
+			return page.read()
+
+
+class TestFragments(SampleWebsite):
+	def test_report_is_reused(self):
+		writer = self.writer()
+		page = self.render(writer)
+		self.assertIn('report', writer.fragments)
+
+		with unittest.mock.patch.object(writer, '_write_valid_after_time', side_effect = AssertionError('rendered again')):
+			self.assertEqual(page, self.render(writer))
+
+	def test_relay_info_pages(self):
+		writer = self.writer()
+		detailed = self.render(writer)
+		abbreviated = self.render(writer, False)
+
+		row = '<td id="%s"' % min(self.consensus.routers)
+		self.assertIn(row, detailed)
+		self.assertNotIn('relay-addition-javascript-pointer', detailed)
+		self.assertIn('relay-addition-javascript-pointer', abbreviated)
+		self.assertNotIn(row, abbreviated)
+
+		# only the report is shared between them
+
+		self.assertEqual(self.render(self.writer()), detailed)
+		self.assertEqual(self.render(self.writer(), False), abbreviated)
+		self.assertEqual(detailed, self.render(writer))
+
+	def test_setters_invalidate(self):
+		changes = {
+			'config': dict(self.config, ignore_fallback_authorities = True),
+			'consensuses': {'auth0': parse(document_content(9, False))},
+			'votes': dict(list(self.votes.items())[:2]),
+			'fallback_dirs': sorted(self.consensus.routers)[20:40],
+			'clockskew': {'auth0': 25.0},
+			'validation': {'auth0': {'auth1': ('http://127.0.0.1:9030/tor/status-vote/current/authority.z', 'Discrepency detected')}},
+			'consensus_expiry': datetime.timedelta(days=100000),
+		}
+
+		for (name, value) in changes.items():
+			for include_relay_info in (True, False):
+				writer = self.writer()
+				page = self.render(writer, include_relay_info)
+				getattr(writer, 'set_' + name)(value)
+				changed = self.render(writer, include_relay_info)
+
+				self.assertNotEqual(page, changed, name)
+				self.assertEqual(self.render(self.writer(**{name: value}), include_relay_info), changed, name)
+
+
+class TestRenderProcesses(SampleWebsite):
+	def setUp(self):
+		SampleWebsite.setUp(self)
+		self.config['render_processes'] = 2
+
+		# forking needs us to be the only thread, so wait on what other tests left
+		for thread in threading.enumerate():
+			if thread is not threading.current_thread():
+				thread.join(5)
+
+	def write_pages(self, writer):
+		"""
+		Writes the detailed and abbreviated page as write_website.py does,
+		providing what we wrote.
+		"""
+
+		written = {}
+		for (name, include_relay_info) in (('detailed', True), ('abbreviated', False)):
+			filename = os.path.join(self.path, name + '.html')
+			indexes = os.path.join(self.path, name + '-indexes.txt')
+			shards = os.path.join(self.path, name + '-shards')
+			writer.write_website(filename, include_relay_info, indexes, shards)
+
+			for path in (filename, indexes):
+				with open(path, 'rb') as output:
+					written[os.path.basename(path)] = output.read()
+			if os.path.exists(shards):
+				for shard in os.listdir(shards):
+					with open(os.path.join(shards, shard), 'rb') as output:
+						written[name + '/' + shard] = output.read()
+		return written
+
+	def test_matches_serial_rendering(self):
+		serial = self.write_pages(self.writer(config = dict(self.config, render_processes = 0)))
+
+		writer = self.writer()
+		with unittest.mock.patch.object(writer, '_write_sections_in_processes', wraps = writer._write_sections_in_processes) as in_processes:
+			forked = self.write_pages(writer)
+		self.assertEqual(2, in_processes.call_count)
+
+		self.assertEqual(sorted(serial), sorted(forked))
+		self.assertEqual(256, len([name for name in forked if name.startswith('detailed/')]))
+		for name in serial:
+			self.assertEqual(serial[name], forked[name], name)
+
+	def test_serial_while_fetches_are_running(self):
+		serial = self.write_pages(self.writer(config = dict(self.config, render_processes = 0)))
+
+		# a thread we can't stop, like a fetch that's still running
+		running = threading.Event()
+		thread = threading.Thread(target = running.wait)
+		thread.start()
+		self.addCleanup(thread.join)
+		self.addCleanup(running.set)
+
+		writer = self.writer()
+		with unittest.mock.patch.object(writer, '_write_sections_in_processes') as in_processes:
+			self.assertEqual(serial, self.write_pages(writer))
+		in_processes.assert_not_called()
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -1,16 +1,32 @@
 #!/usr/bin/env python3
 
+import io
+import os
+import locale
+import sys
+import json
 import time
-import urllib
+import zlib
+import socket
+import calendar
+import email.utils
+import random
+import hashlib
 import datetime
+import threading
+import http.client
+import http.server
+import zipfile
 import concurrent.futures
 
 import stem.directory
 import stem.descriptor
-import stem.descriptor.remote
+import stem.descriptor.networkstatus
 import stem.util.conf
 import stem.util.enum
 
+from relaytable import RouterEntries
+
 config = {'bwauths': []}
 def set_config(c):
 	global config
@@ -40,11 +56,619 @@ downloader = stem.descriptor.remote.DescriptorDownloader(fall_back_to_authority
 vote = downloader.query('/tor/status-vote/current/authority.z', default_params = False, endpoints=[(authority.address, authority.dir_port)]).run()[0]
 """
 
-downloader = stem.descriptor.remote.DescriptorDownloader(
-	timeout = 30,
-	fall_back_to_authority = False,
-	document_handler = stem.descriptor.DocumentHandler.DOCUMENT,
-)
+# Timeout for a single request, the overall time budget for fetching one set of
+# documents (consensuses or votes) from all of the authorities, and how many
+# authorities we talk to at once.
+FETCH_TIMEOUT = 30
+FETCH_DEADLINE = 90
+FETCH_WORKERS = 8
+
+# Cross-validation fetches every vote from every authority. These are small
+# requests, so run them on a wide pool under their own time budget.
+VALIDATION_DEADLINE = 120
+VALIDATION_WORKERS = 32
+
+# An authority's own vote is hedged by also asking another authority for it
+# when the request fails, or when it takes longer than VOTE_HEDGE_DELAY
+# seconds plus the time a vote as large as the last one we got from the
+# authority takes at VOTE_HEDGE_RATE bytes per second. Votes we've never had
+# are assumed to be VOTE_SIZE bytes.
+VOTE_HEDGE_DELAY = 5
+VOTE_HEDGE_RATE = 128 * 1024
+VOTE_SIZE = 2 * 1024 * 1024
+
+# Every fetch shares one retry policy: a few attempts per request with
+# exponential backoff and jitter, a retry budget for the whole run, and a
+# circuit breaker that stops querying an authority after consecutive failures
+# until a cooldown has passed. Only connection errors, timeouts and server
+# errors (5xx) are retried and count as failures.
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF = 1.0
+RETRY_BACKOFF_MAX = 16.0
+RETRY_BUDGET = 50
+CIRCUIT_BREAKER_THRESHOLD = 3
+CIRCUIT_BREAKER_COOLDOWN = 300
+
+# Clock skew is measured from the Date header of several requests to each
+# authority, keeping the sample with the shortest round trip. The samples
+# after the first are skipped if it took longer than CLOCKSKEW_SLOW_RTT
+# seconds, and otherwise get CLOCKSKEW_SAMPLE_BUDGET times its round trip
+# each (but at least CLOCKSKEW_SLOW_RTT together), so a slow authority
+# doesn't hold up the run.
+CLOCKSKEW_SAMPLES = 4
+CLOCKSKEW_SLOW_RTT = 1.0
+CLOCKSKEW_SAMPLE_BUDGET = 2
+
+# Pages are collected in memory and written out in chunks of about this many
+# bytes.
+PAGE_BUFFER_SIZE = 1024 * 1024
+
+_retry_lock = threading.Lock()
+_retries_left = RETRY_BUDGET
+_endpoint_failures = {}
+_endpoint_open_until = {}
+
+def reset_retry_state():
+	"""
+	Restores the full retry budget and closes every circuit.
+	"""
+	global _retries_left
+	with _retry_lock:
+		_retries_left = RETRY_BUDGET
+		_endpoint_failures.clear()
+		_endpoint_open_until.clear()
+
+def _circuit_open(endpoint):
+	with _retry_lock:
+		return _endpoint_open_until.get(endpoint, 0) > time.time()
+
+def _record_result(endpoint, success):
+	with _retry_lock:
+		if success:
+			_endpoint_failures.pop(endpoint, None)
+			_endpoint_open_until.pop(endpoint, None)
+		else:
+			_endpoint_failures[endpoint] = _endpoint_failures.get(endpoint, 0) + 1
+			if _endpoint_failures[endpoint] >= CIRCUIT_BREAKER_THRESHOLD:
+				_endpoint_open_until[endpoint] = time.time() + CIRCUIT_BREAKER_COOLDOWN
+
+class DownloadRefused(stem.DownloadFailed):
+	"""
+	The DirPort answered our request with a client error (4xx), such as a 404
+	for a vote the authority doesn't have. Asking again won't change that, so
+	these aren't retried and don't count against the authority.
+
+	:var int status: HTTP status of the response
+	"""
+
+	def __init__(self, url, status, reason):
+		super(DownloadRefused, self).__init__(url, http.client.HTTPException('HTTP Error %i: %s' % (status, reason)), None)
+		self.status = status
+
+def _take_retry():
+	global _retries_left
+	with _retry_lock:
+		if _retries_left <= 0:
+			return False
+		_retries_left -= 1
+		return True
+
+def _fetch_with_retries(endpoint, url, fetch, deadline, attempts = RETRY_ATTEMPTS):
+	"""
+	Calls fetch(timeout) under the shared retry policy.
+
+	:param tuple endpoint: (address, port) the request goes to
+	:param str url: url of the request, for error messages
+	:param function fetch: performs a single attempt, given its timeout
+	:param float deadline: time after which we won't start another attempt
+	:param int attempts: maximum number of attempts
+
+	:returns: the result of fetch
+
+	:raises: the last attempt's exception, or :class:`~stem.DownloadFailed` if
+		the endpoint's circuit is open or the deadline has already passed. Only
+		a :class:`~stem.DownloadFailed` is retried, anything else (including a
+		:class:`~utility.DownloadRefused`) is raised right away.
+	"""
+
+	for attempt in range(attempts):
+		if _circuit_open(endpoint):
+			raise stem.DownloadFailed(url, None, None, 'Failed to download from %s: skipped, %s:%i failed %i times in a row' % (url, endpoint[0], endpoint[1], CIRCUIT_BREAKER_THRESHOLD))
+
+		# an attempt without any time left would only fail, and count against
+		# the endpoint when it isn't to blame
+
+		timeout = min(FETCH_TIMEOUT, deadline - time.time())
+		if timeout <= 0:
+			raise stem.DownloadFailed(url, None, None, 'Failed to download from %s: skipped, deadline reached' % url)
+
+		try:
+			result = fetch(timeout)
+		except DownloadRefused:
+			raise
+		except stem.DownloadFailed:
+			_record_result(endpoint, False)
+
+			delay = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** attempt)
+			delay = random.uniform(delay / 2, delay)
+			if attempt + 1 == attempts or time.time() + delay >= deadline or not _take_retry():
+				raise
+			time.sleep(delay)
+		else:
+			_record_result(endpoint, True)
+			return result
+
+class _Cancelled(Exception):
+	"""
+	Raised while reading a document we no longer need.
+	"""
+
+class _Cancellation():
+	"""
+	Set once we no longer need the documents of some requests. Setting it shuts
+	down the connections they're using, so they stop rather than finishing
+	their download in the background.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._set = False
+		self._connections = set()
+
+	def is_set(self):
+		return self._set
+
+	def set(self):
+		with self._lock:
+			self._set = True
+			connections, self._connections = self._connections, set()
+		for conn in connections:
+			try:
+				if conn.sock:
+					conn.sock.shutdown(socket.SHUT_RDWR)
+			except OSError:
+				pass
+
+	def watch(self, conn):
+		"""
+		Shuts down a connection when we're set.
+
+		:returns: **False** if we're already set, **True** otherwise
+		"""
+
+		with self._lock:
+			if not self._set:
+				self._connections.add(conn)
+			return not self._set
+
+	def unwatch(self, conn):
+		with self._lock:
+			self._connections.discard(conn)
+
+class ConnectionPool():
+	"""
+	Keep-alive HTTP connections to the authorities' DirPorts, keyed by
+	(address, port), so the requests of a run to the same DirPort can share
+	connections instead of each opening their own.
+	"""
+
+	def __init__(self, max_idle = 4):
+		self.max_idle = max_idle
+		self.routes = {}	# (address, port) => (address, port) we connect to instead
+		self._lock = threading.Lock()
+		self._idle = {}
+		self._abort = _Cancellation()	# set by abort(), until we're closed
+
+	def _checkout(self, address, port, timeout):
+		with self._lock:
+			idle = self._idle.get((address, port))
+			conn = idle.pop() if idle else None
+		if conn is None:
+			return http.client.HTTPConnection(address, port, timeout = timeout), False
+		conn.timeout = timeout
+		if conn.sock:
+			conn.sock.settimeout(timeout)
+		return conn, True
+
+	def _checkin(self, address, port, conn):
+		with self._lock:
+			idle = self._idle.setdefault((address, port), [])
+			if len(idle) < self.max_idle:
+				idle.append(conn)
+				return
+		conn.close()
+
+	def request(self, address, port, resource, timeout, headers = None, consume = None, cancel = None):
+		"""
+		Issues a GET request, reusing an idle connection to the DirPort if we
+		have one.
+
+		:param function consume: reads the body of a successful response as it
+			arrives, given the response and providing what to return in place of
+			the body
+		:param _Cancellation cancel: aborts the request once set
+
+		:returns: tuple of the form (status, reason, headers, body)
+		"""
+
+		request_headers = {'User-Agent': stem.USER_AGENT}
+		request_headers.update(headers or {})
+		endpoint = (address, port)
+		address, port = self.routes.get(endpoint, endpoint)
+
+		while True:
+			conn, reused = self._checkout(address, port, timeout)
+			trace, start = fetch_trace, time.time()
+			cancels = [c for c in (cancel, self._abort) if c is not None]
+			if not all([c.watch(conn) for c in cancels]):
+				for c in cancels:
+					c.unwatch(conn)
+				conn.close()
+				raise _Cancelled()
+			try:
+				conn.request('GET', resource, headers = request_headers)
+				response = conn.getresponse()
+
+				if trace is not None:
+					# read the whole body so we can record it
+
+					first_byte, raw = time.time(), response.read()
+					trace.add(endpoint, resource, request_headers, start, first_byte, response.status, response.reason, response.headers, raw)
+					response_body = _BufferedResponse(response.headers, raw)
+				else:
+					response_body = response
+
+				body = consume(response_body) if (consume and response.status == 200) else response_body.read()
+			except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as exc:
+				conn.close()
+				if trace is not None:
+					trace.add_error(endpoint, resource, request_headers, start, exc)
+				if any(c.is_set() for c in cancels):
+					raise _Cancelled()
+				elif reused:
+					continue	# the DirPort closed this idle connection, try a fresh one
+				raise
+			except Exception as exc:
+				conn.close()
+				if trace is not None:
+					trace.add_error(endpoint, resource, request_headers, start, exc)
+				if any(c.is_set() for c in cancels):
+					raise _Cancelled()
+				raise
+			finally:
+				for c in cancels:
+					c.unwatch(conn)
+
+			if response.will_close:
+				conn.close()
+			else:
+				self._checkin(address, port, conn)
+			return (response.status, response.reason, response.headers, body)
+
+	def abort(self):
+		"""
+		Aborts the requests in flight, and refuses further ones until we're
+		closed.
+		"""
+
+		self._abort.set()
+
+	def close(self):
+		with self._lock:
+			idle, self._idle = self._idle, {}
+			if self._abort.is_set():
+				self._abort = _Cancellation()
+		for conns in idle.values():
+			for conn in conns:
+				conn.close()
+
+connection_pool = ConnectionPool()
+
+# thread pools our fetches run in, see stop_fetches()
+_fetch_executors = []
+_fetch_executors_lock = threading.Lock()
+
+def _fetch_executor(max_workers):
+	"""
+	Provides a thread pool to fetch with, which stop_fetches() waits on.
+	"""
+
+	executor = concurrent.futures.ThreadPoolExecutor(max_workers = max_workers)
+	with _fetch_executors_lock:
+		_fetch_executors.append(executor)
+	return executor
+
+def stop_fetches():
+	"""
+	Stops what our fetches left running in the background. Requests that
+	outlived their deadline are aborted, the threads that ran them are joined,
+	and the connection pool's idle connections are closed.
+
+	Forking only copies the thread that forks, so this should be called first.
+	Locks held by any other thread would stay held in the child.
+
+	:returns: **True** if only the calling thread is left, **False** if others
+		are still running
+	"""
+
+	with _fetch_executors_lock:
+		executors = list(_fetch_executors)
+		del _fetch_executors[:]
+
+	connection_pool.abort()
+	for executor in executors:
+		executor.shutdown(wait = True, cancel_futures = True)
+	connection_pool.close()
+
+	return threading.active_count() == 1
+
+# FetchTrace that our requests are recorded to, see record_fetches()
+fetch_trace = None
+
+class _BufferedResponse():
+	"""
+	Stands in for an http.client response whose body we've already read.
+	"""
+
+	def __init__(self, headers, body):
+		self.headers = headers
+		self._body = io.BytesIO(body)
+
+	def read(self, amt = None):
+		return self._body.read(amt)
+
+class DocumentCache():
+	"""
+	On-disk cache of the raw, compressed documents we download. Documents are
+	stored under the sha256 of their content, and indexed by authority,
+	document type and valid-after time. While a document's period has not
+	changed (it is before its fresh-until time) fetching it again is served
+	from here.
+	"""
+
+	def __init__(self, path, retention = 24 * 60 * 60):
+		self.path = path
+		self.retention = retention
+		self._lock = threading.Lock()
+		self._index = None
+
+	def _load_index(self):
+		if self._index is None:
+			try:
+				with open(os.path.join(self.path, 'index.json'), 'r') as f:
+					self._index = json.load(f)
+			except (IOError, ValueError):
+				self._index = {}
+		return self._index
+
+	def _write(self, filename, data, mode = 'wb'):
+		tmp = os.path.join(self.path, filename + '.tmp.%i' % threading.get_ident())
+		with open(tmp, mode) as f:
+			f.write(data)
+		os.replace(tmp, os.path.join(self.path, filename))
+
+	def _entries(self, authority, doc_type):
+		with self._lock:
+			entries = self._load_index().get(authority + '/' + doc_type, {})
+			return sorted(entries.values(), key = lambda e: e['valid_after'])
+
+	def load(self, digest):
+		"""
+		Reads a document from the cache, checking that it's intact.
+
+		:returns: **bytes** of the compressed document, **None** if we don't
+			have it
+		"""
+
+		try:
+			with open(os.path.join(self.path, digest + '.z'), 'rb') as f:
+				compressed = f.read()
+		except IOError:
+			return None
+		if hashlib.sha256(compressed).hexdigest() != digest:
+			return None
+		return compressed
+
+	def get(self, authority, doc_type):
+		"""
+		Provides the compressed document that is fresh right now.
+
+		:returns: **bytes** of the compressed document, **None** if we don't
+			have a fresh one
+		"""
+
+		now = time.time()
+		digests = [e['digest'] for e in self._entries(authority, doc_type) if e['valid_after'] <= now < e['fresh_until']]
+		return self.load(digests[-1]) if digests else None
+
+	def size(self, authority, doc_type):
+		"""
+		Provides the compressed size of the most recent document we have.
+
+		:returns: **int** with the number of bytes, **None** if we don't have a
+			copy of the document
+		"""
+
+		entries = self._entries(authority, doc_type)
+		try:
+			return os.path.getsize(os.path.join(self.path, entries[-1]['digest'] + '.z')) if entries else None
+		except OSError:
+			return None
+
+	def conditional_headers(self, authority, doc_type):
+		"""
+		Provides the headers to make a conditional request for the most recent
+		document we have. Authorities that didn't send a Last-Modified header are
+		asked for anything newer than that document's valid-after time.
+
+		:returns: tuple of the form (digest, headers), or (None, {}) if we don't
+			have a copy of the document
+		"""
+
+		entries = self._entries(authority, doc_type)
+		if not entries:
+			return (None, {})
+
+		latest = entries[-1]
+		headers = {'If-Modified-Since': latest.get('last_modified') or email.utils.formatdate(latest['valid_after'], usegmt = True)}
+		if latest.get('etag'):
+			headers['If-None-Match'] = latest['etag']
+		return (latest['digest'], headers)
+
+	def put(self, authority, doc_type, compressed, content, headers = None):
+		"""
+		Stores a document, dropping the ones that are past our retention time.
+
+		:param bytes content: decompressed document, or at least its header
+		:param dict headers: response headers, for the Last-Modified and ETag
+			values of later conditional requests
+		"""
+
+		valid_after, fresh_until = _document_times(content)
+		if valid_after is None:
+			return
+		digest = hashlib.sha256(compressed).hexdigest()
+
+		with self._lock:
+			os.makedirs(self.path, exist_ok = True)
+			if not os.path.exists(os.path.join(self.path, digest + '.z')):
+				self._write(digest + '.z', compressed)
+
+			index = self._load_index()
+			index.setdefault(authority + '/' + doc_type, {})[str(int(valid_after))] = {
+				'digest': digest,
+				'valid_after': valid_after,
+				'fresh_until': fresh_until,
+				'last_modified': headers.get('Last-Modified') if headers else None,
+				'etag': headers.get('ETag') if headers else None,
+			}
+
+			cutoff = time.time() - self.retention
+			for key in list(index):
+				index[key] = dict((k, e) for (k, e) in index[key].items() if e['fresh_until'] >= cutoff)
+				if not index[key]:
+					del index[key]
+			self._write('index.json', json.dumps(index, indent = 1, sort_keys = True), 'w')
+
+			referenced = set(e['digest'] + '.z' for entries in index.values() for e in entries.values())
+			for filename in os.listdir(self.path):
+				if filename.endswith('.z') and filename not in referenced:
+					os.remove(os.path.join(self.path, filename))
+
+# Set to None to always download documents
+document_cache = DocumentCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cache'))
+
+def _document_times(content):
+	"""
+	Reads the valid-after and fresh-until times from a document's header.
+
+	:returns: tuple of unix timestamps (valid_after, fresh_until), or
+		(None, None) if the document doesn't have them
+	"""
+
+	end = content.find(b'\ndir-source ')
+	header = content[:end] if end != -1 else content
+	times = []
+	for keyword in (b'\nvalid-after ', b'\nfresh-until '):
+		start = header.find(keyword)
+		if start == -1:
+			return (None, None)
+		start += len(keyword)
+		value = header[start:start + 19].decode('ascii', 'replace')
+		try:
+			times.append(calendar.timegm(time.strptime(value, '%Y-%m-%d %H:%M:%S')))
+		except ValueError:
+			return (None, None)
+	return tuple(times)
+
+# Amount we read from a DirPort response at a time
+FETCH_CHUNK_SIZE = 64 * 1024
+
+class _DocumentStream():
+	"""
+	A document we read as it arrives, decompressing it a chunk at a time and
+	splitting it into lines. The compressed chunks are kept for the document
+	cache along with the header, so we never hold the whole decompressed
+	document.
+
+	:var list compressed: compressed chunks of the document read so far
+	:var list header: lines of the document's header
+	:var float processing: seconds spent processing lines rather than
+		waiting for them to arrive
+	"""
+
+	def __init__(self, chunks, is_compressed):
+		self._chunks = chunks
+		self._decompressor = zlib.decompressobj(zlib.MAX_WBITS | 32) if is_compressed else None
+		self._compressor = None if is_compressed else zlib.compressobj()
+		self.compressed = []
+		self.header = []
+		self.processing = 0.0
+
+	def _content(self):
+		for chunk in self._chunks:
+			if self._decompressor:
+				self.compressed.append(chunk)
+				data = self._decompressor.decompress(chunk)
+			else:
+				self.compressed.append(self._compressor.compress(chunk))
+				data = chunk
+
+			start = time.time()
+			yield data
+			self.processing += time.time() - start
+
+		if self._decompressor:
+			yield self._decompressor.flush()
+		else:
+			self.compressed.append(self._compressor.flush())
+
+	def lines(self):
+		"""
+		Provides the lines of the document, with their newline.
+
+		:raises: **ValueError** if the document can't be decompressed
+		"""
+
+		pending, in_header = b'', True
+		try:
+			for data in self._content():
+				lines = (pending + data).split(b'\n')
+				pending = lines.pop()
+
+				for line in lines:
+					if in_header:
+						if line.startswith(b'dir-source ') or line.startswith(b'r '):
+							in_header = False
+						else:
+							self.header.append(line + b'\n')
+					yield line + b'\n'
+		except zlib.error as exc:
+			raise ValueError('Unable to decompress document: %s' % exc)
+
+		if pending:
+			yield pending
+
+def _cancellable(chunks, cancel):
+	for chunk in chunks:
+		if cancel.is_set():
+			raise _Cancelled()
+		yield chunk
+
+def _cached_stream(cache_key):
+	"""
+	Provides a cached document that is still fresh.
+
+	:param tuple cache_key: (authority nickname, document type)
+
+	:returns: :class:`~utility._DocumentStream` for the document, **None** if
+		it's not cached
+	"""
+
+	if document_cache is None or cache_key is None:
+		return None
+	compressed = document_cache.get(*cache_key)
+	return _DocumentStream([compressed], True) if compressed is not None else None
 
 def get_consensuses():
 	"""
@@ -66,146 +690,656 @@ def get_votes():
 	return _get_documents('vote', '/tor/status-vote/current/authority.z')
 
 
-def _validate_from_one_vote(authority, recv_authority):
-	_downloader = stem.descriptor.remote.DescriptorDownloader(
-		timeout = 30,
-		retries = 5,
-		fall_back_to_authority = False,
+def _request(address, dir_port, resource, timeout = FETCH_TIMEOUT, conditional = None, consume = None, cancel = None):
+	"""
+	Issues a request to a DirPort through the shared connection pool.
+
+	:param dict conditional: If-Modified-Since and If-None-Match headers to
+		send, in which case a 304 (Not Modified) response is accepted
+	:param function consume: reads the response body as it arrives, see
+		:func:`~utility.ConnectionPool.request`
+
+	:returns: tuple of the form (headers, body), the body being **None** if
+		the document was not modified
+
+	:raises:
+		* :class:`~stem.DownloadTimeout` if our request timed out
+		* :class:`~utility.DownloadRefused` if the DirPort answers with a client
+			error (4xx)
+		* :class:`~stem.DownloadFailed` if our request fails otherwise
+		* anything **consume** raises, such as a **ValueError** for a malformed
+			document
+	"""
+
+	url = 'http://%s:%i%s' % (address, dir_port, resource)
+	request_headers = {'Accept-Encoding': 'deflate, identity'}
+	request_headers.update(conditional or {})
+	try:
+		status, reason, headers, body = connection_pool.request(address, dir_port, resource, timeout, request_headers, consume, cancel)
+	except socket.timeout as exc:
+		raise stem.DownloadTimeout(url, exc, sys.exc_info()[2], timeout)
+	except (OSError, http.client.HTTPException) as exc:
+		raise stem.DownloadFailed(url, exc, sys.exc_info()[2])
+
+	if status == 304 and conditional:
+		return (headers, None)
+	elif 400 <= status < 500:
+		raise DownloadRefused(url, status, reason)
+	elif status != 200:
+		raise stem.DownloadFailed(url, http.client.HTTPException('HTTP Error %i: %s' % (status, reason)), None)
+	return (headers, body)
+
+def _fetch_document(address, dir_port, resource, consume, timeout = FETCH_TIMEOUT, cache_key = None, cancel = None):
+	"""
+	Downloads a document from a DirPort, handing it to **consume** as it
+	arrives.
+
+	:param function consume: reads the document from the
+		:class:`~utility._DocumentStream` it's given, it must read all of it
+	:param tuple cache_key: (authority nickname, document type) to store the
+		document under in the document cache, if we already have a copy of it
+		then this is a conditional request
+	:param _Cancellation cancel: stops reading the document and closes its
+		connection once set
+
+	:returns: what **consume** provided
+	"""
+
+	use_cache = document_cache is not None and cache_key is not None
+	cached_digest, conditional = document_cache.conditional_headers(*cache_key) if use_cache else (None, {})
+	streams = []
+
+	def read(response):
+		encoding = response.headers.get('Content-Encoding')
+		chunks = iter(lambda: response.read(FETCH_CHUNK_SIZE), b'')
+		if cancel is not None:
+			chunks = _cancellable(chunks, cancel)
+		streams.append(_DocumentStream(chunks, encoding in ('deflate', 'x-deflate', 'gzip')))
+		return consume(streams[-1])
+
+	headers, result = _request(address, dir_port, resource, timeout, conditional, read, cancel)
+	if result is None:
+		compressed = document_cache.load(cached_digest)
+		if compressed is not None:
+			return consume(_DocumentStream([compressed], True))
+		headers, result = _request(address, dir_port, resource, timeout, consume = read, cancel = cancel)	# our copy went missing
+
+	if use_cache:
+		document_cache.put(cache_key[0], cache_key[1], b''.join(streams[-1].compressed), b''.join(streams[-1].header), headers)
+	return result
+
+def _read_document(lines):
+	"""
+	Builds a network status document from its lines. Router status entries
+	are kept as text, stem only parses those we look up (see
+	:class:`~relaytable.RouterEntries`), so we never hold the text of the whole
+	document or parse entries we don't need.
+
+	:returns: :class:`~stem.descriptor.networkstatus.NetworkStatusDocumentV3`
+
+	:raises: **ValueError** if the document is malformed
+	"""
+
+	header, entry, footer, routers = [], None, [], RouterEntries()
+
+	for line in lines:
+		if footer or line.startswith(b'directory-footer') or line.startswith(b'directory-signature '):
+			footer.append(line)
+		elif line.startswith(b'r '):
+			if entry:
+				routers.add(b''.join(entry))
+			entry = [line]
+		elif entry is not None:
+			entry.append(line)
+		else:
+			header.append(line)
+
+	if entry:
+		routers.add(b''.join(entry))
+
+	document = stem.descriptor.networkstatus.NetworkStatusDocumentV3(b''.join(header + footer))
+	routers.document = document
+	document.routers = routers
+	return document
+
+def _parse_document(content):
+	return next(stem.descriptor.parse_file(
+		io.BytesIO(content),
+		'network-status-consensus-3 1.0',
 		document_handler = stem.descriptor.DocumentHandler.DOCUMENT,
-	)
-	query = _downloader.query(
-		'/tor/status-vote/current/%s.z' % authority.v3ident,
-		endpoints = [stem.DirPort(recv_authority.address, recv_authority.dir_port)],
-		default_params = False,
-		start = False
-	)
-	# Re-add the .z suffix per #25782
-	query.resource = query.resource + ".z"
-	exception = ""
-	for i in range(5):
-		try:
-			recv_vote = query.run()[0]
-			return ("OK", recv_vote)
-		except Exception as exc:
-			exception = str(exc)
-			time.sleep(10)
+	))
+
+def _vote_digest(lines):
+	"""
+	Provides the digest an authority signs for its vote, that is the SHA1 of
+	the document up to and including the space after 'directory-signature'.
+	"""
+
+	digest, signed = hashlib.sha1(), False
+	for line in lines:
+		if signed:
 			continue
-	return (exception, "")
+		elif line.startswith(b'directory-signature '):
+			digest.update(b'directory-signature ')
+			signed = True
+		else:
+			digest.update(line)
+
+	if not signed:
+		raise ValueError('Vote is missing its directory-signature')
+	return digest.hexdigest().upper()
+
+def _validate_from_one_vote(authority, recv_authority, deadline, digest = True):
+	"""
+	Fetches an authority's vote from another authority.
 
-def validate_votes():
+	:returns: tuple of the form (status, vote), where the vote is its signed
+		digest if **digest** is True and the parsed document otherwise
+	"""
+
+	resource = '/tor/status-vote/current/%s.z' % authority.v3ident
+	url = 'http://%s:%i%s' % (recv_authority.address, recv_authority.dir_port, resource)
+	cache_key = (recv_authority.nickname.lower(), 'vote-' + authority.v3ident)
+
+	# votes are only parsed in full to compare them, since a bare document
+	# with routers attached doesn't compare its routers
+
+	if digest:
+		consume = lambda stream: _vote_digest(stream.lines())
+	else:
+		consume = lambda stream: _parse_document(b''.join(stream.lines()))
+
+	fetch = lambda timeout: _fetch_document(recv_authority.address, recv_authority.dir_port, resource, consume, timeout, cache_key)
+
+	try:
+		stream = _cached_stream(cache_key)
+		if stream is not None:
+			return ("OK", consume(stream))
+		return ("OK", _fetch_with_retries((recv_authority.address, recv_authority.dir_port), url, fetch, deadline))
+	except Exception as exc:
+		return (str(exc), "")
+
+def validate_votes(digest = True):
 	"""
 	Confirm that there is no discrepency within votes.
 
+	Every authority's vote is fetched from every other authority. By default
+	only the vote's signed digest is compared, if **digest** is False the votes
+	are parsed and compared in full.
+
 	:returns: dict of the form {sender => {receiver => {URL, err}}}
 	"""
+	authorities = [(nickname, authority) for (nickname, authority) in get_dirauths().items() if authority.v3ident is not None]
+	deadline = time.time() + VALIDATION_DEADLINE
+
 	validation = {}
 	validation_queue = {}
 	validation_result = {}
-	with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-		for (nickname, authority) in get_dirauths().items():
-			print('Processing validation_queue ' + nickname)
-			if authority.v3ident is None:
-				continue
-			validation[nickname] = {}
-			validation_queue[nickname] = {}
-			validation_result[nickname] = {}
-			for (recv_nickname, recv_authority) in get_dirauths().items():
-				if recv_authority.v3ident is None:
-					continue
-				validation_queue[nickname][recv_nickname] = executor.submit(_validate_from_one_vote, authority, recv_authority)
-		for (nickname, authority) in get_dirauths().items():
-			print('Processing validation ' + nickname)
-			if authority.v3ident is None:
-				continue
-			for (recv_nickname, recv_authority) in get_dirauths().items():
-				if recv_authority.v3ident is None:
-					continue
-				validation[nickname][recv_nickname] = validation_queue[nickname][recv_nickname].result()
-		for (nickname, authority) in get_dirauths().items():
-			if authority.v3ident is None:
-				continue
-			for (recv_nickname, recv_authority) in get_dirauths().items():
-				print('Processing validation_result ' + recv_nickname)
-				if recv_authority.v3ident is None:
-					continue
-				url = 'http://' + str(recv_authority.address) + ':' + str(recv_authority.dir_port) + \
-					'/tor/status-vote/current/%s.z' % authority.v3ident
-				if validation[nickname][recv_nickname][0] != "OK":
-					validation_result[nickname][recv_nickname] = (url, validation[nickname][recv_nickname][0])
-				elif validation[nickname][nickname][0] != "OK":
-					validation_result[nickname][recv_nickname] = (url, "Unable to validate the vote with the sender")
-				elif validation[nickname][nickname] != validation[nickname][recv_nickname]:
-					validation_result[nickname][recv_nickname] = (url, "Discrepency detected")
-				else:
-					validation_result[nickname][recv_nickname] = (url, "OK")
+	executor = _fetch_executor(max(1, min(VALIDATION_WORKERS, len(authorities) ** 2)))
+	for (nickname, authority) in authorities:
+		validation_queue[nickname] = {}
+		for (recv_nickname, recv_authority) in authorities:
+			validation_queue[nickname][recv_nickname] = executor.submit(_validate_from_one_vote, authority, recv_authority, deadline, digest)
+	print('Processing validation of %i votes' % (len(authorities) ** 2))
+	concurrent.futures.wait([f for queue in validation_queue.values() for f in queue.values()], timeout = max(0, deadline - time.time()))
+	executor.shutdown(wait=False, cancel_futures=True)
+
+	for (nickname, authority) in authorities:
+		validation[nickname] = {}
+		for (recv_nickname, recv_authority) in authorities:
+			future = validation_queue[nickname][recv_nickname]
+			if future.done() and not future.cancelled():
+				validation[nickname][recv_nickname] = future.result()
+			else:
+				validation[nickname][recv_nickname] = ("Validation did not finish within %i seconds" % VALIDATION_DEADLINE, "")
+
+	for (nickname, authority) in authorities:
+		validation_result[nickname] = {}
+		for (recv_nickname, recv_authority) in authorities:
+			url = 'http://' + str(recv_authority.address) + ':' + str(recv_authority.dir_port) + \
+				'/tor/status-vote/current/%s.z' % authority.v3ident
+			if validation[nickname][recv_nickname][0] != "OK":
+				validation_result[nickname][recv_nickname] = (url, validation[nickname][recv_nickname][0])
+			elif validation[nickname][nickname][0] != "OK":
+				validation_result[nickname][recv_nickname] = (url, "Unable to validate the vote with the sender")
+			elif validation[nickname][nickname] != validation[nickname][recv_nickname]:
+				validation_result[nickname][recv_nickname] = (url, "Discrepency detected")
+			else:
+				validation_result[nickname][recv_nickname] = (url, "OK")
 	print('Processing done')
 	return validation_result
 
-def _get_documents(label, resource):
-	documents, issues, runtimes = {}, [], {}
+def get_consensuses_and_votes():
+	"""
+	Fetches the consensuses and votes from every authority at the same time,
+	under a single shared deadline.
 
-	for (nickname, authority) in get_dirauths().items():
-		if authority.v3ident is None:
-			continue	# not a voting authority
+	:returns: tuple of the form (get_consensuses(), get_votes())
+	"""
 
-		query = downloader.query(
-			resource,
-			endpoints = [stem.DirPort(authority.address, authority.dir_port)],
-			default_params = False,
-			start = False
-		)
-		# Re-add the .z suffix per #25782
-		query.resource = query.resource + ".z"
+	deadline = time.time() + FETCH_DEADLINE
+	with _fetch_executor(2) as executor:
+		consensuses = executor.submit(_get_documents, 'consensus', '/tor/status-vote/current/consensus.z', deadline)
+		votes = executor.submit(_get_documents, 'vote', '/tor/status-vote/current/authority.z', deadline)
+		return consensuses.result(), votes.result()
+
+def _query(address, dir_port, resource, timeout, cache_key = None, cancel = None):
+	"""
+	Downloads and parses a single document from a DirPort.
+
+	:returns: tuple of the form (document, runtime), the runtime only covering
+		the transfer
+	"""
+
+	if cancel is not None and cancel.is_set():
+		raise _Cancelled()
+
+	streams = []
+
+	def consume(stream):
+		streams.append(stream)
+		return _read_document(stream.lines())
+
+	start_time = time.time()
+	document = _fetch_document(address, dir_port, resource, consume, timeout, cache_key, cancel)
+	runtime = time.time() - start_time - sum(stream.processing for stream in streams)
+
+	return (document, runtime)
+
+def _get_document(label, resource, authority, deadline):
+	"""
+	Downloads a single document from an authority. Votes are also requested
+	from the other authorities if the authority is slow or fails to provide
+	its own.
+
+	:returns: tuple of the form (document, runtime, download_url, exception)
+	"""
+
+	url = 'http://%s:%i%s' % (authority.address, authority.dir_port, resource)
+	cache_key = (authority.nickname.lower(), label)
+
+	try:
+		stream = _cached_stream(cache_key)
+		if stream is not None:
+			return (_read_document(stream.lines()), None, url, None)
+	except ValueError:
+		pass	# fall back to downloading it
 
+	if label != 'vote':
+		fetch = lambda timeout: _query(authority.address, authority.dir_port, resource, timeout, cache_key)
 		try:
-			start_time = time.time()
-			documents[nickname] = query.run()[0]
-			runtimes[nickname] = time.time() - start_time
+			document, runtime = _fetch_with_retries((authority.address, authority.dir_port), url, fetch, deadline)
+			return (document, runtime, url, None)
 		except Exception as exc:
-			if label == 'vote':
-				# try to download the vote via the other authorities
+			return (None, None, url, exc)
+
+	# Votes can also be downloaded from the other authorities. If the
+	# authority's own request fails, or is slow for a vote of its size, we
+	# hedge by asking another authority for it and take whichever vote arrives
+	# first. The others are then cancelled. Only the authority's own request
+	# tells us how long it takes, so if another authority's vote wins we have
+	# no runtime for it.
+
+	v3ident = authority.v3ident
+	fallback_resource = '/tor/status-vote/current/%s.z' % v3ident
+	cancel = _Cancellation()
 
-				v3ident = authority.v3ident
+	size = document_cache.size(*cache_key) if document_cache is not None else None
+	hedge_delay = VOTE_HEDGE_DELAY + (size or VOTE_SIZE) / VOTE_HEDGE_RATE
 
-				query = downloader.query(
-					'/tor/status-vote/current/%s.z' % v3ident,
-					default_params = False,
-				)
+	others = [a for a in get_dirauths().values() if a.v3ident and a.v3ident != v3ident]
+	random.shuffle(others)
 
-				query.run(True)
+	def fetch_fallback(other):
+		fallback_url = 'http://%s:%i%s' % (other.address, other.dir_port, fallback_resource)
+		fallback_key = (other.nickname.lower(), 'vote-' + v3ident)
+		fetch = lambda timeout: _query(other.address, other.dir_port, fallback_resource, timeout, fallback_key, cancel)
+		document, runtime = _fetch_with_retries((other.address, other.dir_port), fallback_url, fetch, deadline, attempts = 1)
+		return (document, None, fallback_url, None)
 
-				if not query.error:
-					documents[nickname] = list(query)[0]
+	def fetch_own():
+		fetch = lambda timeout: _query(authority.address, authority.dir_port, resource, timeout, cache_key, cancel)
+		document, runtime = _fetch_with_retries((authority.address, authority.dir_port), url, fetch, deadline)
+		return (document, runtime, url, None)
+
+	executor = _fetch_executor(len(others) + 1)
+	own = executor.submit(fetch_own)
+	pending, hedge_at = set([own]), time.time() + hedge_delay
+	own_exc = None
+
+	try:
+		while pending:
+			wake = min(hedge_at, deadline) if others else deadline
+			done, pending = concurrent.futures.wait(pending, timeout = max(0, wake - time.time()), return_when = concurrent.futures.FIRST_COMPLETED)
+
+			for future in done:
+				try:
+					document, runtime, download_url, exc = future.result()
+				except Exception as exc:
+					if future is own:
+						own_exc = exc
+					if others:
+						pending.add(executor.submit(fetch_fallback, others.pop()))
 					continue
 
-			issues.append(('AUTHORITY_UNAVAILABLE', label, authority, query.download_url, exc))
+				return (document, runtime, download_url, None)
+
+			if time.time() >= deadline:
+				break
+			elif not done and time.time() >= hedge_at and others:
+				pending.add(executor.submit(fetch_fallback, others.pop()))
+				hedge_at = time.time() + hedge_delay
+	finally:
+		cancel.set()
+		executor.shutdown(wait=False, cancel_futures=True)
+
+	if own_exc is None:
+		own_exc = stem.DownloadTimeout(url, None, None, FETCH_DEADLINE)
+	return (None, None, url, own_exc)
+
+def _get_documents(label, resource, deadline=None):
+	documents, issues, runtimes = {}, [], {}
+
+	if deadline is None:
+		deadline = time.time() + FETCH_DEADLINE
+
+	authorities = [(nickname, authority) for (nickname, authority) in get_dirauths().items() if authority.v3ident is not None]	# only voting authorities
+	if not authorities:
+		return documents, issues, runtimes
+
+	executor = _fetch_executor(min(FETCH_WORKERS, len(authorities)))
+	queue = [(nickname, authority, executor.submit(_get_document, label, resource, authority, deadline)) for (nickname, authority) in authorities]
+	concurrent.futures.wait([future for (_, _, future) in queue], timeout = max(0, deadline - time.time()))
+	executor.shutdown(wait=False, cancel_futures=True)
+
+	for (nickname, authority, future) in queue:
+		if not future.done() or future.cancelled():
+			url = 'http://%s:%i/%s' % (authority.address, authority.dir_port, resource.lstrip('/'))
+			issues.append(('AUTHORITY_UNAVAILABLE', label, authority, url, stem.DownloadTimeout(url, None, None, FETCH_DEADLINE)))
+			continue
+
+		document, runtime, download_url, exc = future.result()
+		if exc is not None:
+			issues.append(('AUTHORITY_UNAVAILABLE', label, authority, download_url, exc))
+			continue
+
+		documents[nickname] = document
+		if runtime is not None:
+			runtimes[nickname] = runtime
 
 	return documents, issues, runtimes
 
+def _probe_clockskew(authority, deadline):
+	"""
+	Measures an authority's clock skew the way NTP does. The request with the
+	shortest round trip is the one where the Date header most likely reflects
+	the server's clock at the midpoint of the request. The header only has
+	second resolution, so we assume it was truncated halfway through that
+	second.
+
+	:returns: **float** with the number of seconds the authority's clock is
+		ahead of ours, **None** if it didn't send a Date header
+	"""
+
+	url = 'http://%s:%i/tor/keys/authority.z' % (authority.address, authority.dir_port)
+
+	def probe(timeout):
+		start = time.time()
+		headers, body = _request(authority.address, authority.dir_port, '/tor/keys/authority.z', timeout)
+		return (time.time() - start, start, headers.get('date'))
+
+	samples = [_fetch_with_retries((authority.address, authority.dir_port), url, probe, deadline)]
+	rtt = samples[0][0]
+
+	# the other samples are only a refinement, so they aren't retried, and
+	# running out of their budget doesn't count against the authority
+
+	if rtt <= CLOCKSKEW_SLOW_RTT:
+		samples_deadline = min(deadline, time.time() + max(CLOCKSKEW_SLOW_RTT, CLOCKSKEW_SAMPLE_BUDGET * rtt * (CLOCKSKEW_SAMPLES - 1)))
+		for i in range(CLOCKSKEW_SAMPLES - 1):
+			timeout = min(FETCH_TIMEOUT, samples_deadline - time.time())
+			if timeout <= 0:
+				break
+			try:
+				samples.append(probe(timeout))
+			except stem.DownloadFailed:
+				break
+
+	samples = [sample for sample in samples if sample[2]]
+	if not samples:
+		return None
+
+	rtt, start, date = min(samples)
+	server_time = calendar.timegm(email.utils.parsedate(date)) + 0.5
+	return round(server_time - (start + rtt / 2), 2)
+
 def get_clockskew():
 	clockskew = {}
-	for (nickname, authority) in get_dirauths().items():
-		authority_address = "http://" + str(authority.address) + ":" + str(authority.dir_port) + "/tor/keys/authority.z"
+	deadline = time.time() + FETCH_DEADLINE
+	authorities = list(get_dirauths().items())
+	if not authorities:
+		return clockskew
+
+	executor = _fetch_executor(min(FETCH_WORKERS, len(authorities)))
+	queue = [(nickname, executor.submit(_probe_clockskew, authority, deadline)) for (nickname, authority) in authorities]
+	concurrent.futures.wait([future for (_, future) in queue], timeout = max(0, deadline - time.time()))
+	executor.shutdown(wait=False, cancel_futures=True)
+
+	for (nickname, future) in queue:
+		if not future.done() or future.cancelled():
+			print("Could not get clockskew for ", nickname)
+			continue
 		try:
-			startTimeStamp = datetime.datetime.utcnow()
-			startTime = time.time()
-			f = urllib.request.urlopen(authority_address, timeout=30)
-			h = f.getheader('date')
-			if h:
-				clockskew[nickname] = datetime.datetime.strptime(h, '%a, %d %b %Y %H:%M:%S %Z')
-			else:
-				print("Could not get clockskew for ", nickname)
-				continue
-			processing = time.time() - startTime
-			if processing > 5:
-				clockskew[nickname] -= datetime.timedelta(seconds=(processing / 2))
-			clockskew[nickname] -= startTimeStamp
-			clockskew[nickname] = round(clockskew[nickname].total_seconds(), 2)
+			skew = future.result()
 		except Exception as e:
 			print("Clockskew Exception:", e)
 			continue
+		if skew is None:
+			print("Could not get clockskew for ", nickname)
+			continue
+		clockskew[nickname] = skew
 	return clockskew
 
+class FetchTrace():
+	"""
+	Recording of the HTTP exchanges we have with the authorities, so the fetch
+	phase can be replayed offline with :class:`~utility.TraceReplayServer`.
+	Traces are saved as a zip archive with the authorities and an index of the
+	exchanges in 'trace.json', and the raw body of each exchange alongside it.
+
+	Every exchange has its endpoint, resource, conditional request headers,
+	when it started (relative to the start of the trace), the seconds until its
+	first byte and in total, and either its status, reason, response headers
+	and body or the error it failed with.
+	"""
+
+	def __init__(self, authorities = None, exchanges = None, bodies = None, started = None):
+		self.authorities = authorities if authorities is not None else [_authority_dict(a) for a in get_dirauths().values()]
+		self.exchanges = exchanges if exchanges is not None else []
+		self.bodies = bodies if bodies is not None else {}
+		self.started = started if started is not None else time.time()
+		self._lock = threading.Lock()
+
+	def _exchange(self, endpoint, resource, request_headers, start, **attr):
+		exchange = {
+			'endpoint': '%s:%i' % endpoint,
+			'resource': resource,
+			'conditional': dict((k, v) for (k, v) in request_headers.items() if k.startswith('If-')),
+			'start': round(start - self.started, 6),
+		}
+		exchange.update(attr)
+		return exchange
+
+	def add(self, endpoint, resource, request_headers, start, first_byte, status, reason, headers, body):
+		end = time.time()
+		exchange = self._exchange(endpoint, resource, request_headers, start,
+			first_byte = round(first_byte - start, 6),
+			duration = round(end - start, 6),
+			status = status,
+			reason = reason,
+			headers = [(k, v) for (k, v) in headers.items() if k.lower() not in ('content-length', 'connection', 'transfer-encoding')],
+		)
+
+		with self._lock:
+			self.bodies['body/%i' % len(self.exchanges)] = body
+			self.exchanges.append(exchange)
+
+	def add_error(self, endpoint, resource, request_headers, start, exc):
+		end = time.time()
+		exchange = self._exchange(endpoint, resource, request_headers, start,
+			first_byte = round(end - start, 6),
+			duration = round(end - start, 6),
+			error = '%s: %s' % (type(exc).__name__, exc),
+		)
+
+		with self._lock:
+			self.exchanges.append(exchange)
+
+	def save(self, path):
+		with self._lock, zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+			archive.writestr('trace.json', json.dumps({'started': self.started, 'authorities': self.authorities, 'exchanges': self.exchanges}, indent = 1))
+			for (name, body) in self.bodies.items():
+				archive.writestr(name, body, zipfile.ZIP_STORED)	# usually already compressed
+
+	@staticmethod
+	def load(path):
+		with zipfile.ZipFile(path) as archive:
+			index = json.loads(archive.read('trace.json'))
+			bodies = dict((name, archive.read(name)) for name in archive.namelist() if name.startswith('body/'))
+		return FetchTrace(index['authorities'], index['exchanges'], bodies, index['started'])
+
+def _authority_dict(authority):
+	return dict((attr, getattr(authority, attr)) for attr in ('nickname', 'address', 'or_port', 'dir_port', 'fingerprint', 'v3ident'))
+
+class TraceReplayServer():
+	"""
+	Stand-in for the authorities' DirPorts that answers with the exchanges of a
+	:class:`~utility.FetchTrace`. Responses keep their recorded latency and
+	transfer time divided by **speed**, and Date headers keep their recorded
+	clock skew. Requests for a resource are answered with the exchanges
+	recorded for it in order, repeating the last one.
+
+	While running, the connection pool sends requests for the recorded DirPorts
+	here.
+	"""
+
+	def __init__(self, trace, speed = 1.0):
+		self.trace = trace
+		self.speed = speed
+		self._servers = []
+		self._lock = threading.Lock()
+		self._queues = {}
+
+		for (i, exchange) in enumerate(trace.exchanges):
+			exchange = dict(exchange, body = trace.bodies.get('body/%i' % i, b''))
+			self._queues.setdefault((exchange['endpoint'], exchange['resource']), []).append(exchange)
+
+	def _next_exchange(self, endpoint, resource):
+		with self._lock:
+			queue = self._queues.get((endpoint, resource))
+			if not queue:
+				return None
+			return queue.pop(0) if len(queue) > 1 else queue[0]
+
+	def _handler(self, endpoint):
+		replay = self
+
+		class Handler(http.server.BaseHTTPRequestHandler):
+			protocol_version = 'HTTP/1.1'
+
+			def do_GET(self):
+				exchange = replay._next_exchange(endpoint, self.path)
+				if exchange is None:
+					self.send_error(404)
+					return
+
+				time.sleep(exchange['first_byte'] / replay.speed)
+				if 'error' in exchange:
+					self.close_connection = True
+					return
+
+				self.send_response_only(exchange['status'], exchange['reason'])
+				for (name, value) in exchange['headers']:
+					if name.lower() == 'date':
+						value = email.utils.formatdate(time.time() + _date_offset(value, replay.trace.started + exchange['start'] + exchange['first_byte']), usegmt = True)
+					self.send_header(name, value)
+				self.send_header('Content-Length', str(len(exchange['body'])))
+				self.end_headers()
+
+				# pace the body over its recorded transfer time
+
+				body, chunks = exchange['body'], 20
+				pause = (exchange['duration'] - exchange['first_byte']) / replay.speed / chunks
+				for i in range(chunks):
+					self.wfile.write(body[i * len(body) // chunks:(i + 1) * len(body) // chunks])
+					if pause > 0:
+						time.sleep(pause)
+
+			def log_message(self, format, *args):
+				pass
+
+		return Handler
+
+	def start(self):
+		for endpoint in set(exchange['endpoint'] for exchange in self.trace.exchanges):
+			server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), self._handler(endpoint))
+			server.daemon_threads = True
+			threading.Thread(target = server.serve_forever, daemon = True).start()
+			self._servers.append(server)
+
+			address, port = endpoint.rsplit(':', 1)
+			connection_pool.routes[(address, int(port))] = ('127.0.0.1', server.server_port)
+
+	def stop(self):
+		for server in self._servers:
+			server.shutdown()
+			server.server_close()
+		self._servers = []
+		connection_pool.routes.clear()
+		connection_pool.close()
+
+def _date_offset(date, at):
+	"""
+	Provides how far ahead of **at** an HTTP Date header was.
+	"""
+
+	parsed = email.utils.parsedate(date)
+	return calendar.timegm(parsed) - int(at) if parsed else 0
+
+def record_fetches():
+	"""
+	Records the HTTP exchanges of our following requests, bypassing the
+	document cache so every document is actually downloaded.
+
+	:returns: :class:`~utility.FetchTrace` the exchanges are added to
+	"""
+
+	global fetch_trace, document_cache
+	document_cache = None
+	fetch_trace = FetchTrace()
+	return fetch_trace
+
+def replay_fetches(path, speed = 1.0):
+	"""
+	Answers our following requests from a recorded trace rather than the
+	authorities, bypassing the document cache. The authorities are the ones
+	the trace was recorded with.
+
+	:param str path: trace archive saved by :func:`~utility.FetchTrace.save`
+	:param float speed: factor to speed up the recorded latencies by
+
+	:returns: the running :class:`~utility.TraceReplayServer`
+	"""
+
+	global _dirAuths, document_cache
+	trace = FetchTrace.load(path)
+	_dirAuths = dict((a['nickname'].lower(), stem.directory.Authority(**a)) for a in trace.authorities)
+	document_cache = None
+
+	server = TraceReplayServer(trace, speed)
+	server.start()
+	return server
+
 def unix_time(dt):
     return (dt - datetime.datetime.utcfromtimestamp(0)).total_seconds() * 1000.0
 
@@ -218,13 +1352,68 @@ def ut_to_datetime_format(ut):
 def consensus_datetime_format(dt):
 	return dt.strftime("%Y-%m-%d-%H-%M-%S")
 
+class PageBuffer():
+	"""
+	Collects the text of a page and writes it to the file in large chunks rather
+	than a write for every fragment. The byte offset of what we've been given
+	so far is still exact, as the relay indexes point into the page.
+
+	:param str,file filename: path to write the page to, or a binary file
+	"""
+	def __init__(self, filename, buffer_size = PAGE_BUFFER_SIZE):
+		self.file = open(filename, 'wb') if isinstance(filename, str) else filename
+		self.encoding = locale.getpreferredencoding(False)
+		self.buffer_size = buffer_size
+		self.pending = []
+		self.encoded, self.encoded_size = [], 0
+		self.offset = 0
+
+		# fragments are just appended, the bulk of our time is spent writing them
+		self.write = self.pending.append
+	def tell(self):
+		self._encode()
+		return self.offset
+	def flush(self):
+		self._encode()
+		if self.encoded:
+			self.file.write(b''.join(self.encoded))
+			self.encoded, self.encoded_size = [], 0
+		self.file.flush()
+	def close(self):
+		self.flush()
+		self.file.close()
+	def _encode(self):
+		if self.pending:
+			data = ''.join(self.pending).encode(self.encoding)
+			self.pending.clear()
+			self.encoded.append(data)
+			self.encoded_size += len(data)
+			self.offset += len(data)
+		if self.encoded_size >= self.buffer_size:
+			self.file.write(b''.join(self.encoded))
+			self.encoded, self.encoded_size = [], 0
+
 class FileMock():
 	def __init__(self):
 		pass
 	def write(self, str):
 		pass
+	def flush(self):
+		pass
 
 if __name__ == "__main__":
+	if len(sys.argv) > 2 and sys.argv[1] == 'replay':
+		# times the fetch phase against a recorded trace:
+		#   utility.py replay <trace.zip> [speed]
+
+		replay_fetches(sys.argv[2], float(sys.argv[3]) if len(sys.argv) > 3 else 1.0)
+
+		for (name, fetch) in (('validate_votes', validate_votes), ('get_consensuses_and_votes', get_consensuses_and_votes), ('get_clockskew', get_clockskew)):
+			start = time.time()
+			fetch()
+			print('%s took %0.2f seconds' % (name, time.time() - start))
+		sys.exit(0)
+
 	skew = get_clockskew()
 	for c in skew:
 		print(c, skew[c])
@@ -25,6 +25,7 @@ from stem.directory import Authority
 
 from utility import *
 from website import WebsiteWriter
+from relaytable import RelayTable, classify_measurements, scan_router_status
 from graphs import GraphWriter
 
 
@@ -99,6 +100,11 @@ CONFIG = stem.util.conf.config_dict('consensus', {
 	'graph_logical_min' : 125,
 	'graph_logical_max' : 25000,
 	'clockskew_threshold': 0,
+	'record_fetches': '',
+	'replay_fetches': '',
+	'replay_speed': 1.0,
+	'parse_processes': 0,
+	'render_processes': 0,
 })
 
 def main():
@@ -107,12 +113,28 @@ def main():
 	config.load(os.path.join(os.path.dirname(__file__), 'data', 'consensus.cfg'))
 	set_config(CONFIG)
 
+	trace, replay = None, None
+	if CONFIG['replay_fetches']:
+		print('Replaying fetches from %s' % CONFIG['replay_fetches'])
+		replay = replay_fetches(CONFIG['replay_fetches'], CONFIG['replay_speed'])
+	elif CONFIG['record_fetches']:
+		trace = record_fetches()
+
 	print('Fetching votes')
 	validation = validate_votes()
-	consensuses, consensus_fetching_issues, consensus_fetching_runtimes = get_consensuses()
-	votes, vote_fetching_issues, vote_fetching_runtimes = get_votes()
+	(consensuses, consensus_fetching_issues, consensus_fetching_runtimes), \
+		(votes, vote_fetching_issues, vote_fetching_runtimes) = get_consensuses_and_votes()
 	clockskew = get_clockskew()
 
+	# nothing should be left running in the background when we fork to render
+	stop_fetches()
+	if replay:
+		replay.stop()
+
+	if trace:
+		print('Saving the fetches to %s' % CONFIG['record_fetches'])
+		trace.save(CONFIG['record_fetches'])
+
 	print('Updating download statistics file')
 	f = open(os.path.join(os.path.dirname(__file__), 'out', 'download-stats.csv'), 'a')
 	for ds in consensus_fetching_runtimes:
@@ -151,19 +173,18 @@ def main():
 						dbc.commit()
 				previous = d
 
+	# Columns of every relay in the displayed consensus and the votes, shared
+	# with the website and graph writers
+	relays = RelayTable(max(consensuses.values(), key=operator.attrgetter('valid_after')), votes, CONFIG['parse_processes'])
+
 	# Calculate the number of known and measured relays for each dirauth and insert it into the database
 	data = {}
 	for dirauth_nickname in votes:
-		vote = votes[dirauth_nickname]
+		vote = relays.votes[dirauth_nickname]
 
-		runningRelays    = 0
-		bandwidthWeights = 0
-		for r in vote.routers.values():
-			if r.measured and r.measured >= int(0):
-				bandwidthWeights += 1
-			if u'Running' in r.flags:
-				runningRelays += 1
-		data[dirauth_nickname] = {'known' : len(vote.routers.values()), 'running' : runningRelays, 'bwlines' : bandwidthWeights}
+		runningRelays    = relays.count_flag(vote, 'Running')
+		bandwidthWeights = sum(1 for measured in vote.measured if measured > 0)
+		data[dirauth_nickname] = {'known' : vote.count, 'running' : runningRelays, 'bwlines' : bandwidthWeights}
 
 	vote_data_columns = set()
 	vote_data_schema = dbc.execute("PRAGMA table_info(vote_data)")
@@ -214,37 +235,18 @@ def main():
 	f.close()
 
 	#Calculate the bwauth statistics and insert it into the database
-	data = {}
+	consensus = list(consensuses.values())[0]
+	consensus_ids = [relays.index.get(relay_fp, -1) for relay_fp in consensus.routers]
+	bandwidth = [None if r.is_unmeasured else r.bandwidth for r in scan_router_status(consensus.routers.content().splitlines(True), ('bandwidth', 'is_unmeasured'))]
+	measurements = {}
 	for dirauth_nickname in votes:
-		vote = votes[dirauth_nickname]
-		data[dirauth_nickname] = {'unmeasured' : 0, 'above' : 0, 'below' : 0, 'exclusive' : 0 , 'shared' : 0}
-
-		had_any_value = False
-		for r in list(consensuses.values())[0].routers.values():
-			if r.is_unmeasured:
-				continue
-			elif r.fingerprint not in vote.routers or vote.routers[r.fingerprint].measured == None:
-				data[dirauth_nickname]['unmeasured'] += 1
-			elif r.bandwidth < vote.routers[r.fingerprint].measured:
-				had_any_value = True
-				data[dirauth_nickname]['above'] += 1
-			elif r.bandwidth > vote.routers[r.fingerprint].measured:
-				had_any_value = True
-				data[dirauth_nickname]['below'] += 1
-			elif r.bandwidth == vote.routers[r.fingerprint].measured and \
-				 1 == len([1 for d_i in votes if r.fingerprint in votes[d_i].routers and votes[d_i].routers[r.fingerprint].measured == r.bandwidth]):
-				had_any_value = True
-				data[dirauth_nickname]['exclusive'] += 1
-			elif r.bandwidth == vote.routers[r.fingerprint].measured and \
-				 1 != len([1 for d_i in votes if r.fingerprint in votes[d_i].routers and votes[d_i].routers[r.fingerprint].measured == r.bandwidth]):
-				had_any_value = True
-				data[dirauth_nickname]['shared'] += 1
-			else:
-				print("What case am I in???")
-				sys.exit(1)
-
-		if not had_any_value:
-			del data[dirauth_nickname]
+		vote = relays.votes[dirauth_nickname]
+		measurements[dirauth_nickname] = [vote.measured[i] if i != -1 else -1 for i in consensus_ids]
+
+	data = {}
+	for (dirauth_nickname, counts) in classify_measurements(bandwidth, measurements).items():
+		if counts['above'] or counts['below'] or counts['exclusive'] or counts['shared']:
+			data[dirauth_nickname] = counts
 
 	bwauth_stats_data_columns = set()
 	bwauth_stats_data_schema = dbc.execute("PRAGMA table_info(bwauth_data)")
@@ -314,11 +316,13 @@ def main():
 	w.set_config(CONFIG)
 	w.set_consensuses(consensuses)
 	w.set_votes(votes)
+	w.set_relay_table(relays)
 	w.set_fallback_dirs(fallback_dirs)
 	w.set_clockskew(clockskew)
 	w.set_validation(validation)
 	w.write_website(os.path.join(os.path.dirname(__file__), 'out', 'consensus-health.html'), \
-		True, os.path.join(os.path.dirname(__file__), 'out', 'relay-indexes.txt'))
+		True, os.path.join(os.path.dirname(__file__), 'out', 'relay-indexes.txt'), \
+		os.path.join(os.path.dirname(__file__), 'out', 'relays'))
 	w.write_website(os.path.join(os.path.dirname(__file__), 'out', 'index.html'), False)
 	consensus_time = w.get_consensus_time()
 	del w
@@ -328,6 +332,7 @@ def main():
 	g.set_config(CONFIG)
 	g.set_consensuses(consensuses)
 	g.set_votes(votes)
+	g.set_relay_table(relays)
 	g.set_fallback_dirs(fallback_dirs)
 	g.write_website(os.path.join(os.path.dirname(__file__), 'out', 'graphs.html'))
 	del g